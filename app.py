@@ -1,21 +1,48 @@
 import os
+import io
+import mmap
+import sys
 import re
-import json
-import tempfile
+import sqlite3
+import queue
+import atexit
+import random
+import threading
+import time
 import requests
 import locale
-from datetime import datetime, timedelta
-from flask import Flask, render_template, request, jsonify
+import logging
+from datetime import date, datetime, timedelta
+from itertools import groupby, islice
+from operator import itemgetter
+from collections import defaultdict
+from functools import lru_cache, wraps
+from contextlib import contextmanager
+from logging.handlers import QueueHandler, QueueListener
+from concurrent.futures import Future, ThreadPoolExecutor
+from urllib.parse import quote_plus
+import lxml.etree as ET
+import orjson
+from flask import Flask, render_template, request
 from dotenv import load_dotenv
 import anthropic
 from twilio.rest import Client
+from twilio.http.http_client import TwilioHttpClient
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from twilio.twiml.messaging_response import MessagingResponse
 # import whisper  # Deshabilitado para deploy en la nube
 import caldav
 from icalendar import Calendar, Event
 from apscheduler.schedulers.background import BackgroundScheduler
+from apscheduler.schedulers.blocking import BlockingScheduler
 import pytz
 
+try:
+    import fcntl
+except ImportError:  # Windows: sin lock entre procesos
+    fcntl = None
+
 load_dotenv(override=True)
 
 # Configurar locale en español
@@ -27,6 +54,17 @@ except:
     except:
         pass
 
+# Logs encolados: un hilo aparte los escribe en stdout, así los workers no se
+# bloquean esperando la consola. LOG_LEVEL=DEBUG muestra mensajes y audios.
+log_queue = queue.SimpleQueue()
+log_listener = QueueListener(log_queue, logging.StreamHandler(sys.stdout))
+logger = logging.getLogger("asistente")
+logger.setLevel(os.environ.get("LOG_LEVEL", "INFO").upper())
+logger.addHandler(QueueHandler(log_queue))
+logger.propagate = False
+log_listener.start()
+atexit.register(log_listener.stop)
+
 
 # Leer API keys
 def get_env_var(name):
@@ -47,11 +85,27 @@ app = Flask(__name__)
 
 # Configuración de clientes
 anthropic_client = anthropic.Anthropic(api_key=get_env_var("ANTHROPIC_API_KEY"))
+# Cliente HTTP de Twilio con conexiones persistentes, con lugar para los envíos en paralelo
+twilio_http_client = TwilioHttpClient(pool_connections=True)
+twilio_http_client.session.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=20))
 twilio_client = Client(
-    get_env_var("TWILIO_ACCOUNT_SID"), get_env_var("TWILIO_AUTH_TOKEN")
+    get_env_var("TWILIO_ACCOUNT_SID"), get_env_var("TWILIO_AUTH_TOKEN"),
+    http_client=twilio_http_client
 )
 TWILIO_WHATSAPP_NUMBER = get_env_var("TWILIO_WHATSAPP_NUMBER")
 
+# Sesión HTTP compartida para las APIs externas, con conexiones persistentes
+# y reintentos ante errores transitorios del servidor. El pool alcanza para
+# el fetch_pool del resumen más los pedidos de los handlers
+http_session = requests.Session()
+http_session.mount("https://", HTTPAdapter(
+    pool_connections=16, pool_maxsize=32,
+    max_retries=Retry(total=2, backoff_factor=0.2, status_forcelist=[502, 503, 504])
+))
+# Timeout (conexión, lectura) de clima, dólar y noticias: un host caído falla
+# rápido sin cortar respuestas lentas pero vivas
+FETCH_TIMEOUT = (3, 7)
+
 # Configuración iCloud
 ICLOUD_EMAIL = get_env_var("ICLOUD_EMAIL")
 ICLOUD_APP_PASSWORD = get_env_var("ICLOUD_APP_PASSWORD")
@@ -60,8 +114,8 @@ CALDAV_URL = "https://caldav.icloud.com"
 # OpenAI API para transcripción de audio (Whisper API)
 OPENAI_API_KEY = get_env_var("OPENAI_API_KEY")
 
-# Almacena los números de WhatsApp registrados para recordatorios
-registered_users = {}
+# Proceso dedicado al scheduler (python app.py scheduler), sin webhook
+SCHEDULER_PROCESS = __name__ == "__main__" and sys.argv[1:2] == ["scheduler"]
 
 # Zona horaria
 TIMEZONE = pytz.timezone("America/Argentina/Buenos_Aires")
@@ -74,9 +128,7 @@ DATA_DIR = os.environ.get("DATA_DIR", os.path.dirname(os.path.abspath(__file__))
 # Crear directorio si no existe (importante para volúmenes de Railway)
 if not os.path.exists(DATA_DIR):
     os.makedirs(DATA_DIR, exist_ok=True)
-    print(f"[INIT] Directorio de datos creado: {DATA_DIR}")
-TASKS_FILE = os.path.join(DATA_DIR, "tasks.json")
-NOTES_FILE = os.path.join(DATA_DIR, "notes.json")
+    logger.info(f"[INIT] Directorio de datos creado: {DATA_DIR}")
 CONVERSATIONS_FILE = os.path.join(DATA_DIR, "conversations.json")
 CAREGIVERS_FILE = os.path.join(DATA_DIR, "caregivers.json")
 USER_PROFILES_FILE = os.path.join(DATA_DIR, "user_profiles.json")
@@ -86,13 +138,13 @@ CONTACTS_FILE = os.path.join(DATA_DIR, "contacts.json")
 APPOINTMENTS_FILE = os.path.join(DATA_DIR, "appointments.json")
 
 # Log de ubicación de datos al iniciar
-print(f"[INIT] Directorio de datos: {DATA_DIR}")
-print(f"[INIT] Persistencia Railway: {'SI' if os.environ.get('DATA_DIR') else 'NO (local)'}")
+logger.info(f"[INIT] Directorio de datos: {DATA_DIR}")
+logger.info(f"[INIT] Persistencia Railway: {'SI' if os.environ.get('DATA_DIR') else 'NO (local)'}")
 
 def initialize_data_files():
     """Verifica que existan todos los archivos de datos necesarios"""
     data_files = [
-        TASKS_FILE, NOTES_FILE, CONVERSATIONS_FILE, CAREGIVERS_FILE,
+        CONVERSATIONS_FILE, CAREGIVERS_FILE,
         USER_PROFILES_FILE, WELLNESS_CHECK_FILE, USER_ACTIVITY_FILE,
         CONTACTS_FILE, APPOINTMENTS_FILE
     ]
@@ -100,31 +152,314 @@ def initialize_data_files():
     for file_path in data_files:
         if not os.path.exists(file_path):
             # Crear archivo vacío con estructura JSON válida
-            with open(file_path, "w") as f:
-                json.dump({}, f)
-            print(f"[INIT] Archivo creado: {os.path.basename(file_path)}")
+            with open(file_path, "wb") as f:
+                f.write(orjson.dumps({}))
+            logger.info(f"[INIT] Archivo creado: {os.path.basename(file_path)}")
         else:
-            print(f"[INIT] Archivo existente: {os.path.basename(file_path)}")
+            logger.info(f"[INIT] Archivo existente: {os.path.basename(file_path)}")
 
 # Inicializar archivos de datos al arrancar
 initialize_data_files()
 
+# ==================== PERSISTENCIA EN SEGUNDO PLANO ====================
+# Los save_* serializan los datos y encolan la escritura; un hilo aparte la
+# hace a disco. Mientras una escritura está pendiente, las lecturas usan ese
+# contenido, así que nunca se lee una versión vieja.
+
+PENDING_WRITES = {}
+PENDING_WRITES_LOCK = threading.Lock()
+WRITE_FILE_LOCK = threading.Lock()
+WRITE_QUEUE = queue.Queue()
+
+# Última versión parseada de cada archivo para lecturas de solo consulta:
+# path -> (versión, datos). La versión es el contenido pendiente o (mtime, tamaño)
+SHARED_JSON_CACHE = {}
+
+# Lote de lecturas/escrituras del hilo actual (ver batched_json_files)
+json_batch = threading.local()
+
+@contextmanager
+def batched_json_files():
+    """Dentro del bloque cada archivo se lee una sola vez y se escribe una sola vez al final"""
+    if getattr(json_batch, "files", None) is not None:
+        # Ya hay un lote abierto en este hilo
+        yield
+        return
+    json_batch.files = {}
+    json_batch.dirty = {}
+    try:
+        yield
+    finally:
+        files, dirty = json_batch.files, json_batch.dirty
+        json_batch.files = json_batch.dirty = None
+        for path, indent in dirty.items():
+            write_json_file(path, files[path], indent)
+
+def read_json_file(path, default, readonly=False):
+    """Lee un archivo JSON, priorizando el contenido pendiente de escritura
+    readonly=True devuelve una copia compartida que no se debe modificar
+    """
+    files = getattr(json_batch, "files", None)
+    if files is not None:
+        if path not in files:
+            files[path] = read_json_from_disk(path, default)
+        return files[path]
+    if readonly:
+        return read_json_shared(path, default)
+    return read_json_from_disk(path, default)
+
+def read_json_shared(path, default):
+    """Lee un archivo JSON sin volver a parsearlo si no cambió desde la última lectura"""
+    with PENDING_WRITES_LOCK:
+        version = PENDING_WRITES.get(path)
+    if version is None:
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            return default
+        version = (st.st_mtime_ns, st.st_size)
+    cached = SHARED_JSON_CACHE.get(path)
+    if cached is not None and cached[0] == version:
+        return cached[1]
+    if isinstance(version, bytes):
+        data = orjson.loads(version)
+    else:
+        data = parse_json_path(path)
+    SHARED_JSON_CACHE[path] = (version, data)
+    return data
+
+def read_json_from_disk(path, default):
+    """Lee un archivo JSON (o su versión pendiente de escritura)"""
+    with PENDING_WRITES_LOCK:
+        payload = PENDING_WRITES.get(path)
+    if payload is not None:
+        return orjson.loads(payload)
+    if not os.path.exists(path):
+        return default
+    return parse_json_path(path)
+
+def parse_json_path(path):
+    """Parsea un archivo JSON directo desde el page cache (mmap), sin copiarlo a memoria"""
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            # mmap no acepta archivos vacíos; orjson da el mismo error que antes
+            return orjson.loads(f.read())
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            with memoryview(mm) as view:
+                return orjson.loads(view)
+
+def write_json_file(path, data, indent=None):
+    """Encola la escritura de un archivo JSON"""
+    if getattr(json_batch, "files", None) is not None:
+        # Dentro de un lote: se escribe al cerrarlo
+        json_batch.files[path] = data
+        json_batch.dirty[path] = indent
+        return
+    option = orjson.OPT_NON_STR_KEYS | (orjson.OPT_INDENT_2 if indent else 0)
+    payload = orjson.dumps(data, option=option)
+    with PENDING_WRITES_LOCK:
+        PENDING_WRITES[path] = payload
+    WRITE_QUEUE.put(path)
+
+def flush_json_file(path):
+    """Escribe a disco el último contenido pendiente de un archivo"""
+    with WRITE_FILE_LOCK:
+        with PENDING_WRITES_LOCK:
+            payload = PENDING_WRITES.get(path)
+        if payload is None:
+            # Ya se escribió junto con una escritura anterior
+            return
+        try:
+            # Una sola escritura al temporal, fsync y reemplazo atómico:
+            # un corte a mitad nunca deja el archivo vacío o truncado
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(payload)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, path)
+        except Exception as e:
+            logger.error(f"Error guardando {os.path.basename(path)}: {e}")
+            return
+        with PENDING_WRITES_LOCK:
+            # Si llegó una versión más nueva mientras escribíamos, queda pendiente
+            if PENDING_WRITES.get(path) is payload:
+                del PENDING_WRITES[path]
+
+def json_writer_loop():
+    """Hilo que escribe a disco los archivos encolados"""
+    while True:
+        path = WRITE_QUEUE.get()
+        flush_json_file(path)
+
+def flush_all_json_files():
+    """Escribe todo lo pendiente (al cerrar la app)"""
+    with PENDING_WRITES_LOCK:
+        paths = list(PENDING_WRITES)
+    for path in paths:
+        flush_json_file(path)
+
+threading.Thread(target=json_writer_loop, daemon=True).start()
+atexit.register(flush_all_json_files)
+
+# ==================== BASE DE DATOS (SQLITE) ====================
+# Tareas, notas y gastos van en SQLite: cada alta o baja es un INSERT/UPDATE
+# puntual en vez de reescribir el archivo entero. Una sola conexión por proceso,
+# usada por un hilo a la vez.
+
+DB_FILE = os.path.join(DATA_DIR, "storage.db")
+
+DB_SCHEMA = """
+CREATE TABLE IF NOT EXISTS tasks (
+    seq INTEGER PRIMARY KEY,
+    user_id TEXT NOT NULL,
+    id INTEGER NOT NULL,
+    text TEXT,
+    done INTEGER NOT NULL DEFAULT 0,
+    created TEXT,
+    completed TEXT
+);
+CREATE INDEX IF NOT EXISTS tasks_user ON tasks (user_id, id);
+
+CREATE TABLE IF NOT EXISTS notes (
+    seq INTEGER PRIMARY KEY,
+    user_id TEXT NOT NULL,
+    id INTEGER NOT NULL,
+    text TEXT,
+    created TEXT
+);
+CREATE INDEX IF NOT EXISTS notes_user ON notes (user_id, id);
+
+CREATE TABLE IF NOT EXISTS expenses (
+    seq INTEGER PRIMARY KEY,
+    user_id TEXT NOT NULL,
+    id INTEGER NOT NULL,
+    amount REAL NOT NULL DEFAULT 0,
+    description TEXT,
+    category TEXT NOT NULL DEFAULT 'General',
+    date TEXT
+);
+CREATE INDEX IF NOT EXISTS expenses_user_date ON expenses (user_id, date);
+"""
+
+# Varios procesos (web, scheduler, workers de gunicorn) comparten la base: si
+# otro tiene el lock de escritura se espera hasta DB_BUSY_TIMEOUT segundos
+DB_BUSY_TIMEOUT = 30
+
+db = sqlite3.connect(DB_FILE, timeout=DB_BUSY_TIMEOUT, isolation_level=None, check_same_thread=False)
+db.row_factory = sqlite3.Row
+db.execute("PRAGMA journal_mode=WAL")
+db.execute("PRAGMA synchronous=NORMAL")
+db.executescript(DB_SCHEMA)
+DB_LOCK = threading.Lock()
+
+@contextmanager
+def db_transaction():
+    """Bloque atómico sobre la base (un hilo a la vez)
+    IMMEDIATE toma el lock de escritura al empezar: leer y después escribir
+    dentro del bloque no choca con otro proceso a mitad de camino
+    """
+    with DB_LOCK:
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            yield db
+        except:
+            db.execute("ROLLBACK")
+            raise
+        db.execute("COMMIT")
+
+def db_rows(sql, params=()):
+    """Ejecuta una consulta y devuelve las filas como dicts"""
+    with DB_LOCK:
+        return [dict(row) for row in db.execute(sql, params)]
+
+def next_user_id(conn, table, user_id):
+    """Siguiente ID de un usuario en la tabla
+    Los IDs no se renumeran al borrar, así un número ya mostrado sigue apuntando al mismo ítem
+    """
+    return conn.execute(f"SELECT COALESCE(MAX(id), 0) FROM {table} WHERE user_id = ?", (user_id,)).fetchone()[0] + 1
+
+# Archivos JSON de antes de la base: se importan una vez y quedan como .migrated
+LEGACY_JSON_TABLES = (
+    ("tasks.json", "tasks", (("id", None), ("text", ""), ("done", False), ("created", None))),
+    ("notes.json", "notes", (("id", None), ("text", ""), ("created", None))),
+    ("expenses.json", "expenses", (
+        ("id", None), ("amount", 0), ("description", ""), ("category", "General"), ("date", None)
+    )),
+)
+
+MIGRATION_LOCK_FILE = os.path.join(DATA_DIR, "migration.lock")
+
+@contextmanager
+def migration_lock():
+    """Un proceso a la vez migra; los demás esperan y después no encuentran nada que migrar"""
+    if fcntl is None:
+        yield
+        return
+    with open(MIGRATION_LOCK_FILE, "w") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+def migrate_json_to_db():
+    """Importa a SQLite los datos de los archivos JSON viejos"""
+    pending = [
+        (os.path.join(DATA_DIR, filename), table, columns)
+        for filename, table, columns in LEGACY_JSON_TABLES
+        if os.path.exists(os.path.join(DATA_DIR, filename))
+    ]
+    if not pending:
+        return
+    with migration_lock():
+        for path, table, columns in pending:
+            migrate_json_file(path, table, columns)
+
+def migrate_json_file(path, table, columns):
+    """Importa un archivo JSON viejo a su tabla y lo renombra a .migrated"""
+    filename = os.path.basename(path)
+    try:
+        data = parse_json_path(path)
+    except FileNotFoundError:
+        # Otro proceso lo migró mientras esperábamos el lock
+        return
+    except Exception as e:
+        logger.error(f"Error leyendo {filename} para migrar: {e}")
+        return
+
+    rows = [
+        (user_id, *(item.get(name, default) for name, default in columns))
+        for user_id, items in data.items()
+        for item in items
+    ]
+    names = ", ".join(name for name, _ in columns)
+    placeholders = ", ".join("?" * (len(columns) + 1))
+    with db_transaction() as conn:
+        # Si ya hay datos, la migración se hizo antes y solo falta renombrar
+        if conn.execute(f"SELECT 1 FROM {table} LIMIT 1").fetchone() is None:
+            conn.executemany(f"INSERT INTO {table} (user_id, {names}) VALUES ({placeholders})", rows)
+    try:
+        os.replace(path, f"{path}.migrated")
+    except FileNotFoundError:
+        # Ya lo renombró otro proceso
+        return
+    logger.info(f"[INIT] {filename} migrado a la base ({len(rows)} registros)")
+
+migrate_json_to_db()
+
 # ==================== PERFILES DE USUARIO ====================
 
 def load_user_profiles():
     """Carga los perfiles de usuario"""
-    if os.path.exists(USER_PROFILES_FILE):
-        try:
-            with open(USER_PROFILES_FILE, "r") as f:
-                return json.load(f)
-        except:
-            return {}
-    return {}
+    try:
+        return read_json_file(USER_PROFILES_FILE, {})
+    except:
+        return {}
 
 def save_user_profiles(profiles):
     """Guarda los perfiles de usuario"""
-    with open(USER_PROFILES_FILE, "w") as f:
-        json.dump(profiles, f, ensure_ascii=False)
+    write_json_file(USER_PROFILES_FILE, profiles)
 
 def get_user_profile(user_id):
     """Obtiene el perfil de un usuario"""
@@ -162,20 +497,16 @@ def is_adulto_mayor(user_id):
 
 # ==================== CHEQUEO DE BIENESTAR ====================
 
-def load_wellness_checks():
+def load_wellness_checks(readonly=False):
     """Carga los chequeos de bienestar"""
-    if os.path.exists(WELLNESS_CHECK_FILE):
-        try:
-            with open(WELLNESS_CHECK_FILE, "r") as f:
-                return json.load(f)
-        except:
-            return {}
-    return {}
+    try:
+        return read_json_file(WELLNESS_CHECK_FILE, {}, readonly)
+    except:
+        return {}
 
 def save_wellness_checks(checks):
     """Guarda los chequeos de bienestar"""
-    with open(WELLNESS_CHECK_FILE, "w") as f:
-        json.dump(checks, f, ensure_ascii=False)
+    write_json_file(WELLNESS_CHECK_FILE, checks)
 
 def set_wellness_pending(user_id):
     """Marca que hay un chequeo de bienestar pendiente"""
@@ -189,7 +520,7 @@ def set_wellness_pending(user_id):
 
 def get_wellness_pending(user_id):
     """Obtiene el chequeo pendiente"""
-    checks = load_wellness_checks()
+    checks = load_wellness_checks(readonly=True)
     pending = checks.get(user_id)
     if pending and pending.get("date") == datetime.now(TIMEZONE).strftime("%Y-%m-%d"):
         return pending
@@ -206,12 +537,19 @@ def mark_wellness_responded(user_id, response):
 
 def send_wellness_check():
     """Envía chequeo de seguridad/bienestar a usuarios que tienen cuidador"""
-    print(f"[{datetime.now()}] Enviando chequeos de seguridad...")
+    logger.info(f"[{datetime.now()}] Enviando chequeos de seguridad...")
 
-    caregivers = load_caregivers()
+    caregivers = load_caregivers(readonly=True)
     now = datetime.now(TIMEZONE)
     is_morning = now.hour < 12
 
+    # Mensaje diferente según la hora
+    if is_morning:
+        message = "☀️ *Chequeo de seguridad matutino*\n\n¿Cómo te sentís hoy?\n\n👍 Respondé *bien*, *mal* o contame cómo estás.\n\n_Si no respondés en 30 min, se avisará a tu cuidador_"
+    else:
+        message = "🌤️ *Chequeo de seguridad vespertino*\n\n¿Todo bien?\n\n👍 Respondé *bien* o contame cómo estás.\n\n_Si no respondés en 30 min, se avisará a tu cuidador_"
+
+    recipients = []
     for user_id in caregivers.keys():
         # Solo enviar a usuarios que tienen cuidador configurado
         caregiver = get_caregiver(user_id)
@@ -229,22 +567,18 @@ def send_wellness_check():
             if (now - sent_at).total_seconds() < 4 * 3600:
                 continue
 
-        # Mensaje diferente según la hora
-        if is_morning:
-            message = "☀️ *Chequeo de seguridad matutino*\n\n¿Cómo te sentís hoy?\n\n👍 Respondé *bien*, *mal* o contame cómo estás.\n\n_Si no respondés en 30 min, se avisará a tu cuidador_"
-        else:
-            message = "🌤️ *Chequeo de seguridad vespertino*\n\n¿Todo bien?\n\n👍 Respondé *bien* o contame cómo estás.\n\n_Si no respondés en 30 min, se avisará a tu cuidador_"
+        recipients.append(user_id)
 
-        try:
-            send_whatsapp_message(user_id, message)
+    # Enviar todos en paralelo y marcarlos pendientes con una sola escritura
+    send_whatsapp_messages([(user_id, message) for user_id in recipients])
+    with batched_json_files():
+        for user_id in recipients:
             set_wellness_pending(user_id)
-            print(f"Chequeo de seguridad enviado a {user_id}")
-        except Exception as e:
-            print(f"Error enviando chequeo: {e}")
+            logger.info(f"Chequeo de seguridad enviado a {user_id}")
 
 def check_wellness_responses():
     """Verifica respuestas a chequeos de bienestar y alerta si no respondió"""
-    print(f"[{datetime.now()}] Verificando respuestas de bienestar...")
+    logger.info(f"[{datetime.now()}] Verificando respuestas de bienestar...")
 
     checks = load_wellness_checks()
     now = datetime.now(TIMEZONE)
@@ -267,9 +601,9 @@ def check_wellness_responses():
                 send_whatsapp_message(user_id, reminder_msg)
                 check["reminder_sent"] = True
                 updated = True
-                print(f"Recordatorio de bienestar enviado a {user_id}")
+                logger.info(f"Recordatorio de bienestar enviado a {user_id}")
             except Exception as e:
-                print(f"Error enviando recordatorio: {e}")
+                logger.error(f"Error enviando recordatorio: {e}")
 
         # A los 30 minutos: alertar al cuidador
         elif minutes_passed >= 30:
@@ -282,34 +616,54 @@ def check_wellness_responses():
                     send_whatsapp_message(caregiver, alert_msg)
                     check["alerted"] = True
                     updated = True
-                    print(f"Alerta de bienestar enviada al cuidador de {user_id}")
+                    logger.info(f"Alerta de bienestar enviada al cuidador de {user_id}")
                 except Exception as e:
-                    print(f"Error enviando alerta de bienestar: {e}")
+                    logger.error(f"Error enviando alerta de bienestar: {e}")
 
     if updated:
         save_wellness_checks(checks)
 
+# ==================== USUARIOS REGISTRADOS ====================
+
+REGISTERED_USERS_FILE = os.path.join(DATA_DIR, "registered_users.json")
+
+def load_registered_users(readonly=False):
+    """Carga los números de WhatsApp registrados para recordatorios"""
+    try:
+        return read_json_file(REGISTERED_USERS_FILE, [], readonly)
+    except:
+        return []
+
+def register_user(user_id):
+    """Registra un número para recordatorios (en memoria y en archivo)"""
+    registered_users.add(user_id)
+    users = load_registered_users()
+    if user_id not in users:
+        users.append(user_id)
+        write_json_file(REGISTERED_USERS_FILE, users)
+
+# En memoria para chequear cada mensaje sin leer el archivo; persistido para
+# no perder los registros en cada redeploy
+registered_users = set(load_registered_users())
+
 # ==================== REGISTRO DE ACTIVIDAD ====================
 
-def load_user_activity():
+def load_user_activity(readonly=False):
     """Carga el registro de actividad"""
-    if os.path.exists(USER_ACTIVITY_FILE):
-        try:
-            with open(USER_ACTIVITY_FILE, "r") as f:
-                return json.load(f)
-        except:
-            return {}
-    return {}
+    try:
+        return read_json_file(USER_ACTIVITY_FILE, {}, readonly)
+    except:
+        return {}
 
 def save_user_activity(activity):
     """Guarda el registro de actividad"""
-    with open(USER_ACTIVITY_FILE, "w") as f:
-        json.dump(activity, f, ensure_ascii=False)
+    write_json_file(USER_ACTIVITY_FILE, activity)
 
-def record_user_activity(user_id):
+def record_user_activity(user_id, now=None):
     """Registra actividad del usuario"""
     activity = load_user_activity()
-    now = datetime.now(TIMEZONE)
+    if now is None:
+        now = datetime.now(TIMEZONE)
 
     if user_id not in activity:
         activity[user_id] = {"last_seen": None, "daily_messages": {}}
@@ -331,7 +685,7 @@ def record_user_activity(user_id):
 
 def get_user_average_activity(user_id):
     """Obtiene el promedio de mensajes diarios del usuario"""
-    activity = load_user_activity()
+    activity = load_user_activity(readonly=True)
     if user_id not in activity:
         return 0
 
@@ -343,9 +697,9 @@ def get_user_average_activity(user_id):
 
 def check_user_inactivity():
     """Verifica inactividad inusual y alerta al cuidador"""
-    print(f"[{datetime.now()}] Verificando inactividad de usuarios...")
+    logger.info(f"[{datetime.now()}] Verificando inactividad de usuarios...")
 
-    caregivers = load_caregivers()
+    caregivers = load_caregivers(readonly=True)
     activity = load_user_activity()
     now = datetime.now(TIMEZONE)
     today = now.strftime("%Y-%m-%d")
@@ -379,55 +733,44 @@ def check_user_inactivity():
                     activity[user_id] = {"daily_messages": {}}
                 activity[user_id]["inactivity_alert_date"] = today
                 save_user_activity(activity)
-                print(f"Alerta de inactividad enviada al cuidador de {user_id}")
+                logger.info(f"Alerta de inactividad enviada al cuidador de {user_id}")
             except Exception as e:
-                print(f"Error enviando alerta de inactividad: {e}")
+                logger.error(f"Error enviando alerta de inactividad: {e}")
 
 # ==================== RECORDATORIO DE HIDRATACIÓN ====================
 
+HYDRATION_MESSAGES = (
+    "💧 ¡Recordatorio! ¿Tomaste agua? Mantenerse hidratado es importante.",
+    "💧 ¿Ya tomaste un vaso de agua? ¡Tu cuerpo lo agradece!",
+    "💧 Momento de hidratarse. ¿Tomaste agua recientemente?",
+    "💧 ¡No te olvides de tomar agua! Es bueno para tu salud."
+)
+
 def send_hydration_reminder():
     """Envía recordatorio de hidratación a usuarios con cuidador"""
-    print(f"[{datetime.now()}] Enviando recordatorios de hidratación...")
-
-    caregivers = load_caregivers()
+    logger.info(f"[{datetime.now()}] Enviando recordatorios de hidratación...")
 
-    for user_id in caregivers.keys():
-        # Solo enviar a usuarios que tienen cuidador
-        caregiver = get_caregiver(user_id)
-        if not caregiver:
-            continue
+    caregivers = load_caregivers(readonly=True)
 
-        messages = [
-            "💧 ¡Recordatorio! ¿Tomaste agua? Mantenerse hidratado es importante.",
-            "💧 ¿Ya tomaste un vaso de agua? ¡Tu cuerpo lo agradece!",
-            "💧 Momento de hidratarse. ¿Tomaste agua recientemente?",
-            "💧 ¡No te olvides de tomar agua! Es bueno para tu salud."
-        ]
-        import random
-        message = random.choice(messages)
+    # Solo a usuarios que tienen cuidador
+    recipients = [user_id for user_id in caregivers.keys() if get_caregiver(user_id)]
 
-        try:
-            send_whatsapp_message(user_id, message)
-            print(f"Recordatorio de hidratación enviado a {user_id}")
-        except Exception as e:
-            print(f"Error enviando recordatorio de hidratación: {e}")
+    send_whatsapp_messages([(user_id, random.choice(HYDRATION_MESSAGES)) for user_id in recipients])
+    for user_id in recipients:
+        logger.info(f"Recordatorio de hidratación enviado a {user_id}")
 
 # ==================== HISTORIAL DE CONVERSACIONES ====================
 
 def load_conversations():
     """Carga el historial de conversaciones desde archivo"""
-    if os.path.exists(CONVERSATIONS_FILE):
-        try:
-            with open(CONVERSATIONS_FILE, "r") as f:
-                return json.load(f)
-        except:
-            return {}
-    return {}
+    try:
+        return read_json_file(CONVERSATIONS_FILE, {})
+    except:
+        return {}
 
 def save_conversations(conversations):
     """Guarda el historial de conversaciones"""
-    with open(CONVERSATIONS_FILE, "w") as f:
-        json.dump(conversations, f, ensure_ascii=False)
+    write_json_file(CONVERSATIONS_FILE, conversations)
 
 def get_conversation(user_id):
     """Obtiene la conversación de un usuario"""
@@ -436,87 +779,82 @@ def get_conversation(user_id):
 
 def add_to_conversation(user_id, role, content):
     """Agrega un mensaje a la conversación"""
-    conversations = load_conversations()
-    if user_id not in conversations:
-        conversations[user_id] = []
+    add_turns_to_conversation(user_id, [{"role": role, "content": content}])
 
-    conversations[user_id].append({"role": role, "content": content})
+CONVERSATION_MAX_TURNS = 50
 
-    # Mantener los últimos 50 mensajes para buen contexto
-    if len(conversations[user_id]) > 50:
-        conversations[user_id] = conversations[user_id][-50:]
+# Las respuestas de distintos usuarios se guardan en paralelo (ai_pool, webhook):
+# sin el lock, dos lecturas-modificaciones-escrituras del mismo archivo se pisan
+CONVERSATIONS_LOCK = threading.Lock()
 
-    save_conversations(conversations)
+def add_turns_to_conversation(user_id, turns):
+    """Agrega varios mensajes a la conversación con una sola escritura"""
+    with CONVERSATIONS_LOCK:
+        conversations = load_conversations()
+        history = conversations.setdefault(user_id, [])
+        history.extend(turns)
 
-# ==================== SISTEMA DE TAREAS ====================
+        # Mantener los últimos 50 mensajes para buen contexto (recortando en el lugar)
+        del history[:-CONVERSATION_MAX_TURNS]
 
-def load_tasks():
-    """Carga las tareas desde el archivo JSON"""
-    if os.path.exists(TASKS_FILE):
-        with open(TASKS_FILE, "r") as f:
-            return json.load(f)
-    return {}
+        save_conversations(conversations)
 
-def save_tasks(tasks):
-    """Guarda las tareas en el archivo JSON"""
-    with open(TASKS_FILE, "w") as f:
-        json.dump(tasks, f, indent=2, ensure_ascii=False)
+# ==================== SISTEMA DE TAREAS ====================
 
 def add_task(user_id, task_text):
     """Agrega una tarea para un usuario"""
-    tasks = load_tasks()
-    if user_id not in tasks:
-        tasks[user_id] = []
-
     task = {
-        "id": len(tasks[user_id]) + 1,
         "text": task_text,
         "done": False,
         "created": datetime.now(TIMEZONE).isoformat()
     }
-    tasks[user_id].append(task)
-    save_tasks(tasks)
+    with db_transaction() as conn:
+        task["id"] = next_user_id(conn, "tasks", user_id)
+        conn.execute(
+            "INSERT INTO tasks (user_id, id, text, done, created) VALUES (?, ?, ?, 0, ?)",
+            (user_id, task["id"], task_text, task["created"]),
+        )
     return task
 
 def complete_task(user_id, task_id):
     """Marca una tarea como completada"""
-    tasks = load_tasks()
-    if user_id in tasks:
-        for task in tasks[user_id]:
-            if task["id"] == task_id:
-                task["done"] = True
-                save_tasks(tasks)
-                return True
-    return False
+    with db_transaction() as conn:
+        cursor = conn.execute(
+            "UPDATE tasks SET done = 1, completed = ? WHERE user_id = ? AND id = ?",
+            (datetime.now(TIMEZONE).isoformat(), user_id, task_id),
+        )
+    return cursor.rowcount > 0
 
 def delete_task(user_id, task_id):
     """Elimina una tarea"""
-    tasks = load_tasks()
-    if user_id in tasks:
-        tasks[user_id] = [t for t in tasks[user_id] if t["id"] != task_id]
-        # Reordenar IDs
-        for i, task in enumerate(tasks[user_id]):
-            task["id"] = i + 1
-        save_tasks(tasks)
-        return True
-    return False
+    with db_transaction() as conn:
+        cursor = conn.execute("DELETE FROM tasks WHERE user_id = ? AND id = ?", (user_id, task_id))
+    return cursor.rowcount > 0
 
 def clear_all_tasks(user_id):
     """Elimina TODAS las tareas de un usuario"""
-    tasks = load_tasks()
-    if user_id in tasks:
-        tasks[user_id] = []
-        save_tasks(tasks)
-        return True
-    return False
+    with db_transaction() as conn:
+        cursor = conn.execute("DELETE FROM tasks WHERE user_id = ?", (user_id,))
+    return cursor.rowcount > 0
 
 def get_tasks(user_id, include_done=False):
     """Obtiene las tareas de un usuario"""
-    tasks = load_tasks()
-    user_tasks = tasks.get(user_id, [])
+    sql = "SELECT id, text, done, created FROM tasks WHERE user_id = ?"
     if not include_done:
-        user_tasks = [t for t in user_tasks if not t["done"]]
-    return user_tasks
+        sql += " AND done = 0"
+    tasks = db_rows(sql + " ORDER BY seq", (user_id,))
+    for task in tasks:
+        task["done"] = bool(task["done"])
+    return tasks
+
+def count_tasks(user_id, day):
+    """Cuenta las tareas completadas en el día (YYYY-MM-DD) y las pendientes"""
+    row = db_rows(
+        "SELECT COALESCE(SUM(done = 1 AND completed LIKE ?), 0) AS completed, "
+        "COALESCE(SUM(done = 0), 0) AS pending FROM tasks WHERE user_id = ?",
+        (f"{day}%", user_id),
+    )[0]
+    return row["completed"], row["pending"]
 
 def format_tasks(user_id):
     """Formatea las tareas para mostrar"""
@@ -524,55 +862,35 @@ def format_tasks(user_id):
     if not tasks:
         return "No tienes tareas pendientes."
 
-    result = "📋 *Tus tareas pendientes:*\n"
-    for task in tasks:
-        result += f"{task['id']}. {task['text']}\n"
-    return result
+    parts = ["📋 *Tus tareas pendientes:*\n"]
+    parts.extend(f"{task['id']}. {task['text']}\n" for task in tasks)
+    return "".join(parts)
 
 # ==================== SISTEMA DE NOTAS ====================
 
-def load_notes():
-    """Carga las notas desde el archivo JSON"""
-    if os.path.exists(NOTES_FILE):
-        with open(NOTES_FILE, "r") as f:
-            return json.load(f)
-    return {}
-
-def save_notes(notes):
-    """Guarda las notas en el archivo JSON"""
-    with open(NOTES_FILE, "w") as f:
-        json.dump(notes, f, indent=2, ensure_ascii=False)
-
 def add_note(user_id, note_text):
     """Agrega una nota para un usuario"""
-    notes = load_notes()
-    if user_id not in notes:
-        notes[user_id] = []
-
     note = {
-        "id": len(notes[user_id]) + 1,
         "text": note_text,
         "created": datetime.now(TIMEZONE).strftime("%Y-%m-%d %H:%M")
     }
-    notes[user_id].append(note)
-    save_notes(notes)
+    with db_transaction() as conn:
+        note["id"] = next_user_id(conn, "notes", user_id)
+        conn.execute(
+            "INSERT INTO notes (user_id, id, text, created) VALUES (?, ?, ?, ?)",
+            (user_id, note["id"], note_text, note["created"]),
+        )
     return note
 
 def get_notes(user_id):
     """Obtiene las notas de un usuario"""
-    notes = load_notes()
-    return notes.get(user_id, [])
+    return db_rows("SELECT id, text, created FROM notes WHERE user_id = ? ORDER BY seq", (user_id,))
 
 def delete_note(user_id, note_id):
     """Elimina una nota"""
-    notes = load_notes()
-    if user_id in notes:
-        notes[user_id] = [n for n in notes[user_id] if n["id"] != note_id]
-        for i, note in enumerate(notes[user_id]):
-            note["id"] = i + 1
-        save_notes(notes)
-        return True
-    return False
+    with db_transaction() as conn:
+        cursor = conn.execute("DELETE FROM notes WHERE user_id = ? AND id = ?", (user_id, note_id))
+    return cursor.rowcount > 0
 
 def format_notes(user_id):
     """Formatea las notas para mostrar"""
@@ -580,10 +898,53 @@ def format_notes(user_id):
     if not notes:
         return "No tienes notas guardadas."
 
-    result = "📝 *Tus notas:*\n"
-    for note in notes:
-        result += f"{note['id']}. {note['text']} _({note['created']})_\n"
-    return result
+    parts = ["📝 *Tus notas:*\n"]
+    parts.extend(f"{note['id']}. {note['text']} _({note['created']})_\n" for note in notes)
+    return "".join(parts)
+
+# ==================== CACHÉ DE CONSULTAS EXTERNAS ====================
+
+# Entradas por caché: al pasarse se descarta la usada hace más tiempo (LRU)
+TTL_CACHE_SIZE = 64
+TTL_CACHE_LOCK = threading.Lock()
+
+def ttl_cache_get(cache, key):
+    """Valor vigente de la caché (o None), marcándolo como usado recientemente"""
+    with TTL_CACHE_LOCK:
+        entry = cache.pop(key, None)
+        if entry is None or entry[0] <= time.time():
+            return None
+        cache[key] = entry
+    return entry[1]
+
+def ttl_cache_set(cache, key, value, ttl, maxsize=TTL_CACHE_SIZE):
+    """Guarda un valor por ttl segundos, descartando el menos usado si no hay lugar"""
+    with TTL_CACHE_LOCK:
+        cache.pop(key, None)
+        cache[key] = (time.time() + ttl, value)
+        while len(cache) > maxsize:
+            del cache[next(iter(cache))]
+
+def ttl_cached(ttl, errors=()):
+    """Decorador: reutiliza el resultado por ttl segundos (según los argumentos)
+    No guarda resultados vacíos ni los mensajes de error indicados
+    """
+    def decorator(func):
+        cache = {}
+
+        @wraps(func)
+        def wrapper(*args):
+            cached = ttl_cache_get(cache, args)
+            if cached is not None:
+                return cached
+            result = func(*args)
+            if result and result not in errors:
+                ttl_cache_set(cache, args, result, ttl)
+            return result
+
+        wrapper.cache = cache
+        return wrapper
+    return decorator
 
 # ==================== CLIMA ====================
 
@@ -604,7 +965,7 @@ def get_weather_openmeteo(city="Cordoba,Argentina"):
 
         url = f"https://api.open-meteo.com/v1/forecast?latitude={lat}&longitude={lon}&current=temperature_2m,relative_humidity_2m,apparent_temperature,weather_code&daily=temperature_2m_max,temperature_2m_min&timezone=America/Argentina/Buenos_Aires"
 
-        response = requests.get(url, timeout=10)
+        response = http_session.get(url, timeout=FETCH_TIMEOUT)
         if response.status_code != 200:
             return None
 
@@ -648,10 +1009,26 @@ def get_weather_openmeteo(city="Cordoba,Argentina"):
 💧 Humedad: {humidity}%
 📝 {desc}"""
     except Exception as e:
-        print(f"Error Open-Meteo: {e}")
+        logger.error(f"Error Open-Meteo: {e}")
         return None
 
+# Clima ya consultado por ciudad (normalizada), válido por 10 minutos
+WEATHER_CACHE_TTL = 600
+weather_cache = {}
+WEATHER_ERROR_MESSAGE = "No pude obtener el clima en este momento."
+
 def get_weather(city="Cordoba,Argentina"):
+    """Obtiene el clima de una ciudad, reutilizando la consulta reciente si la hay"""
+    key = " ".join(city.lower().split())
+    weather = ttl_cache_get(weather_cache, key)
+    if weather is not None:
+        return weather
+    weather = fetch_weather(city)
+    if weather != WEATHER_ERROR_MESSAGE:
+        ttl_cache_set(weather_cache, key, weather, WEATHER_CACHE_TTL)
+    return weather
+
+def fetch_weather(city):
     """Obtiene el clima usando wttr.in, con Open-Meteo como fallback"""
     try:
         # Limpiar el nombre de la ciudad
@@ -662,11 +1039,11 @@ def get_weather(city="Cordoba,Argentina"):
         headers = {
             "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"
         }
-        response = requests.get(url, timeout=10, headers=headers)
+        response = http_session.get(url, timeout=FETCH_TIMEOUT, headers=headers)
 
         if response.status_code != 200:
-            print(f"Error clima wttr.in: HTTP {response.status_code}, usando Open-Meteo")
-            return get_weather_openmeteo(city) or "No pude obtener el clima en este momento."
+            logger.warning(f"Error clima wttr.in: HTTP {response.status_code}, usando Open-Meteo")
+            return get_weather_openmeteo(city) or WEATHER_ERROR_MESSAGE
 
         data = response.json()
 
@@ -697,37 +1074,33 @@ def get_weather(city="Cordoba,Argentina"):
 
         return weather_info
     except requests.exceptions.Timeout:
-        print("Error clima wttr.in: Timeout, usando Open-Meteo")
-        return get_weather_openmeteo(city) or "No pude obtener el clima en este momento."
+        logger.warning("Error clima wttr.in: Timeout, usando Open-Meteo")
+        return get_weather_openmeteo(city) or WEATHER_ERROR_MESSAGE
     except Exception as e:
-        print(f"Error obteniendo clima wttr.in: {e}, usando Open-Meteo")
-        return get_weather_openmeteo(city) or "No pude obtener el clima en este momento."
+        logger.warning(f"Error obteniendo clima wttr.in: {e}, usando Open-Meteo")
+        return get_weather_openmeteo(city) or WEATHER_ERROR_MESSAGE
 
 # ==================== MEDICAMENTOS ====================
 
 MEDS_FILE = os.path.join(DATA_DIR, "medications.json")
 PENDING_MED_CONFIRMATIONS_FILE = os.path.join(DATA_DIR, "pending_med_confirmations.json")
 
-def load_medications():
+def load_medications(readonly=False):
     """Carga los medicamentos desde el archivo JSON"""
-    if os.path.exists(MEDS_FILE):
-        try:
-            with open(MEDS_FILE, "r") as f:
-                return json.load(f)
-        except:
-            return {}
-    return {}
+    try:
+        return read_json_file(MEDS_FILE, {}, readonly)
+    except:
+        return {}
 
 def save_medications(meds):
     """Guarda los medicamentos en el archivo JSON"""
-    with open(MEDS_FILE, "w") as f:
-        json.dump(meds, f, indent=2, ensure_ascii=False)
+    write_json_file(MEDS_FILE, meds, indent=2)
 
 def add_medication(user_id, med_name):
     """Agrega un medicamento para un usuario"""
     meds = load_medications()
     if user_id not in meds:
-        meds[user_id] = {"medications": [], "log": []}
+        meds[user_id] = {"medications": [], "log_by_date": {}}
 
     if med_name not in meds[user_id]["medications"]:
         meds[user_id]["medications"].append(med_name)
@@ -746,7 +1119,7 @@ def remove_medication(user_id, med_name):
 
 def get_medications(user_id):
     """Obtiene los medicamentos de un usuario"""
-    meds = load_medications()
+    meds = load_medications(readonly=True)
     if user_id in meds:
         return meds[user_id].get("medications", [])
     return []
@@ -755,37 +1128,54 @@ def log_medication_taken(user_id, period):
     """Registra que se tomaron los medicamentos"""
     meds = load_medications()
     if user_id not in meds:
-        meds[user_id] = {"medications": [], "log": []}
+        meds[user_id] = {"medications": [], "log_by_date": {}}
 
-    today = datetime.now(TIMEZONE).strftime("%Y-%m-%d")
-    now_time = datetime.now(TIMEZONE).strftime("%H:%M")
-    log_entry = {"date": today, "period": period, "taken": True, "time": now_time}
-    meds[user_id]["log"].append(log_entry)
+    now = datetime.now(TIMEZONE)
+    today = now.strftime("%Y-%m-%d")
+    log_entry = {"date": today, "period": period, "taken": True, "time": now.strftime("%H:%M")}
+    log_by_date = get_med_log_by_date(meds[user_id])
+    log_by_date.setdefault(today, []).append(log_entry)
 
     # Mantener solo los últimos 60 días de log
-    meds[user_id]["log"] = meds[user_id]["log"][-120:]
+    cutoff = (now - timedelta(days=60)).strftime("%Y-%m-%d")
+    meds[user_id]["log_by_date"] = {d: e for d, e in log_by_date.items() if d >= cutoff}
+    meds[user_id].pop("log", None)
     save_medications(meds)
 
+def get_med_log_by_date(user_meds):
+    """Devuelve el log de medicamentos agrupado por fecha (convierte el formato antiguo)"""
+    log_by_date = user_meds.get("log_by_date")
+    if log_by_date is None:
+        # Formato antiguo: lista plana de entradas
+        log_by_date = {}
+        for entry in user_meds.get("log", []):
+            log_by_date.setdefault(entry.get("date", ""), []).append(entry)
+    return log_by_date
+
+def last_dates(now, days=7):
+    """Fechas (YYYY-MM-DD) de los últimos días, incluyendo hoy"""
+    return [(now - timedelta(days=i)).strftime("%Y-%m-%d") for i in range(days)]
+
 def check_medication_taken_today(user_id, period):
     """Verifica si ya se registró la toma de medicamentos hoy"""
-    meds = load_medications()
+    meds = load_medications(readonly=True)
     if user_id not in meds:
         return False
 
     today = datetime.now(TIMEZONE).strftime("%Y-%m-%d")
-    for entry in meds[user_id].get("log", []):
-        if entry.get("date") == today and entry.get("period") == period:
+    for entry in get_med_log_by_date(meds[user_id]).get(today, []):
+        if entry.get("period") == period:
             return True
     return False
 
 def get_todays_medication_log(user_id):
     """Obtiene el log de medicamentos de hoy"""
-    meds = load_medications()
+    meds = load_medications(readonly=True)
     if user_id not in meds:
         return []
 
     today = datetime.now(TIMEZONE).strftime("%Y-%m-%d")
-    return [entry for entry in meds[user_id].get("log", []) if entry.get("date") == today]
+    return list(get_med_log_by_date(meds[user_id]).get(today, []))
 
 def format_medications(user_id):
     """Formatea la lista de medicamentos"""
@@ -793,26 +1183,21 @@ def format_medications(user_id):
     if not meds:
         return "💊 No tienes medicamentos registrados."
 
-    result = "💊 *Tus medicamentos:*\n"
-    for i, med in enumerate(meds, 1):
-        result += f"  {i}. {med}\n"
-    return result
+    parts = ["💊 *Tus medicamentos:*\n"]
+    parts.extend(f"  {i}. {med}\n" for i, med in enumerate(meds, 1))
+    return "".join(parts)
 
 # Sistema de confirmaciones pendientes
 def load_pending_confirmations():
     """Carga confirmaciones pendientes de medicamentos"""
-    if os.path.exists(PENDING_MED_CONFIRMATIONS_FILE):
-        try:
-            with open(PENDING_MED_CONFIRMATIONS_FILE, "r") as f:
-                return json.load(f)
-        except:
-            return {}
-    return {}
+    try:
+        return read_json_file(PENDING_MED_CONFIRMATIONS_FILE, {})
+    except:
+        return {}
 
 def save_pending_confirmations(confirmations):
     """Guarda confirmaciones pendientes"""
-    with open(PENDING_MED_CONFIRMATIONS_FILE, "w") as f:
-        json.dump(confirmations, f, ensure_ascii=False)
+    write_json_file(PENDING_MED_CONFIRMATIONS_FILE, confirmations)
 
 def set_pending_confirmation(user_id, period, attempt=1):
     """Marca que hay una confirmación pendiente"""
@@ -849,10 +1234,11 @@ def has_pending_medication_confirmation(user_id):
 
 def send_medication_reminder(period):
     """Envía recordatorio de medicamentos (primer intento)"""
-    print(f"[{datetime.now()}] Enviando recordatorio de medicamentos ({period})...")
+    logger.info(f"[{datetime.now()}] Enviando recordatorio de medicamentos ({period})...")
 
-    meds = load_medications()
+    meds = load_medications(readonly=True)
 
+    messages = []
     for user_id in meds:
         if meds[user_id].get("medications"):
             # Verificar si ya tomó los medicamentos
@@ -860,18 +1246,18 @@ def send_medication_reminder(period):
                 med_list = ", ".join(meds[user_id]["medications"])
 
                 message = f"💊 *¿Tomaste tus medicamentos?*\n\n📋 {med_list}\n\n👉 Respondé *sí* o *tomé* para confirmar."
+                messages.append((user_id, message))
 
-                try:
-                    send_whatsapp_message(user_id, message)
-                    # Marcar confirmación pendiente (intento 1)
-                    set_pending_confirmation(user_id, period, attempt=1)
-                    print(f"Recordatorio de medicamentos enviado a {user_id}")
-                except Exception as e:
-                    print(f"Error enviando recordatorio a {user_id}: {e}")
+    # Enviar todos en paralelo y marcar las confirmaciones pendientes (intento 1) juntas
+    send_whatsapp_messages(messages)
+    with batched_json_files():
+        for user_id, _ in messages:
+            set_pending_confirmation(user_id, period, attempt=1)
+            logger.info(f"Recordatorio de medicamentos enviado a {user_id}")
 
 def check_medication_confirmations():
     """Revisa confirmaciones pendientes y envía segundo aviso o alerta"""
-    print(f"[{datetime.now()}] Verificando confirmaciones de medicamentos...")
+    logger.info(f"[{datetime.now()}] Verificando confirmaciones de medicamentos...")
 
     confirmations = load_pending_confirmations()
     now = datetime.now(TIMEZONE)
@@ -892,7 +1278,7 @@ def check_medication_confirmations():
 
         if pending["attempt"] == 1 and minutes_passed >= 5:
             # Segundo intento después de 5 minutos
-            meds = load_medications()
+            meds = load_medications(readonly=True)
             if user_id in meds and meds[user_id].get("medications"):
                 med_list = ", ".join(meds[user_id]["medications"])
                 message = f"⚠️ *Segundo aviso de medicamentos*\n\n📋 {med_list}\n\n👉 Por favor respondé *sí* o *tomé* para confirmar que los tomaste."
@@ -900,41 +1286,41 @@ def check_medication_confirmations():
                 try:
                     send_whatsapp_message(user_id, message)
                     set_pending_confirmation(user_id, pending["period"], attempt=2)
-                    print(f"Segundo recordatorio enviado a {user_id}")
+                    logger.info(f"Segundo recordatorio enviado a {user_id}")
                 except Exception as e:
-                    print(f"Error enviando segundo recordatorio: {e}")
+                    logger.error(f"Error enviando segundo recordatorio: {e}")
 
         elif pending["attempt"] == 2 and minutes_passed >= 5:
             # Alertar al cuidador después de 5 minutos más
             caregiver = get_caregiver(user_id)
             if caregiver:
                 user_display = user_id.replace('whatsapp:', '')
-                meds = load_medications()
+                meds = load_medications(readonly=True)
                 med_list = ", ".join(meds.get(user_id, {}).get("medications", []))
 
                 alert_msg = f"⚠️ *ALERTA: Medicamentos no confirmados*\n\n{user_display} no ha confirmado la toma de medicamentos.\n\n📋 Medicamentos: {med_list}\n📅 Fecha: {now.strftime('%d/%m/%Y')}\n⏰ Hora: {now.strftime('%H:%M')}\n\nSe enviaron 2 recordatorios sin respuesta."
 
                 try:
                     send_whatsapp_message(caregiver, alert_msg)
-                    print(f"Alerta de medicamentos enviada al cuidador de {user_id}")
+                    logger.info(f"Alerta de medicamentos enviada al cuidador de {user_id}")
                 except Exception as e:
-                    print(f"Error enviando alerta al cuidador: {e}")
+                    logger.error(f"Error enviando alerta al cuidador: {e}")
 
             # Limpiar confirmación pendiente
             clear_pending_confirmation(user_id)
 
 def send_daily_medication_report():
     """Envía reporte diario de medicamentos a los cuidadores"""
-    print(f"[{datetime.now()}] Enviando reporte diario de medicamentos...")
+    logger.info(f"[{datetime.now()}] Enviando reporte diario de medicamentos...")
 
-    meds = load_medications()
-    caregivers_data = load_caregivers()
+    meds = load_medications(readonly=True)
 
+    reports = []
     for user_id in meds:
         if not meds[user_id].get("medications"):
             continue
 
-        caregiver = caregivers_data.get(user_id)
+        caregiver = get_caregiver(user_id)
         if not caregiver:
             continue
 
@@ -971,11 +1357,12 @@ def send_daily_medication_report():
         if missing:
             report += f"\n⚠️ *Sin confirmar:* {', '.join(missing)}"
 
-        try:
-            send_whatsapp_message(caregiver, report)
-            print(f"Reporte diario enviado al cuidador de {user_id}")
-        except Exception as e:
-            print(f"Error enviando reporte diario: {e}")
+        reports.append((user_id, caregiver, report))
+
+    # Enviar todos en paralelo
+    send_whatsapp_messages([(caregiver, report) for _, caregiver, report in reports])
+    for user_id, _, _ in reports:
+        logger.info(f"Reporte diario enviado al cuidador de {user_id}")
 
 # ==================== RECORDATORIOS PERSONALIZADOS ====================
 
@@ -983,18 +1370,14 @@ REMINDERS_FILE = os.path.join(DATA_DIR, "reminders.json")
 
 def load_reminders():
     """Carga los recordatorios desde el archivo JSON"""
-    if os.path.exists(REMINDERS_FILE):
-        try:
-            with open(REMINDERS_FILE, "r") as f:
-                return json.load(f)
-        except:
-            return {}
-    return {}
+    try:
+        return read_json_file(REMINDERS_FILE, {})
+    except:
+        return {}
 
 def save_reminders(reminders):
     """Guarda los recordatorios"""
-    with open(REMINDERS_FILE, "w") as f:
-        json.dump(reminders, f, indent=2, ensure_ascii=False)
+    write_json_file(REMINDERS_FILE, reminders)
 
 def add_reminder(user_id, message, remind_at):
     """Agrega un recordatorio"""
@@ -1006,6 +1389,7 @@ def add_reminder(user_id, message, remind_at):
         "id": len(reminders[user_id]) + 1,
         "message": message,
         "remind_at": remind_at,
+        "remind_at_epoch": remind_at_to_epoch(remind_at),
         "created": datetime.now(TIMEZONE).isoformat(),
         "sent": False
     }
@@ -1013,6 +1397,20 @@ def add_reminder(user_id, message, remind_at):
     save_reminders(reminders)
     return reminder
 
+def remind_at_to_epoch(remind_at):
+    """Convierte la fecha ISO de un recordatorio a segundos epoch"""
+    dt = datetime.fromisoformat(remind_at)
+    if dt.tzinfo is None:
+        dt = TIMEZONE.localize(dt)
+    return dt.timestamp()
+
+def get_reminder_epoch(reminder):
+    """Momento del recordatorio en segundos epoch (recordatorios viejos no lo tienen guardado)"""
+    epoch = reminder.get("remind_at_epoch")
+    if epoch is None:
+        epoch = remind_at_to_epoch(reminder["remind_at"])
+    return epoch
+
 def get_pending_reminders(user_id):
     """Obtiene recordatorios pendientes"""
     reminders = load_reminders()
@@ -1046,20 +1444,22 @@ def format_reminders(user_id):
     if not pending:
         return "⏰ No tienes recordatorios pendientes."
 
-    result = "⏰ *Tus recordatorios:*\n"
+    parts = ["⏰ *Tus recordatorios:*\n"]
     for r in pending:
         try:
             remind_time = datetime.fromisoformat(r["remind_at"])
             time_str = remind_time.strftime("%d/%m %H:%M")
-            result += f"  {r['id']}. {r['message']} - {time_str}\n"
+            parts.append(f"  {r['id']}. {r['message']} - {time_str}\n")
         except:
-            result += f"  {r['id']}. {r['message']}\n"
-    return result
+            parts.append(f"  {r['id']}. {r['message']}\n")
+    return "".join(parts)
 
 def check_and_send_custom_reminders():
     """Revisa y envía recordatorios personalizados"""
     reminders = load_reminders()
-    now = datetime.now(TIMEZONE)
+    now_ts = time.time()
+
+    due = []
 
     for user_id in reminders:
         for reminder in reminders[user_id]:
@@ -1067,17 +1467,22 @@ def check_and_send_custom_reminders():
                 continue
 
             try:
-                remind_at = datetime.fromisoformat(reminder["remind_at"])
-                if remind_at.tzinfo is None:
-                    remind_at = TIMEZONE.localize(remind_at)
-
-                if now >= remind_at:
-                    message = f"⏰ *Recordatorio:*\n\n{reminder['message']}"
-                    send_whatsapp_message(user_id, message)
-                    mark_reminder_sent(user_id, reminder["id"])
-                    print(f"Recordatorio enviado a {user_id}: {reminder['message']}")
+                if now_ts >= get_reminder_epoch(reminder):
+                    due.append((user_id, reminder))
             except Exception as e:
-                print(f"Error procesando recordatorio: {e}")
+                logger.error(f"Error procesando recordatorio: {e}")
+
+    if not due:
+        return
+
+    # Enviar todos en paralelo y marcarlos con una sola escritura
+    send_whatsapp_messages(
+        [(user_id, f"⏰ *Recordatorio:*\n\n{reminder['message']}") for user_id, reminder in due]
+    )
+    with batched_json_files():
+        for user_id, reminder in due:
+            mark_reminder_sent(user_id, reminder["id"])
+            logger.info(f"Recordatorio enviado a {user_id}: {reminder['message']}")
 
 # ==================== LISTA DE COMPRAS ====================
 
@@ -1085,18 +1490,14 @@ SHOPPING_FILE = os.path.join(DATA_DIR, "shopping.json")
 
 def load_shopping():
     """Carga la lista de compras"""
-    if os.path.exists(SHOPPING_FILE):
-        try:
-            with open(SHOPPING_FILE, "r") as f:
-                return json.load(f)
-        except:
-            return {}
-    return {}
+    try:
+        return read_json_file(SHOPPING_FILE, {})
+    except:
+        return {}
 
 def save_shopping(shopping):
     """Guarda la lista de compras"""
-    with open(SHOPPING_FILE, "w") as f:
-        json.dump(shopping, f, indent=2, ensure_ascii=False)
+    write_json_file(SHOPPING_FILE, shopping)
 
 def add_shopping_item(user_id, item):
     """Agrega un item a la lista de compras"""
@@ -1104,8 +1505,9 @@ def add_shopping_item(user_id, item):
     if user_id not in shopping:
         shopping[user_id] = []
 
+    # IDs estables: no se renumeran al borrar, como tareas, notas y gastos
     shopping_item = {
-        "id": len(shopping[user_id]) + 1,
+        "id": max((i["id"] for i in shopping[user_id]), default=0) + 1,
         "item": item,
         "bought": False,
         "added": datetime.now(TIMEZONE).strftime("%Y-%m-%d")
@@ -1130,9 +1532,6 @@ def delete_shopping_item(user_id, item_id):
     shopping = load_shopping()
     if user_id in shopping:
         shopping[user_id] = [i for i in shopping[user_id] if i["id"] != item_id]
-        # Reordenar IDs
-        for idx, item in enumerate(shopping[user_id]):
-            item["id"] = idx + 1
         save_shopping(shopping)
         return True
     return False
@@ -1142,9 +1541,6 @@ def clear_bought_items(user_id):
     shopping = load_shopping()
     if user_id in shopping:
         shopping[user_id] = [i for i in shopping[user_id] if not i.get("bought", False)]
-        # Reordenar IDs
-        for idx, item in enumerate(shopping[user_id]):
-            item["id"] = idx + 1
         save_shopping(shopping)
         return True
     return False
@@ -1169,116 +1565,99 @@ def format_shopping_list(user_id):
     pending = [i for i in items if not i.get("bought", False)]
     bought = [i for i in items if i.get("bought", False)]
 
-    result = "🛒 *Lista de compras:*\n"
+    parts = ["🛒 *Lista de compras:*\n"]
 
     if pending:
-        result += "\n*Pendientes:*\n"
+        parts.append("\n*Pendientes:*\n")
         for item in pending:
-            result += f"  {item['id']}. {item['item']}\n"
+            parts.append(f"  {item['id']}. {item['item']}\n")
 
     if bought:
-        result += "\n*Comprados:* ✓\n"
+        parts.append("\n*Comprados:* ✓\n")
         for item in bought:
-            result += f"  ~{item['item']}~\n"
+            parts.append(f"  ~{item['item']}~\n")
 
-    return result
+    return "".join(parts)
 
 # ==================== ANÁLISIS DE GASTOS ====================
 
 def analyze_expenses(user_id):
     """Analiza los gastos del usuario"""
-    expenses = load_expenses()
-    user_expenses = expenses.get(user_id, [])
-
-    if not user_expenses:
-        return "📊 No tienes gastos registrados para analizar."
-
     now = datetime.now(TIMEZONE)
-
-    # Gastos del mes actual
     current_month = now.strftime("%Y-%m")
-    month_expenses = []
-    for e in user_expenses:
-        if e.get("date", "").startswith(current_month):
-            month_expenses.append(e)
-
-    # Gastos del mes anterior
     last_month = (now.replace(day=1) - timedelta(days=1)).strftime("%Y-%m")
-    last_month_expenses = []
-    for e in user_expenses:
-        if e.get("date", "").startswith(last_month):
-            last_month_expenses.append(e)
-
-    # Gastos de la semana
-    week_start = now - timedelta(days=now.weekday())
-    week_expenses = []
-    for e in user_expenses:
-        try:
-            exp_date = datetime.strptime(e["date"].split()[0], "%Y-%m-%d")
-            if exp_date >= week_start.replace(tzinfo=None):
-                week_expenses.append(e)
-        except:
-            pass
+    # Semana desde el lunes, comparando la fecha como texto
+    week_start = (now - timedelta(days=now.weekday())).strftime("%Y-%m-%d")
+
+    # Totales del mes, del mes pasado y de la semana en una sola consulta
+    totals = db_rows(
+        "SELECT COUNT(*) AS count, "
+        "SUM(CASE WHEN substr(date, 1, 7) = ? THEN 1 ELSE 0 END) AS count_month, "
+        "COALESCE(SUM(CASE WHEN substr(date, 1, 7) = ? THEN amount END), 0) AS month, "
+        "COALESCE(SUM(CASE WHEN substr(date, 1, 7) = ? THEN amount END), 0) AS last_month, "
+        "COALESCE(SUM(CASE WHEN substr(date, 1, 10) >= ? THEN amount END), 0) AS week "
+        "FROM expenses WHERE user_id = ?",
+        (current_month, current_month, last_month, week_start, user_id),
+    )[0]
+
+    if not totals["count"]:
+        return "📊 No tienes gastos registrados para analizar."
 
-    total_month = sum(e["amount"] for e in month_expenses)
-    total_last_month = sum(e["amount"] for e in last_month_expenses)
-    total_week = sum(e["amount"] for e in week_expenses)
+    total_month = totals["month"]
+    total_last_month = totals["last_month"]
+    total_week = totals["week"]
 
-    result = "📊 *Análisis de gastos:*\n\n"
+    parts = ["📊 *Análisis de gastos:*\n\n"]
 
-    result += f"💰 *Esta semana:* ${total_week:,.0f}\n"
-    result += f"💰 *Este mes:* ${total_month:,.0f}\n"
+    parts.append(f"💰 *Esta semana:* ${total_week:,.0f}\n")
+    parts.append(f"💰 *Este mes:* ${total_month:,.0f}\n")
 
     if total_last_month > 0:
         diff = total_month - total_last_month
         percent = (diff / total_last_month) * 100
         if diff > 0:
-            result += f"📈 Gastaste ${diff:,.0f} más que el mes pasado (+{percent:.0f}%)\n"
+            parts.append(f"📈 Gastaste ${diff:,.0f} más que el mes pasado (+{percent:.0f}%)\n")
         elif diff < 0:
-            result += f"📉 Gastaste ${abs(diff):,.0f} menos que el mes pasado ({percent:.0f}%)\n"
+            parts.append(f"📉 Gastaste ${abs(diff):,.0f} menos que el mes pasado ({percent:.0f}%)\n")
         else:
-            result += "📊 Igual que el mes pasado\n"
+            parts.append("📊 Igual que el mes pasado\n")
 
     # Categoría con más gastos
-    if month_expenses:
-        by_category = {}
-        for e in month_expenses:
-            cat = e.get("category", "General")
-            by_category[cat] = by_category.get(cat, 0) + e["amount"]
+    if totals["count_month"]:
+        by_category = db_rows(
+            "SELECT category, SUM(amount) AS amount FROM expenses "
+            "WHERE user_id = ? AND substr(date, 1, 7) = ? GROUP BY category ORDER BY amount DESC",
+            (user_id, current_month),
+        )
 
-        top_category = max(by_category, key=by_category.get)
-        top_amount = by_category[top_category]
-        result += f"\n🏷 *Mayor gasto:* {top_category} (${top_amount:,.0f})\n"
+        top = by_category[0]
+        parts.append(f"\n🏷 *Mayor gasto:* {top['category']} (${top['amount']:,.0f})\n")
 
-        result += "\n*Por categoría este mes:*\n"
-        for cat, amount in sorted(by_category.items(), key=lambda x: -x[1]):
-            percent = (amount / total_month) * 100 if total_month > 0 else 0
-            result += f"  • {cat}: ${amount:,.0f} ({percent:.0f}%)\n"
+        parts.append("\n*Por categoría este mes:*\n")
+        for row in by_category:
+            percent = (row["amount"] / total_month) * 100 if total_month > 0 else 0
+            parts.append(f"  • {row['category']}: ${row['amount']:,.0f} ({percent:.0f}%)\n")
 
     # Promedio diario
-    if month_expenses:
+    if totals["count_month"]:
         days_in_month = now.day
         daily_avg = total_month / days_in_month
-        result += f"\n📅 *Promedio diario:* ${daily_avg:,.0f}"
+        parts.append(f"\n📅 *Promedio diario:* ${daily_avg:,.0f}")
 
-    return result
+    return "".join(parts)
 
 # ==================== DIRECTORIO DE CONTACTOS ====================
 
 def load_contacts():
     """Carga los contactos guardados"""
-    if os.path.exists(CONTACTS_FILE):
-        try:
-            with open(CONTACTS_FILE, "r") as f:
-                return json.load(f)
-        except:
-            return {}
-    return {}
+    try:
+        return read_json_file(CONTACTS_FILE, {})
+    except:
+        return {}
 
 def save_contacts(contacts):
     """Guarda los contactos"""
-    with open(CONTACTS_FILE, "w") as f:
-        json.dump(contacts, f, ensure_ascii=False)
+    write_json_file(CONTACTS_FILE, contacts)
 
 def add_contact(user_id, name, phone, category=None):
     """Agrega un contacto al directorio"""
@@ -1335,37 +1714,29 @@ def format_contacts_list(user_id):
         return "📇 No tenés contactos guardados.\n\nPara agregar uno escribí:\n*guardar contacto: Dr. López 351123456*"
 
     # Agrupar por categoría
-    by_category = {}
+    by_category = defaultdict(list)
     for c in contacts:
-        cat = c.get("category", "general").title()
-        if cat not in by_category:
-            by_category[cat] = []
-        by_category[cat].append(c)
+        by_category[c.get("category", "general").title()].append(c)
 
-    result = "📇 *MIS CONTACTOS*\n"
+    parts = ["📇 *MIS CONTACTOS*\n"]
     for cat, cat_contacts in by_category.items():
-        result += f"\n*{cat}:*\n"
-        for c in cat_contacts:
-            result += f"• {c['name']}: {c['phone']}\n"
+        parts.append(f"\n*{cat}:*\n")
+        parts.extend(f"• {c['name']}: {c['phone']}\n" for c in cat_contacts)
 
-    return result
+    return "".join(parts)
 
 # ==================== TURNOS MÉDICOS ====================
 
 def load_appointments():
     """Carga los turnos guardados"""
-    if os.path.exists(APPOINTMENTS_FILE):
-        try:
-            with open(APPOINTMENTS_FILE, "r") as f:
-                return json.load(f)
-        except:
-            return {}
-    return {}
+    try:
+        return read_json_file(APPOINTMENTS_FILE, {})
+    except:
+        return {}
 
 def save_appointments(appointments):
     """Guarda los turnos"""
-    with open(APPOINTMENTS_FILE, "w") as f:
-        json.dump(appointments, f, ensure_ascii=False)
+    write_json_file(APPOINTMENTS_FILE, appointments)
 
 def add_appointment(user_id, doctor, date_str, time_str, notes=None):
     """Agrega un turno médico"""
@@ -1394,18 +1765,20 @@ def get_upcoming_appointments(user_id):
     appointments = get_appointments(user_id)
     today = datetime.now(TIMEZONE).date()
 
+    # Cada fecha se parsea una sola vez y se usa para filtrar y para ordenar
     upcoming = []
     for apt in appointments:
         try:
             apt_date = datetime.strptime(apt["date"], "%d/%m/%Y").date()
-            if apt_date >= today:
-                upcoming.append(apt)
         except:
-            upcoming.append(apt)  # Si no puede parsear, lo incluye igual
+            upcoming.append((date.max, apt))  # Si no puede parsear, lo incluye igual (al final)
+            continue
+        if apt_date >= today:
+            upcoming.append((apt_date, apt))
 
     # Ordenar por fecha
-    upcoming.sort(key=lambda x: datetime.strptime(x["date"], "%d/%m/%Y") if "/" in x["date"] else datetime.max)
-    return upcoming
+    upcoming.sort(key=itemgetter(0))
+    return [apt for _, apt in upcoming]
 
 def delete_appointment(user_id, index):
     """Elimina un turno por índice"""
@@ -1422,20 +1795,20 @@ def format_appointments_list(user_id):
     if not appointments:
         return "🏥 No tenés turnos programados.\n\nPara agregar uno escribí:\n*turno con Dr. García el 15/2 a las 10hs*"
 
-    result = "🏥 *MIS TURNOS*\n\n"
+    parts = ["🏥 *MIS TURNOS*\n\n"]
     for i, apt in enumerate(appointments, 1):
-        result += f"*{i}.* {apt['doctor']}\n"
-        result += f"   📅 {apt['date']} ⏰ {apt['time']}\n"
+        parts.append(f"*{i}.* {apt['doctor']}\n")
+        parts.append(f"   📅 {apt['date']} ⏰ {apt['time']}\n")
         if apt.get("notes"):
-            result += f"   📝 {apt['notes']}\n"
-        result += "\n"
+            parts.append(f"   📝 {apt['notes']}\n")
+        parts.append("\n")
 
-    result += "_Para cancelar: 'cancelar turno 1'_"
-    return result
+    parts.append("_Para cancelar: 'cancelar turno 1'_")
+    return "".join(parts)
 
 def check_appointment_reminders():
     """Verifica y envía recordatorios de turnos"""
-    print(f"[{datetime.now()}] Verificando recordatorios de turnos...")
+    logger.info(f"[{datetime.now()}] Verificando recordatorios de turnos...")
 
     appointments = load_appointments()
     today = datetime.now(TIMEZONE).date()
@@ -1455,9 +1828,9 @@ def check_appointment_reminders():
                     try:
                         send_whatsapp_message(user_id, message)
                         apt["reminded_day_before"] = True
-                        print(f"Recordatorio día anterior enviado a {user_id}")
+                        logger.info(f"Recordatorio día anterior enviado a {user_id}")
                     except Exception as e:
-                        print(f"Error enviando recordatorio: {e}")
+                        logger.error(f"Error enviando recordatorio: {e}")
 
                 # Recordatorio mismo día (8am)
                 if apt_date == today and not apt.get("reminded_same_day"):
@@ -1471,12 +1844,12 @@ def check_appointment_reminders():
                         try:
                             send_whatsapp_message(user_id, message)
                             apt["reminded_same_day"] = True
-                            print(f"Recordatorio mismo día enviado a {user_id}")
+                            logger.info(f"Recordatorio mismo día enviado a {user_id}")
                         except Exception as e:
-                            print(f"Error enviando recordatorio: {e}")
+                            logger.error(f"Error enviando recordatorio: {e}")
 
             except Exception as e:
-                print(f"Error procesando turno: {e}")
+                logger.error(f"Error procesando turno: {e}")
 
     save_appointments(appointments)
 
@@ -1486,18 +1859,14 @@ USER_LOCATIONS_FILE = os.path.join(DATA_DIR, "locations.json")
 
 def load_locations():
     """Carga las ubicaciones guardadas"""
-    if os.path.exists(USER_LOCATIONS_FILE):
-        try:
-            with open(USER_LOCATIONS_FILE, "r") as f:
-                return json.load(f)
-        except:
-            return {}
-    return {}
+    try:
+        return read_json_file(USER_LOCATIONS_FILE, {})
+    except:
+        return {}
 
 def save_locations(locations):
     """Guarda las ubicaciones"""
-    with open(USER_LOCATIONS_FILE, "w") as f:
-        json.dump(locations, f, ensure_ascii=False)
+    write_json_file(USER_LOCATIONS_FILE, locations)
 
 def set_user_location(user_id, city):
     """Guarda la ubicación del usuario"""
@@ -1512,20 +1881,53 @@ def get_user_location(user_id):
 
 # ==================== CUIDADORES (MÚLTIPLES CONTACTOS) ====================
 
-def load_caregivers():
+def load_caregivers(readonly=False):
     """Carga los cuidadores desde archivo"""
-    if os.path.exists(CAREGIVERS_FILE):
-        try:
-            with open(CAREGIVERS_FILE, "r") as f:
-                return json.load(f)
-        except:
-            return {}
-    return {}
+    try:
+        return read_json_file(CAREGIVERS_FILE, {}, readonly)
+    except:
+        return {}
 
 def save_caregivers(caregivers):
     """Guarda los cuidadores"""
-    with open(CAREGIVERS_FILE, "w") as f:
-        json.dump(caregivers, f, ensure_ascii=False)
+    write_json_file(CAREGIVERS_FILE, caregivers)
+    # Mantener actualizado el índice inverso cuidador -> usuarios
+    save_caregiver_index(build_caregiver_index(caregivers))
+
+# Índice inverso: número del cuidador -> lista de usuarios que cuida
+CAREGIVER_INDEX_FILE = os.path.join(DATA_DIR, "caregiver_index.json")
+
+def build_caregiver_index(caregivers):
+    """Arma el índice cuidador -> usuarios a partir de los cuidadores"""
+    index = {}
+    for user_id, cg in caregivers.items():
+        # Compatibilidad con formato antiguo
+        if isinstance(cg, str):
+            numbers = [cg]
+        elif isinstance(cg, dict):
+            numbers = [cg.get("primary")] + cg.get("secondary", [])
+        else:
+            continue
+        for number in dict.fromkeys(numbers):
+            if number:
+                index.setdefault(number, []).append(user_id)
+    return index
+
+def load_caregiver_index():
+    """Carga el índice de cuidadores, reconstruyéndolo si no existe"""
+    try:
+        index = read_json_file(CAREGIVER_INDEX_FILE, None, readonly=True)
+        if index is not None:
+            return index
+    except:
+        pass
+    index = build_caregiver_index(load_caregivers())
+    save_caregiver_index(index)
+    return index
+
+def save_caregiver_index(index):
+    """Guarda el índice de cuidadores"""
+    write_json_file(CAREGIVER_INDEX_FILE, index)
 
 def set_caregiver(user_id, caregiver_number, is_primary=True, name=None):
     """Guarda un cuidador de un usuario (soporta múltiples)"""
@@ -1562,7 +1964,7 @@ def set_caregiver_name(user_id, name):
 
 def get_caregiver_name(user_id):
     """Obtiene el nombre del cuidador principal"""
-    caregivers = load_caregivers()
+    caregivers = load_caregivers(readonly=True)
     cg = caregivers.get(user_id)
     if cg and isinstance(cg, dict):
         return cg.get("primary_name")
@@ -1570,7 +1972,7 @@ def get_caregiver_name(user_id):
 
 def is_pending_caregiver_name(user_id):
     """Verifica si falta el nombre del cuidador"""
-    caregivers = load_caregivers()
+    caregivers = load_caregivers(readonly=True)
     cg = caregivers.get(user_id)
     if cg and isinstance(cg, dict):
         # Tiene cuidador pero no tiene nombre
@@ -1592,7 +1994,7 @@ def remove_caregiver(user_id, caregiver_number):
 
 def get_caregiver(user_id):
     """Obtiene el cuidador principal de un usuario"""
-    caregivers = load_caregivers()
+    caregivers = load_caregivers(readonly=True)
     cg = caregivers.get(user_id)
     if cg is None:
         return None
@@ -1603,7 +2005,7 @@ def get_caregiver(user_id):
 
 def get_all_caregivers(user_id):
     """Obtiene todos los cuidadores de un usuario (principal + secundarios)"""
-    caregivers = load_caregivers()
+    caregivers = load_caregivers(readonly=True)
     cg = caregivers.get(user_id)
     if cg is None:
         return []
@@ -1622,40 +2024,27 @@ def alert_all_caregivers(user_id, message):
     for cg in caregivers:
         try:
             send_whatsapp_message(cg, message)
-            print(f"Alerta enviada a cuidador {cg}")
+            logger.info(f"Alerta enviada a cuidador {cg}")
         except Exception as e:
-            print(f"Error enviando a cuidador {cg}: {e}")
+            logger.error(f"Error enviando a cuidador {cg}: {e}")
 
 def get_users_for_caregiver(caregiver_id):
     """Obtiene los usuarios que tienen asignado a este cuidador"""
-    caregivers = load_caregivers()
-    users = []
-    for user_id, cg in caregivers.items():
-        if isinstance(cg, str):
-            if cg == caregiver_id:
-                users.append(user_id)
-        elif isinstance(cg, dict):
-            if cg.get("primary") == caregiver_id or caregiver_id in cg.get("secondary", []):
-                users.append(user_id)
-    return users
+    return load_caregiver_index().get(caregiver_id, [])
 
 # Recordatorios programados por el cuidador
 CAREGIVER_REMINDERS_FILE = os.path.join(DATA_DIR, "caregiver_reminders.json")
 
 def load_caregiver_reminders():
     """Carga recordatorios programados por cuidadores"""
-    if os.path.exists(CAREGIVER_REMINDERS_FILE):
-        try:
-            with open(CAREGIVER_REMINDERS_FILE, "r") as f:
-                return json.load(f)
-        except:
-            return []
-    return []
+    try:
+        return read_json_file(CAREGIVER_REMINDERS_FILE, [])
+    except:
+        return []
 
 def save_caregiver_reminders(reminders):
     """Guarda recordatorios de cuidadores"""
-    with open(CAREGIVER_REMINDERS_FILE, "w") as f:
-        json.dump(reminders, f, ensure_ascii=False)
+    write_json_file(CAREGIVER_REMINDERS_FILE, reminders)
 
 def add_caregiver_reminder(caregiver_id, target_user_id, message, remind_at):
     """Agrega un recordatorio del cuidador para un usuario"""
@@ -1666,6 +2055,7 @@ def add_caregiver_reminder(caregiver_id, target_user_id, message, remind_at):
         "target_user": target_user_id,
         "message": message,
         "remind_at": remind_at,
+        "remind_at_epoch": remind_at_to_epoch(remind_at),
         "created": datetime.now(TIMEZONE).isoformat(),
         "sent": False
     }
@@ -1676,31 +2066,31 @@ def add_caregiver_reminder(caregiver_id, target_user_id, message, remind_at):
 def check_and_send_caregiver_reminders():
     """Revisa y envía recordatorios programados por cuidadores"""
     reminders = load_caregiver_reminders()
-    now = datetime.now(TIMEZONE)
-    updated = False
+    now_ts = time.time()
+    due = []
 
     for reminder in reminders:
         if reminder.get("sent", False):
             continue
 
         try:
-            remind_at = datetime.fromisoformat(reminder["remind_at"])
-            if remind_at.tzinfo is None:
-                remind_at = TIMEZONE.localize(remind_at)
+            if now_ts >= get_reminder_epoch(reminder):
+                due.append(reminder)
+        except Exception as e:
+            logger.error(f"Error procesando recordatorio de cuidador: {e}")
 
-            if now >= remind_at:
-                target_user = reminder["target_user"]
-                message = f"📨 *Mensaje de tu cuidador:*\n\n{reminder['message']}"
+    if not due:
+        return
 
-                send_whatsapp_message(target_user, message)
-                reminder["sent"] = True
-                updated = True
-                print(f"Recordatorio de cuidador enviado a {target_user}: {reminder['message']}")
-        except Exception as e:
-            print(f"Error procesando recordatorio de cuidador: {e}")
+    # Enviar todos en paralelo
+    send_whatsapp_messages(
+        [(r["target_user"], f"📨 *Mensaje de tu cuidador:*\n\n{r['message']}") for r in due]
+    )
+    for reminder in due:
+        reminder["sent"] = True
+        logger.info(f"Recordatorio de cuidador enviado a {reminder['target_user']}: {reminder['message']}")
 
-    if updated:
-        save_caregiver_reminders(reminders)
+    save_caregiver_reminders(reminders)
 
 def get_pending_caregiver_reminders(caregiver_id):
     """Obtiene recordatorios pendientes creados por un cuidador"""
@@ -1709,10 +2099,14 @@ def get_pending_caregiver_reminders(caregiver_id):
 
 # ==================== DÓLAR ====================
 
+DOLAR_ERROR_MESSAGE = "💵 No pude obtener la cotización del dólar."
+
+# La cotización se reutiliza un minuto
+@ttl_cached(60, errors=(DOLAR_ERROR_MESSAGE,))
 def get_dolar():
     """Obtiene cotización del dólar en Argentina"""
     try:
-        response = requests.get("https://dolarapi.com/v1/dolares", timeout=10)
+        response = http_session.get("https://dolarapi.com/v1/dolares", timeout=FETCH_TIMEOUT)
         data = response.json()
 
         result = "💵 *Cotización del Dólar:*\n"
@@ -1731,8 +2125,8 @@ def get_dolar():
 
         return result
     except Exception as e:
-        print(f"Error obteniendo dólar: {e}")
-        return "💵 No pude obtener la cotización del dólar."
+        logger.error(f"Error obteniendo dólar: {e}")
+        return DOLAR_ERROR_MESSAGE
 
 # ==================== REGISTRO DE SÍNTOMAS ====================
 
@@ -1740,18 +2134,14 @@ SYMPTOMS_FILE = os.path.join(DATA_DIR, "symptoms.json")
 
 def load_symptoms():
     """Carga el registro de síntomas"""
-    if os.path.exists(SYMPTOMS_FILE):
-        try:
-            with open(SYMPTOMS_FILE, "r") as f:
-                return json.load(f)
-        except:
-            return {}
-    return {}
+    try:
+        return read_json_file(SYMPTOMS_FILE, {})
+    except:
+        return {}
 
 def save_symptoms(symptoms):
     """Guarda el registro de síntomas"""
-    with open(SYMPTOMS_FILE, "w") as f:
-        json.dump(symptoms, f, ensure_ascii=False)
+    write_json_file(SYMPTOMS_FILE, symptoms)
 
 def add_symptom(user_id, symptom, intensity=None, notes=None):
     """Registra un síntoma"""
@@ -1797,12 +2187,9 @@ def format_symptoms_report(user_id, days=30):
     report = f"📋 *Historial de Síntomas* (últimos {days} días)\n\n"
 
     # Agrupar por síntoma
-    symptom_counts = {}
+    symptom_counts = defaultdict(list)
     for s in recent:
-        name = s["symptom"]
-        if name not in symptom_counts:
-            symptom_counts[name] = []
-        symptom_counts[name].append(s)
+        symptom_counts[s["symptom"]].append(s)
 
     for symptom, entries in symptom_counts.items():
         report += f"*{symptom}:* {len(entries)} veces\n"
@@ -1819,18 +2206,14 @@ VITALS_FILE = os.path.join(DATA_DIR, "vitals.json")
 
 def load_vitals():
     """Carga registros de signos vitales"""
-    if os.path.exists(VITALS_FILE):
-        try:
-            with open(VITALS_FILE, "r") as f:
-                return json.load(f)
-        except:
-            return {}
-    return {}
+    try:
+        return read_json_file(VITALS_FILE, {})
+    except:
+        return {}
 
 def save_vitals(vitals):
     """Guarda registros de signos vitales"""
-    with open(VITALS_FILE, "w") as f:
-        json.dump(vitals, f, ensure_ascii=False)
+    write_json_file(VITALS_FILE, vitals)
 
 def add_vital(user_id, vital_type, value, value2=None):
     """Registra un signo vital (presión, glucosa, etc.)"""
@@ -1904,12 +2287,9 @@ def format_vitals_report(user_id, days=30):
     report = f"📊 *Signos Vitales* (últimos {days} días)\n\n"
 
     # Agrupar por tipo
-    by_type = {}
+    by_type = defaultdict(list)
     for v in history:
-        vtype = v["type"]
-        if vtype not in by_type:
-            by_type[vtype] = []
-        by_type[vtype].append(v)
+        by_type[v["type"]].append(v)
 
     type_names = {
         "presion": "🩺 Presión Arterial",
@@ -1942,18 +2322,14 @@ WATER_FILE = os.path.join(DATA_DIR, "water_intake.json")
 
 def load_water_intake():
     """Carga registro de consumo de agua"""
-    if os.path.exists(WATER_FILE):
-        try:
-            with open(WATER_FILE, "r") as f:
-                return json.load(f)
-        except:
-            return {}
-    return {}
+    try:
+        return read_json_file(WATER_FILE, {})
+    except:
+        return {}
 
 def save_water_intake(water):
     """Guarda registro de consumo de agua"""
-    with open(WATER_FILE, "w") as f:
-        json.dump(water, f, ensure_ascii=False)
+    write_json_file(WATER_FILE, water)
 
 def add_water(user_id, glasses=1):
     """Registra vasos de agua"""
@@ -1996,18 +2372,14 @@ RECURRING_REMINDERS_FILE = os.path.join(DATA_DIR, "recurring_reminders.json")
 
 def load_recurring_reminders():
     """Carga recordatorios recurrentes"""
-    if os.path.exists(RECURRING_REMINDERS_FILE):
-        try:
-            with open(RECURRING_REMINDERS_FILE, "r") as f:
-                return json.load(f)
-        except:
-            return {}
-    return {}
+    try:
+        return read_json_file(RECURRING_REMINDERS_FILE, {})
+    except:
+        return {}
 
 def save_recurring_reminders(reminders):
     """Guarda recordatorios recurrentes"""
-    with open(RECURRING_REMINDERS_FILE, "w") as f:
-        json.dump(reminders, f, ensure_ascii=False)
+    write_json_file(RECURRING_REMINDERS_FILE, reminders)
 
 def add_recurring_reminder(user_id, message, frequency, day_of_week=None, day_of_month=None, time_str="09:00"):
     """Agrega recordatorio recurrente
@@ -2062,7 +2434,7 @@ def check_and_send_recurring_reminders():
     current_time = now.strftime("%H:%M")
     day_of_week = now.weekday()
     day_of_month = now.day
-    updated = False
+    due = []
 
     for user_id, user_reminders in reminders.items():
         # Verificar modo no molestar
@@ -2074,7 +2446,7 @@ def check_and_send_recurring_reminders():
                 continue
 
             # Verificar si ya se envió hoy
-            if reminder.get("last_sent", "").startswith(today):
+            if (reminder.get("last_sent") or "").startswith(today):
                 continue
 
             # Verificar hora
@@ -2091,17 +2463,21 @@ def check_and_send_recurring_reminders():
                 should_send = True
 
             if should_send:
-                try:
-                    message = f"🔁 *Recordatorio:*\n\n{reminder['message']}"
-                    send_whatsapp_message(user_id, message, respect_dnd=True)
-                    reminder["last_sent"] = now.isoformat()
-                    updated = True
-                    print(f"Recordatorio recurrente enviado a {user_id}: {reminder['message']}")
-                except Exception as e:
-                    print(f"Error enviando recordatorio recurrente: {e}")
+                due.append((user_id, reminder))
 
-    if updated:
-        save_recurring_reminders(reminders)
+    if not due:
+        return
+
+    # Enviar todos en paralelo
+    send_whatsapp_messages(
+        [(user_id, f"🔁 *Recordatorio:*\n\n{reminder['message']}") for user_id, reminder in due],
+        respect_dnd=True,
+    )
+    for user_id, reminder in due:
+        reminder["last_sent"] = now.isoformat()
+        logger.info(f"Recordatorio recurrente enviado a {user_id}: {reminder['message']}")
+
+    save_recurring_reminders(reminders)
 
 def format_recurring_reminders_list(user_id):
     """Formatea lista de recordatorios recurrentes"""
@@ -2139,18 +2515,14 @@ BIRTHDAYS_FILE = os.path.join(DATA_DIR, "birthdays.json")
 
 def load_birthdays():
     """Carga cumpleaños"""
-    if os.path.exists(BIRTHDAYS_FILE):
-        try:
-            with open(BIRTHDAYS_FILE, "r") as f:
-                return json.load(f)
-        except:
-            return {}
-    return {}
+    try:
+        return read_json_file(BIRTHDAYS_FILE, {})
+    except:
+        return {}
 
 def save_birthdays(birthdays):
     """Guarda cumpleaños"""
-    with open(BIRTHDAYS_FILE, "w") as f:
-        json.dump(birthdays, f, ensure_ascii=False)
+    write_json_file(BIRTHDAYS_FILE, birthdays)
 
 def add_birthday(user_id, name, date_str, relation=None):
     """Agrega un cumpleaños (formato DD/MM o DD/MM/YYYY)"""
@@ -2229,16 +2601,16 @@ def check_and_send_birthday_reminders():
                     # Mañana es el cumple
                     message = f"🎂 *Recordatorio de cumpleaños*\n\n¡Mañana es el cumpleaños de *{name}*!{age}\n\n💡 Mensaje sugerido:\n_\"¡Feliz cumpleaños {name}! Que tengas un día hermoso lleno de alegría. Un abrazo grande!\"_"
                     send_whatsapp_message(user_id, message, respect_dnd=True)
-                    print(f"Recordatorio de cumpleaños (mañana) enviado a {user_id}")
+                    logger.info(f"Recordatorio de cumpleaños (mañana) enviado a {user_id}")
 
                 elif days_until == 0:
                     # Hoy es el cumple
                     message = f"🎉 *¡HOY es el cumpleaños de {name}!*{age}\n\n¡No te olvides de saludarlo/a!"
                     send_whatsapp_message(user_id, message, respect_dnd=True)
-                    print(f"Recordatorio de cumpleaños (hoy) enviado a {user_id}")
+                    logger.info(f"Recordatorio de cumpleaños (hoy) enviado a {user_id}")
 
             except Exception as e:
-                print(f"Error procesando cumpleaños: {e}")
+                logger.error(f"Error procesando cumpleaños: {e}")
 
 def format_birthdays_list(user_id):
     """Formatea lista de cumpleaños"""
@@ -2275,18 +2647,14 @@ TRIP_STATUS_FILE = os.path.join(DATA_DIR, "trip_status.json")
 
 def load_trip_status():
     """Carga estado de viajes/salidas"""
-    if os.path.exists(TRIP_STATUS_FILE):
-        try:
-            with open(TRIP_STATUS_FILE, "r") as f:
-                return json.load(f)
-        except:
-            return {}
-    return {}
+    try:
+        return read_json_file(TRIP_STATUS_FILE, {})
+    except:
+        return {}
 
 def save_trip_status(status):
     """Guarda estado de viajes"""
-    with open(TRIP_STATUS_FILE, "w") as f:
-        json.dump(status, f, ensure_ascii=False)
+    write_json_file(TRIP_STATUS_FILE, status)
 
 def start_trip(user_id, destination=None, expected_minutes=60):
     """Marca que el usuario salió"""
@@ -2327,9 +2695,9 @@ def check_pending_arrivals():
             try:
                 message = "🏠 ¿Llegaste bien?\n\nEscribí *llegué* para confirmar."
                 send_whatsapp_message(user_id, message)
-                print(f"Recordatorio de llegada enviado a {user_id}")
+                logger.info(f"Recordatorio de llegada enviado a {user_id}")
             except Exception as e:
-                print(f"Error enviando recordatorio de llegada: {e}")
+                logger.error(f"Error enviando recordatorio de llegada: {e}")
 
         if now > expected + timedelta(minutes=45):  # 45 min sin confirmar
             # Alertar al cuidador
@@ -2343,339 +2711,374 @@ def check_pending_arrivals():
                     send_whatsapp_message(caregiver, alert)
                     trip["caregiver_alerted"] = True
                     save_trip_status(status)
-                    print(f"Alerta de llegada enviada al cuidador de {user_id}")
+                    logger.info(f"Alerta de llegada enviada al cuidador de {user_id}")
                 except Exception as e:
-                    print(f"Error enviando alerta de llegada: {e}")
+                    logger.error(f"Error enviando alerta de llegada: {e}")
 
 # ==================== GASTOS ====================
 
-EXPENSES_FILE = os.path.join(DATA_DIR, "expenses.json")
-
-def load_expenses():
-    """Carga los gastos desde el archivo JSON"""
-    if os.path.exists(EXPENSES_FILE):
-        with open(EXPENSES_FILE, "r") as f:
-            return json.load(f)
-    return {}
-
-def save_expenses(expenses):
-    """Guarda los gastos en el archivo JSON"""
-    with open(EXPENSES_FILE, "w") as f:
-        json.dump(expenses, f, indent=2, ensure_ascii=False)
-
 def add_expense(user_id, amount, description, category="General"):
     """Agrega un gasto"""
-    expenses = load_expenses()
-    if user_id not in expenses:
-        expenses[user_id] = []
-
     expense = {
-        "id": len(expenses[user_id]) + 1,
         "amount": amount,
         "description": description,
         "category": category,
         "date": datetime.now(TIMEZONE).strftime("%Y-%m-%d %H:%M")
     }
-    expenses[user_id].append(expense)
-    save_expenses(expenses)
+    with db_transaction() as conn:
+        expense["id"] = next_user_id(conn, "expenses", user_id)
+        conn.execute(
+            "INSERT INTO expenses (user_id, id, amount, description, category, date) VALUES (?, ?, ?, ?, ?, ?)",
+            (user_id, expense["id"], amount, description, category, expense["date"]),
+        )
     return expense
 
 def delete_expense(user_id, expense_id):
     """Elimina un gasto por ID"""
-    expenses = load_expenses()
-    if user_id in expenses:
-        original_len = len(expenses[user_id])
-        expenses[user_id] = [e for e in expenses[user_id] if e["id"] != expense_id]
-        if len(expenses[user_id]) < original_len:
-            # Reordenar IDs
-            for i, exp in enumerate(expenses[user_id]):
-                exp["id"] = i + 1
-            save_expenses(expenses)
-            return True
-    return False
+    with db_transaction() as conn:
+        cursor = conn.execute("DELETE FROM expenses WHERE user_id = ? AND id = ?", (user_id, expense_id))
+    return cursor.rowcount > 0
 
 def list_expenses(user_id, limit=10):
     """Lista los últimos gastos con sus IDs"""
-    expenses = load_expenses()
-    user_expenses = expenses.get(user_id, [])
+    # Ordenar por fecha (más recientes primero) y limitar
+    recent = db_rows(
+        "SELECT id, amount, description, category, date FROM expenses WHERE user_id = ? "
+        "ORDER BY COALESCE(date, '') DESC, seq LIMIT ?",
+        (user_id, limit),
+    )
 
-    if not user_expenses:
+    if not recent:
         return "📊 No tienes gastos registrados."
 
-    # Ordenar por fecha (más recientes primero) y limitar
-    recent = sorted(user_expenses, key=lambda x: x.get("date", ""), reverse=True)[:limit]
-
-    result = "📊 *Tus últimos gastos:*\n\n"
+    parts = ["📊 *Tus últimos gastos:*\n\n"]
     for e in recent:
-        fecha = e.get("date", "")[:10]  # Solo fecha sin hora
-        result += f"{e['id']}. ${e['amount']:,.0f} - {e['description']} ({e.get('category', 'General')}) - {fecha}\n"
+        fecha = (e["date"] or "")[:10]  # Solo fecha sin hora
+        parts.append(f"{e['id']}. ${e['amount']:,.0f} - {e['description']} ({e['category']}) - {fecha}\n")
 
-    result += "\n_Para eliminar: 'eliminar gasto 1'_"
-    return result
+    parts.append("\n_Para eliminar: 'eliminar gasto 1'_")
+    return "".join(parts)
 
 def get_expenses_summary(user_id, days=30):
     """Obtiene resumen de gastos del mes"""
-    expenses = load_expenses()
-    user_expenses = expenses.get(user_id, [])
-
-    # Filtrar por fecha
-    cutoff = datetime.now(TIMEZONE) - timedelta(days=days)
-    recent = []
-    for e in user_expenses:
-        try:
-            exp_date = datetime.strptime(e["date"], "%Y-%m-%d %H:%M")
-            if exp_date >= cutoff.replace(tzinfo=None):
-                recent.append(e)
-        except:
-            recent.append(e)
+    # Filtrar por fecha (texto YYYY-MM-DD HH:MM, se compara como string)
+    cutoff = (datetime.now(TIMEZONE) - timedelta(days=days)).strftime("%Y-%m-%d %H:%M")
+
+    # Agrupar por categoría en la base
+    by_category = db_rows(
+        "SELECT category, SUM(amount) AS amount FROM expenses "
+        "WHERE user_id = ? AND date >= ? GROUP BY category ORDER BY amount DESC",
+        (user_id, cutoff),
+    )
 
-    if not recent:
+    if not by_category:
         return "No tienes gastos registrados en los últimos 30 días."
 
-    total = sum(e["amount"] for e in recent)
-
-    # Agrupar por categoría
-    by_category = {}
-    for e in recent:
-        cat = e.get("category", "General")
-        by_category[cat] = by_category.get(cat, 0) + e["amount"]
+    total = sum(row["amount"] for row in by_category)
 
-    result = f"💰 *Gastos del mes:*\n"
-    result += f"📊 Total: ${total:,.0f}\n\n"
-    result += "*Por categoría:*\n"
-    for cat, amount in sorted(by_category.items(), key=lambda x: -x[1]):
-        result += f"  • {cat}: ${amount:,.0f}\n"
+    parts = [
+        "💰 *Gastos del mes:*\n",
+        f"📊 Total: ${total:,.0f}\n\n",
+        "*Por categoría:*\n",
+    ]
+    for row in by_category:
+        parts.append(f"  • {row['category']}: ${row['amount']:,.0f}\n")
 
-    result += f"\n*Últimos gastos:*\n"
-    for e in recent[-5:]:
-        result += f"  • ${e['amount']:,.0f} - {e['description']}\n"
+    last = db_rows(
+        "SELECT amount, description FROM expenses WHERE user_id = ? AND date >= ? ORDER BY seq DESC LIMIT 5",
+        (user_id, cutoff),
+    )
+    parts.append("\n*Últimos gastos:*\n")
+    for e in reversed(last):
+        parts.append(f"  • ${e['amount']:,.0f} - {e['description']}\n")
 
-    return result
+    return "".join(parts)
 
 # ==================== FRASE MOTIVACIONAL ====================
 
+MOTIVATIONAL_QUOTES = (
+    "El único modo de hacer un gran trabajo es amar lo que haces. - Steve Jobs",
+    "El éxito es la suma de pequeños esfuerzos repetidos día tras día. - Robert Collier",
+    "No esperes el momento perfecto, toma el momento y hazlo perfecto.",
+    "Cada día es una nueva oportunidad para cambiar tu vida.",
+    "La disciplina es el puente entre las metas y los logros. - Jim Rohn",
+    "El fracaso es simplemente la oportunidad de comenzar de nuevo, esta vez de forma más inteligente. - Henry Ford",
+    "Cree en ti mismo y todo será posible.",
+    "La mejor manera de predecir el futuro es crearlo. - Peter Drucker",
+    "No cuentes los días, haz que los días cuenten. - Muhammad Ali",
+    "El éxito no es definitivo, el fracaso no es fatal: lo que cuenta es el coraje para continuar. - Winston Churchill",
+    "Tu actitud determina tu dirección.",
+    "Los grandes logros requieren tiempo y perseverancia.",
+    "Hoy es un buen día para ser increíble.",
+    "La única limitación es la que te pones a ti mismo.",
+    "Convierte tus heridas en sabiduría. - Oprah Winfrey"
+)
+
 def get_motivational_quote():
     """Obtiene una frase motivacional"""
-    quotes = [
-        "El único modo de hacer un gran trabajo es amar lo que haces. - Steve Jobs",
-        "El éxito es la suma de pequeños esfuerzos repetidos día tras día. - Robert Collier",
-        "No esperes el momento perfecto, toma el momento y hazlo perfecto.",
-        "Cada día es una nueva oportunidad para cambiar tu vida.",
-        "La disciplina es el puente entre las metas y los logros. - Jim Rohn",
-        "El fracaso es simplemente la oportunidad de comenzar de nuevo, esta vez de forma más inteligente. - Henry Ford",
-        "Cree en ti mismo y todo será posible.",
-        "La mejor manera de predecir el futuro es crearlo. - Peter Drucker",
-        "No cuentes los días, haz que los días cuenten. - Muhammad Ali",
-        "El éxito no es definitivo, el fracaso no es fatal: lo que cuenta es el coraje para continuar. - Winston Churchill",
-        "Tu actitud determina tu dirección.",
-        "Los grandes logros requieren tiempo y perseverancia.",
-        "Hoy es un buen día para ser increíble.",
-        "La única limitación es la que te pones a ti mismo.",
-        "Convierte tus heridas en sabiduría. - Oprah Winfrey"
-    ]
-    import random
-    return f"💫 _{random.choice(quotes)}_"
+    return f"💫 _{random.choice(MOTIVATIONAL_QUOTES)}_"
 
 # ==================== NOTICIAS ====================
 
+# Palabras clave para filtrar titulares (se compilan una sola vez)
+KEYWORDS_ARGENTINA = ['argentina', 'argentino', 'argentinos', 'milei', 'buenos aires', 'peso argentino', 'afa', 'boca', 'river', 'racing', 'independiente', 'san lorenzo', 'estudiantes', 'contte', 'apertura', 'superliga']
+KEYWORDS_ARGENTINA_RE = re.compile("|".join(re.escape(kw) for kw in KEYWORDS_ARGENTINA), re.IGNORECASE)
+
+KEYWORDS_CUARTETO = ['cuarteto', 'la mona', 'jimenez', 'cachumba', 'trulala', 'rodrigo', 'ulises bueno', 'la konga', 'baile', 'show']
+KEYWORDS_CUARTETO_RE = re.compile("|".join(re.escape(kw) for kw in KEYWORDS_CUARTETO), re.IGNORECASE)
+
 def shorten_url(url):
     """Acorta una URL usando TinyURL (gratis, sin API key)"""
     try:
-        response = requests.get(f"https://tinyurl.com/api-create.php?url={url}", timeout=5)
+        response = http_session.get(f"https://tinyurl.com/api-create.php?url={url}", timeout=5)
         if response.status_code == 200:
             return response.text
         return url
     except:
         return url
 
+def iter_rss_items(content):
+    """Recorre los <item> de un feed RSS de forma incremental, liberando cada uno al terminar"""
+    for _, item in ET.iterparse(io.BytesIO(content), events=("end",), tag="item"):
+        yield item
+        item.clear()
+        while item.getprevious() is not None:
+            del item.getparent()[0]
+
+def strip_news_source(title):
+    """Quita la fuente (" - Medio") del final de un titular"""
+    return title.rsplit(" - ", 1)[0]
+
+# Titulares reutilizados 5 minutos (el resumen matutino los pide para cada usuario)
+NEWS_CACHE_TTL = 300
+
+@ttl_cached(NEWS_CACHE_TTL)
 def get_news_argentina():
     """Obtiene las noticias más importantes de Argentina con links"""
     try:
         url = "https://news.google.com/rss/search?q=argentina&hl=es-419&gl=AR&ceid=AR:es-419"
-        response = requests.get(url, timeout=10)
-
-        import xml.etree.ElementTree as ET
-        root = ET.fromstring(response.content)
+        response = http_session.get(url, timeout=FETCH_TIMEOUT)
 
         news = []
-        for item in root.findall(".//item")[:3]:
-            title = item.find("title").text
-            link = item.find("link").text
+        for item in islice(iter_rss_items(response.content), 3):
+            title = item.findtext("title", "")
+            link = item.findtext("link", "")
             # Limpiar el título (quitar la fuente)
-            if " - " in title:
-                title = title.rsplit(" - ", 1)[0]
+            title = strip_news_source(title)
             # Acortar el link
             short_link = shorten_url(link)
             news.append({"title": title, "link": short_link})
 
         return news
     except Exception as e:
-        print(f"Error obteniendo noticias Argentina: {e}")
+        logger.error(f"Error obteniendo noticias Argentina: {e}")
         return []
 
+@ttl_cached(NEWS_CACHE_TTL)
 def get_news_world():
     """Obtiene las noticias más importantes del mundo con links"""
     try:
         url = "https://news.google.com/rss/topics/CAAqJggKIiBDQkFTRWdvSUwyMHZNRFp1ZEdvU0FtVnpHZ0pCVWlnQVAB?hl=es-419&gl=AR&ceid=AR:es-419"
-        response = requests.get(url, timeout=10)
-
-        import xml.etree.ElementTree as ET
-        root = ET.fromstring(response.content)
+        response = http_session.get(url, timeout=FETCH_TIMEOUT)
 
         news = []
-        keywords_argentina = ['argentina', 'argentino', 'argentinos', 'milei', 'buenos aires', 'peso argentino', 'afa', 'boca', 'river', 'racing', 'independiente', 'san lorenzo', 'estudiantes', 'contte', 'apertura', 'superliga']
-
-        for item in root.findall(".//item"):
+        for item in iter_rss_items(response.content):
             if len(news) >= 3:
                 break
-            title = item.find("title").text
-            link = item.find("link").text
+            title = item.findtext("title", "")
+            link = item.findtext("link", "")
             # Filtrar noticias de Argentina
-            if any(kw in title.lower() for kw in keywords_argentina):
+            if KEYWORDS_ARGENTINA_RE.search(title):
                 continue
-            if " - " in title:
-                title = title.rsplit(" - ", 1)[0]
+            title = strip_news_source(title)
             short_link = shorten_url(link)
             news.append({"title": title, "link": short_link})
 
         return news
     except Exception as e:
-        print(f"Error obteniendo noticias mundo: {e}")
+        logger.error(f"Error obteniendo noticias mundo: {e}")
         return []
 
 # ==================== FÚTBOL ====================
 
 EQUIPOS_FAVORITOS = ["Boca Juniors", "Inter Miami"]
 
+# URLs de búsqueda de cada equipo, armadas una sola vez al iniciar
+EQUIPOS_URLS = [
+    (equipo, f"https://news.google.com/rss/search?q={quote_plus(equipo)}+futbol&hl=es-419&gl=AR&ceid=AR:es-419")
+    for equipo in EQUIPOS_FAVORITOS
+]
+
+def fetch_team_news(url):
+    """Obtiene los titulares de un equipo (2 noticias por equipo)"""
+    response = http_session.get(url, timeout=FETCH_TIMEOUT)
+
+    titles = []
+    for item in islice(iter_rss_items(response.content), 2):
+        title = item.findtext("title", "")
+        titles.append(strip_news_source(title))
+    return titles
+
+FOOTBALL_ERROR_MESSAGE = "⚽ No pude obtener info de fútbol."
+
+@ttl_cached(NEWS_CACHE_TTL, errors=(FOOTBALL_ERROR_MESSAGE,))
 def get_football_news():
     """Obtiene noticias de los equipos favoritos"""
     try:
-        result = "⚽ *Fútbol:*\n"
-
-        for equipo in EQUIPOS_FAVORITOS:
-            # Buscar noticias del equipo
-            search_term = equipo.replace(" ", "+")
-            url = f"https://news.google.com/rss/search?q={search_term}+futbol&hl=es-419&gl=AR&ceid=AR:es-419"
-            response = requests.get(url, timeout=10)
-
-            import xml.etree.ElementTree as ET
-            root = ET.fromstring(response.content)
-
-            items = root.findall(".//item")[:2]  # 2 noticias por equipo
-            if items:
-                result += f"\n*{equipo}:*\n"
-                for item in items:
-                    title = item.find("title").text
-                    if " - " in title:
-                        title = title.rsplit(" - ", 1)[0]
-                    result += f"  • {title}\n"
+        parts = ["⚽ *Fútbol:*\n"]
 
-        return result
+        # Buscar las noticias de todos los equipos en paralelo
+        with ThreadPoolExecutor(max_workers=len(EQUIPOS_URLS)) as executor:
+            all_titles = list(executor.map(fetch_team_news, [url for _, url in EQUIPOS_URLS]))
+
+        for (equipo, _), titles in zip(EQUIPOS_URLS, all_titles):
+            if titles:
+                parts.append(f"\n*{equipo}:*\n")
+                for title in titles:
+                    parts.append(f"  • {title}\n")
+
+        return "".join(parts)
     except Exception as e:
-        print(f"Error obteniendo noticias de fútbol: {e}")
-        return "⚽ No pude obtener info de fútbol."
+        logger.error(f"Error obteniendo noticias de fútbol: {e}")
+        return FOOTBALL_ERROR_MESSAGE
 
 # ==================== CINE/STREAMING ====================
 
+@ttl_cached(NEWS_CACHE_TTL)
 def get_entertainment_news():
     """Obtiene estrenos y noticias de cine/streaming"""
     try:
         url = "https://news.google.com/rss/search?q=estrenos+netflix+cine+peliculas&hl=es-419&gl=AR&ceid=AR:es-419"
-        response = requests.get(url, timeout=10)
-
-        import xml.etree.ElementTree as ET
-        root = ET.fromstring(response.content)
+        response = http_session.get(url, timeout=FETCH_TIMEOUT)
 
         news = []
-        for item in root.findall(".//item")[:3]:
-            title = item.find("title").text
-            if " - " in title:
-                title = title.rsplit(" - ", 1)[0]
-            news.append(title)
+        for item in islice(iter_rss_items(response.content), 3):
+            title = item.findtext("title", "")
+            news.append(strip_news_source(title))
 
         if news:
-            result = "🎬 *Cine y Streaming:*\n"
+            parts = ["🎬 *Cine y Streaming:*\n"]
             for n in news:
-                result += f"  • {n}\n"
-            return result
+                parts.append(f"  • {n}\n")
+            return "".join(parts)
         return ""
     except Exception as e:
-        print(f"Error obteniendo noticias de entretenimiento: {e}")
+        logger.error(f"Error obteniendo noticias de entretenimiento: {e}")
         return ""
 
 # ==================== CUARTETO CÓRDOBA ====================
 
+@ttl_cached(NEWS_CACHE_TTL)
 def get_cuarteto_events():
     """Obtiene información de bailes de cuarteto en Córdoba"""
     try:
         url = "https://news.google.com/rss/search?q=cuarteto+cordoba+baile+show&hl=es-419&gl=AR&ceid=AR:es-419"
-        response = requests.get(url, timeout=10)
-
-        import xml.etree.ElementTree as ET
-        root = ET.fromstring(response.content)
+        response = http_session.get(url, timeout=FETCH_TIMEOUT)
 
         news = []
-        keywords = ['cuarteto', 'la mona', 'jimenez', 'cachumba', 'trulala', 'rodrigo', 'ulises bueno', 'la konga', 'baile', 'show']
-
-        for item in root.findall(".//item"):
+        for item in iter_rss_items(response.content):
             if len(news) >= 3:
                 break
-            title = item.find("title").text.lower()
-            if any(kw in title for kw in keywords):
-                title_orig = item.find("title").text
-                if " - " in title_orig:
-                    title_orig = title_orig.rsplit(" - ", 1)[0]
-                news.append(title_orig)
+            title = item.findtext("title", "")
+            if KEYWORDS_CUARTETO_RE.search(title):
+                news.append(strip_news_source(title))
 
         if news:
-            result = "🎺 *Cuarteto en Córdoba:*\n"
+            parts = ["🎺 *Cuarteto en Córdoba:*\n"]
             for n in news:
-                result += f"  • {n}\n"
-            return result
+                parts.append(f"  • {n}\n")
+            return "".join(parts)
         return "🎺 *Cuarteto:* No encontré eventos esta semana."
     except Exception as e:
-        print(f"Error obteniendo info de cuarteto: {e}")
+        logger.error(f"Error obteniendo info de cuarteto: {e}")
         return ""
 
+# Consultas externas (clima, dólar, noticias, calendario) en paralelo: el tiempo
+# total es el de la más lenta y no la suma. Solo se encolan desde hilos que no
+# son del pool, para que nunca quede un worker esperando a otro.
+fetch_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="fetch")
+
+NEWS_ERROR_MESSAGE = "No pude obtener las noticias en este momento."
+
 def format_news(include_links=True):
     """Formatea las noticias para mostrar"""
-    result = ""
+    parts = []
+
+    # Las dos búsquedas en paralelo
+    world_future = fetch_pool.submit(get_news_world)
 
     # Noticias Argentina
     news_ar = get_news_argentina()
     if news_ar:
-        result += "🇦🇷 *Noticias de Argentina:*\n"
+        parts.append("🇦🇷 *Noticias de Argentina:*\n")
         for i, news in enumerate(news_ar, 1):
             if isinstance(news, dict):
-                result += f"  {i}. {news['title']}\n"
+                parts.append(f"  {i}. {news['title']}\n")
                 if include_links:
-                    result += f"     📎 {news['link']}\n"
+                    parts.append(f"     📎 {news['link']}\n")
             else:
-                result += f"  {i}. {news}\n"
-        result += "\n"
+                parts.append(f"  {i}. {news}\n")
+        parts.append("\n")
 
     # Noticias del mundo
-    news_world = get_news_world()
+    news_world = world_future.result()
     if news_world:
-        result += "🌍 *Noticias del Mundo:*\n"
+        parts.append("🌍 *Noticias del Mundo:*\n")
         for i, news in enumerate(news_world, 1):
             if isinstance(news, dict):
-                result += f"  {i}. {news['title']}\n"
+                parts.append(f"  {i}. {news['title']}\n")
                 if include_links:
-                    result += f"     📎 {news['link']}\n"
+                    parts.append(f"     📎 {news['link']}\n")
             else:
-                result += f"  {i}. {news}\n"
+                parts.append(f"  {i}. {news}\n")
 
-    if not result:
-        result = "No pude obtener las noticias en este momento."
+    if not parts:
+        return NEWS_ERROR_MESSAGE
 
-    return result
+    return "".join(parts)
 
 # ==================== RESUMEN DEL DÍA ====================
 
+# Secciones compartidas de la hora actual: (hora, (clima y dólar, noticias)).
+# El lock hace que se armen una sola vez aunque el resumen matutino las pida
+# desde varios hilos a la vez; los demás esperan y usan el resultado
+global_summary_cache = {"hour": None, "sections": None}
+GLOBAL_SUMMARY_LOCK = threading.Lock()
+
+def build_global_summary():
+    """Arma las secciones del resumen que son iguales para todos; devuelve (secciones, ok)"""
+    # Clima y cotización del dólar en paralelo con las noticias
+    weather_future = fetch_pool.submit(get_weather)
+    dolar_future = fetch_pool.submit(get_dolar)
+    # Noticias
+    news = format_news()
+    weather, dolar = weather_future.result(), dolar_future.result()
+    ok = (
+        weather != WEATHER_ERROR_MESSAGE
+        and dolar != DOLAR_ERROR_MESSAGE
+        and news != NEWS_ERROR_MESSAGE
+    )
+    return (f"{weather}\n\n{dolar}\n", news), ok
+
+def get_global_summary():
+    """Obtiene las secciones compartidas del resumen de la hora actual
+    Si alguna consulta falló no se guarda, así el próximo pedido lo vuelve a intentar
+    """
+    hour = datetime.now(TIMEZONE).strftime("%Y-%m-%d-%H")
+    with GLOBAL_SUMMARY_LOCK:
+        if global_summary_cache["hour"] == hour:
+            return global_summary_cache["sections"]
+        sections, ok = build_global_summary()
+        if ok:
+            global_summary_cache.update(hour=hour, sections=sections)
+        return sections
+
 def generate_daily_summary(user_id):
     """Genera el resumen del día"""
     now = datetime.now(TIMEZONE)
+    # Eventos del calendario mientras se arman las secciones compartidas
+    events_future = fetch_pool.submit(get_todays_events)
+    weather_and_dolar, news = get_global_summary()
 
     # Saludo según la hora
     hour = now.hour
@@ -2686,79 +3089,75 @@ def generate_daily_summary(user_id):
     else:
         greeting = "¡Buenas noches! 🌙"
 
-    summary = f"{greeting}\n\n"
-    summary += f"📅 *{now.strftime('%A %d de %B, %Y')}*\n\n"
+    parts = [f"{greeting}\n\n"]
+    parts.append(f"📅 *{now.strftime('%A %d de %B, %Y')}*\n\n")
 
     # Frase motivacional
-    summary += get_motivational_quote() + "\n\n"
-
-    # Clima
-    weather = get_weather()
-    summary += weather + "\n\n"
+    parts.append(get_motivational_quote() + "\n\n")
 
-    # Cotización del dólar
-    summary += get_dolar() + "\n"
+    # Clima y cotización del dólar
+    parts.append(weather_and_dolar)
 
     # Eventos del día
-    events = get_todays_events()
+    events = events_future.result()
     if events:
-        summary += "📆 *Eventos de hoy:*\n"
-        for event in events:
-            try:
-                ical = Calendar.from_ical(event.data)
-                for component in ical.walk():
-                    if component.name == "VEVENT":
-                        title = str(component.get("summary", "Sin título"))
-                        dtstart = component.get("dtstart")
-                        if dtstart and hasattr(dtstart.dt, "hour"):
-                            time_str = dtstart.dt.strftime("%H:%M")
-                            summary += f"  • {time_str} - {title}\n"
-                        else:
-                            summary += f"  • {title}\n"
-            except:
-                pass
+        parts.append("📆 *Eventos de hoy:*\n")
+        for title, dt in events:
+            if dt is not None and hasattr(dt, "hour"):
+                parts.append(f"  • {dt.strftime('%H:%M')} - {title}\n")
+            else:
+                parts.append(f"  • {title}\n")
     else:
-        summary += "📆 No tienes eventos programados para hoy.\n"
+        parts.append("📆 No tienes eventos programados para hoy.\n")
 
-    summary += "\n"
+    parts.append("\n")
 
     # Tareas pendientes
     tasks = get_tasks(user_id)
     if tasks:
-        summary += "📋 *Tareas pendientes:*\n"
+        parts.append("📋 *Tareas pendientes:*\n")
         for task in tasks[:5]:
-            summary += f"  • {task['text']}\n"
+            parts.append(f"  • {task['text']}\n")
         if len(tasks) > 5:
-            summary += f"  _...y {len(tasks) - 5} más_\n"
+            parts.append(f"  _...y {len(tasks) - 5} más_\n")
     else:
-        summary += "📋 No tienes tareas pendientes. ¡Buen trabajo!\n"
+        parts.append("📋 No tienes tareas pendientes. ¡Buen trabajo!\n")
 
-    summary += "\n"
+    parts.append("\n")
 
     # Noticias
-    summary += format_news()
+    parts.append(news)
+
+    return "".join(parts)
 
-    return summary
+# Envíos masivos en paralelo, limitados para no superar el rate limit de Twilio
+SEND_WORKERS = 10
+
+def send_morning_summary_to(user_number):
+    """Envía el resumen matutino a un usuario"""
+    try:
+        summary = generate_daily_summary(user_number)
+        send_whatsapp_message(user_number, summary)
+        logger.info(f"Resumen enviado a {user_number}")
+    except Exception as e:
+        logger.error(f"Error enviando resumen a {user_number}: {e}")
 
 def send_morning_summary():
     """Envía el resumen matutino a todos los usuarios registrados"""
-    print(f"[{datetime.now()}] Enviando resumen matutino...")
+    logger.info(f"[{datetime.now()}] Enviando resumen matutino...")
 
-    for user_number in registered_users:
-        try:
-            summary = generate_daily_summary(user_number)
-            send_whatsapp_message(user_number, summary)
-            print(f"Resumen enviado a {user_number}")
-        except Exception as e:
-            print(f"Error enviando resumen a {user_number}: {e}")
+    # Desde el archivo, así también funciona en el proceso dedicado al scheduler
+    users = load_registered_users(readonly=True)
+
+    with ThreadPoolExecutor(max_workers=SEND_WORKERS) as executor:
+        list(executor.map(send_morning_summary_to, users))
 
 # ==================== PROMPT DEL SISTEMA ====================
 
 SYSTEM_PROMPT = """Eres un asistente personal inteligente que ayuda a gestionar calendario, tareas, notas, gastos y más.
 
 FECHA Y HORA ACTUAL:
-- Hoy es: {today}
-- Hora actual: {current_time}
+- Se indican al comienzo del último mensaje del usuario, entre corchetes
 
 IMPORTANTE sobre fechas:
 - Cuando el usuario mencione "el día 2", "el 15", etc., calcula correctamente qué día de la semana es
@@ -2953,21 +3352,52 @@ Entiende estas variaciones comunes:
 - "cuánto tengo", "cómo voy" = resumen de gastos
 - "qué me falta" = lista de compras
 - "super", "súper", "supermercado", "mandado" = lista de compras
-
-Hoy es: {today}
 """
 
+# El prompt es fijo para que la API lo cachee entre turnos; la fecha y hora
+# van en el mensaje del usuario (ver build_dated_messages)
+SYSTEM_PROMPT_BLOCKS = [
+    {"type": "text", "text": SYSTEM_PROMPT, "cache_control": {"type": "ephemeral"}}
+]
+
+@lru_cache(maxsize=2)
+def build_date_header(minute):
+    """Arma el encabezado con la fecha y hora del minuto (se cachea por minuto)"""
+    # Fecha y hora con el día de la semana en español
+    dia_nombre = WEEKDAY_NAMES[minute.weekday()]
+    today = f"{minute.strftime('%Y-%m-%d')} {dia_nombre} (día {minute.day} del mes {minute.month})"
+    return f"[Hoy es: {today} | Hora actual: {minute.strftime('%H:%M')}]"
+
+def build_dated_messages(conversation, now):
+    """Agrega la fecha y hora actual al último mensaje del usuario (sin guardarla en el historial)"""
+    last = conversation[-1]
+    header = build_date_header(now.replace(second=0, microsecond=0))
+    dated = f"{header}\n\n{last['content']}"
+    return conversation[:-1] + [{"role": last["role"], "content": dated}]
+
 # ==================== FUNCIONES DE CALENDARIO ====================
 
+# Conexión a iCloud y calendario reutilizados entre llamadas. Cualquier error
+# descarta la conexión, así que alcanza con renovarla cada hora
+CALDAV_CACHE_TTL = 3600
+caldav_cache = {"client": None, "calendar": None, "ts": 0}
+
+def reset_caldav_cache():
+    """Descarta la conexión guardada para reconectar en la próxima llamada"""
+    caldav_cache.update(client=None, calendar=None, ts=0)
+
 def get_caldav_client():
     """Conecta con el servidor CalDAV de iCloud"""
+    if caldav_cache["client"] and time.time() - caldav_cache["ts"] < CALDAV_CACHE_TTL:
+        return caldav_cache["client"]
     try:
         client = caldav.DAVClient(
             url=CALDAV_URL, username=ICLOUD_EMAIL, password=ICLOUD_APP_PASSWORD
         )
+        caldav_cache.update(client=client, calendar=None, ts=time.time())
         return client
     except Exception as e:
-        print(f"Error conectando a iCloud: {e}")
+        logger.error(f"Error conectando a iCloud: {e}")
         return None
 
 
@@ -2976,14 +3406,18 @@ def get_calendar():
     client = get_caldav_client()
     if not client:
         return None
+    if caldav_cache["calendar"]:
+        return caldav_cache["calendar"]
     try:
         principal = client.principal()
         calendars = principal.calendars()
         if calendars:
+            caldav_cache["calendar"] = calendars[0]
             return calendars[0]
         return None
     except Exception as e:
-        print(f"Error obteniendo calendario: {e}")
+        logger.error(f"Error obteniendo calendario: {e}")
+        reset_caldav_cache()
         return None
 
 
@@ -3010,35 +3444,96 @@ def create_calendar_event(title, date_str, time_str, duration_minutes=60):
 
         cal.add_component(event)
         calendar.save_event(cal.to_ical().decode("utf-8"))
+        # El calendario cambió: descartar las búsquedas cacheadas
+        events_cache.clear()
 
         return True, f"Evento '{title}' creado para {date_str} a las {time_str}"
     except Exception as e:
-        print(f"Error creando evento: {e}")
+        logger.error(f"Error creando evento: {e}")
+        reset_caldav_cache()
         return False, f"Error: {str(e)}"
 
 
+# Resultados de búsquedas de eventos, reutilizados durante un minuto
+EVENTS_CACHE_TTL = 60
+events_cache = {}
+
+def get_cached_events(key):
+    """Devuelve los eventos cacheados para la búsqueda si no vencieron"""
+    entry = events_cache.get(key)
+    if entry and entry[0] > time.time():
+        return entry[1]
+    return None
+
+def set_cached_events(key, events):
+    """Guarda el resultado de una búsqueda de eventos"""
+    events_cache[key] = (time.time() + EVENTS_CACHE_TTL, events)
+
+# VEVENTs ya parseados (título, inicio), por contenido del evento
+parsed_events_cache = {}
+PARSED_EVENTS_CACHE_MAX = 256
+
+def parse_vevent(event):
+    """Obtiene título e inicio del VEVENT de un evento, sin volver a parsear si no cambió"""
+    data = event.data
+    cached = parsed_events_cache.get(data)
+    if cached is None:
+        ical = Calendar.from_ical(data)
+        vevent = next(iter(ical.walk("VEVENT")), None)
+        if vevent is None:
+            cached = (None, None)
+        else:
+            dtstart = vevent.get("dtstart")
+            cached = (str(vevent.get("summary", "Sin título")), dtstart.dt if dtstart else None)
+        if len(parsed_events_cache) >= PARSED_EVENTS_CACHE_MAX:
+            parsed_events_cache.clear()
+        parsed_events_cache[data] = cached
+    return cached
+
+def parse_events(events):
+    """Título e inicio de cada evento, descartando los que no se pueden leer"""
+    parsed = []
+    for event in events:
+        try:
+            title, dt = parse_vevent(event)
+        except:
+            continue
+        if title is not None:
+            parsed.append((title, dt))
+    return parsed
+
 def get_todays_events():
-    """Obtiene los eventos de hoy"""
+    """Obtiene los eventos de hoy como (título, inicio), ya parseados"""
+    today = datetime.now(TIMEZONE).date()
+    cached = get_cached_events(("today", today))
+    if cached is not None:
+        return cached
+
     calendar = get_calendar()
     if not calendar:
         return []
 
-    today = datetime.now(TIMEZONE).date()
     tomorrow = today + timedelta(days=1)
 
     try:
-        events = calendar.date_search(
+        events = parse_events(calendar.date_search(
             start=datetime.combine(today, datetime.min.time()),
             end=datetime.combine(tomorrow, datetime.min.time()),
-        )
+        ))
+        set_cached_events(("today", today), events)
         return events
     except Exception as e:
-        print(f"Error obteniendo eventos: {e}")
+        logger.error(f"Error obteniendo eventos: {e}")
+        reset_caldav_cache()
         return []
 
 
 def get_upcoming_events(hours=24):
     """Obtiene eventos en las próximas horas"""
+    cached = get_cached_events(("upcoming", hours))
+    if cached is not None:
+        return cached
+
     calendar = get_calendar()
     if not calendar:
         return []
@@ -3051,36 +3546,25 @@ def get_upcoming_events(hours=24):
         result = []
         for event in events:
             try:
-                ical = Calendar.from_ical(event.data)
-                for component in ical.walk():
-                    if component.name == "VEVENT":
-                        summary = str(component.get("summary", "Sin título"))
-                        dtstart = component.get("dtstart")
-                        if dtstart:
-                            dt = dtstart.dt
-                            if hasattr(dt, "hour"):
-                                result.append(
-                                    {"title": summary, "datetime": dt, "event": event}
-                                )
+                summary, dt = parse_vevent(event)
+                if dt is not None and hasattr(dt, "hour"):
+                    result.append(
+                        {"title": summary, "datetime": dt, "event": event}
+                    )
             except:
                 pass
+        set_cached_events(("upcoming", hours), result)
         return result
     except Exception as e:
-        print(f"Error obteniendo eventos próximos: {e}")
+        logger.error(f"Error obteniendo eventos próximos: {e}")
+        reset_caldav_cache()
         return []
 
 
 # ==================== PARSEO Y PROCESAMIENTO ====================
 
-def parse_event_from_response(response_text):
-    """Extrae datos del evento de la respuesta del AI"""
-    pattern = r"\[EVENTO\](.*?)\[/EVENTO\]"
-    match = re.search(pattern, response_text, re.DOTALL)
-
-    if not match:
-        return None
-
-    event_text = match.group(1)
+def parse_event_data(event_text):
+    """Extrae los datos del evento del contenido del tag [EVENTO]"""
     event_data = {}
 
     for line in event_text.strip().split("\n"):
@@ -3093,303 +3577,349 @@ def parse_event_from_response(response_text):
     return None
 
 
-def process_actions(response_text, user_id):
-    """Procesa todas las acciones en la respuesta"""
-    result = response_text
-
-    # Procesar evento
-    event_data = parse_event_from_response(response_text)
-    if event_data:
-        success, msg = create_calendar_event(
-            event_data["titulo"],
-            event_data["fecha"],
-            event_data["hora"],
-            event_data.get("duracion", 60),
-        )
-        result = re.sub(r"\[EVENTO\].*?\[/EVENTO\]", "", result, flags=re.DOTALL)
-        result += f"\n\n{'✅' if success else '❌'} {msg}"
-
-    # Procesar agregar tarea
-    task_match = re.search(r"\[TAREA_AGREGAR\](.*?)\[/TAREA_AGREGAR\]", result, re.DOTALL)
-    if task_match:
-        task_text = task_match.group(1).strip()
-        task = add_task(user_id, task_text)
-        result = re.sub(r"\[TAREA_AGREGAR\].*?\[/TAREA_AGREGAR\]", "", result, flags=re.DOTALL)
-        result += f"\n\n✅ Tarea agregada: {task_text}"
-
-    # Procesar completar tarea
-    complete_match = re.search(r"\[TAREA_COMPLETAR\](\d+)\[/TAREA_COMPLETAR\]", result)
-    if complete_match:
-        task_id = int(complete_match.group(1))
+# Cada acción recibe los contenidos de sus tags, el usuario, la lista de
+# mensajes a agregar al final de la respuesta y la hora actual
+
+def action_event(values, user_id, appends, now):
+    """[EVENTO]: crea eventos en el calendario"""
+    for value in values:
+        event_data = parse_event_data(value)
+        if event_data:
+            success, msg = create_calendar_event(
+                event_data["titulo"],
+                event_data["fecha"],
+                event_data["hora"],
+                event_data.get("duracion", 60),
+            )
+            appends.append(f"{'✅' if success else '❌'} {msg}")
+
+def action_task_add(values, user_id, appends, now):
+    """[TAREA_AGREGAR]: agrega tareas"""
+    for value in values:
+        task_text = value.strip()
+        add_task(user_id, task_text)
+        appends.append(f"✅ Tarea agregada: {task_text}")
+
+def action_task_complete(values, user_id, appends, now):
+    """[TAREA_COMPLETAR]: completa tareas por ID"""
+    for value in values:
+        if not value.strip().isdecimal():
+            continue
+        task_id = int(value)
         if complete_task(user_id, task_id):
-            result = re.sub(r"\[TAREA_COMPLETAR\]\d+\[/TAREA_COMPLETAR\]", "", result)
-            result += f"\n\n✅ Tarea {task_id} completada"
+            appends.append(f"✅ Tarea {task_id} completada")
         else:
-            result += f"\n\n❌ No encontré la tarea {task_id}"
+            appends.append(f"❌ No encontré la tarea {task_id}")
 
-    # Procesar eliminar tarea
-    delete_task_match = re.search(r"\[TAREA_ELIMINAR\](\d+)\[/TAREA_ELIMINAR\]", result)
-    if delete_task_match:
-        task_id = int(delete_task_match.group(1))
+def action_task_delete(values, user_id, appends, now):
+    """[TAREA_ELIMINAR]: elimina tareas por ID"""
+    for value in values:
+        if not value.strip().isdecimal():
+            continue
+        task_id = int(value)
         if delete_task(user_id, task_id):
-            result = re.sub(r"\[TAREA_ELIMINAR\]\d+\[/TAREA_ELIMINAR\]", "", result)
-            result += f"\n\n✅ Tarea {task_id} eliminada"
-
-    # Procesar vaciar todas las tareas
-    if "[TAREAS_VACIAR][/TAREAS_VACIAR]" in result:
-        clear_all_tasks(user_id)
-        result = result.replace("[TAREAS_VACIAR][/TAREAS_VACIAR]", "")
-        result += "\n\n✅ Todas las tareas han sido eliminadas"
-
-    # Procesar listar tareas
-    if "[TAREAS_LISTAR][/TAREAS_LISTAR]" in result:
-        result = result.replace("[TAREAS_LISTAR][/TAREAS_LISTAR]", "")
-        result += f"\n\n{format_tasks(user_id)}"
-
-    # Procesar agregar nota
-    note_match = re.search(r"\[NOTA_AGREGAR\](.*?)\[/NOTA_AGREGAR\]", result, re.DOTALL)
-    if note_match:
-        note_text = note_match.group(1).strip()
-        note = add_note(user_id, note_text)
-        result = re.sub(r"\[NOTA_AGREGAR\].*?\[/NOTA_AGREGAR\]", "", result, flags=re.DOTALL)
-        result += f"\n\n✅ Nota guardada: {note_text}"
-
-    # Procesar listar notas
-    if "[NOTAS_LISTAR][/NOTAS_LISTAR]" in result:
-        result = result.replace("[NOTAS_LISTAR][/NOTAS_LISTAR]", "")
-        result += f"\n\n{format_notes(user_id)}"
-
-    # Procesar eliminar nota
-    delete_note_match = re.search(r"\[NOTA_ELIMINAR\](\d+)\[/NOTA_ELIMINAR\]", result)
-    if delete_note_match:
-        note_id = int(delete_note_match.group(1))
+            appends.append(f"✅ Tarea {task_id} eliminada")
+
+def action_tasks_clear(values, user_id, appends, now):
+    """[TAREAS_VACIAR]: elimina todas las tareas"""
+    clear_all_tasks(user_id)
+    appends.append("✅ Todas las tareas han sido eliminadas")
+
+def action_note_add(values, user_id, appends, now):
+    """[NOTA_AGREGAR]: guarda notas"""
+    for value in values:
+        note_text = value.strip()
+        add_note(user_id, note_text)
+        appends.append(f"✅ Nota guardada: {note_text}")
+
+def action_note_delete(values, user_id, appends, now):
+    """[NOTA_ELIMINAR]: elimina notas por ID"""
+    for value in values:
+        if not value.strip().isdecimal():
+            continue
+        note_id = int(value)
         if delete_note(user_id, note_id):
-            result = re.sub(r"\[NOTA_ELIMINAR\]\d+\[/NOTA_ELIMINAR\]", "", result)
-            result += f"\n\n✅ Nota {note_id} eliminada"
-
-    # Procesar clima
-    clima_match = re.search(r"\[CLIMA\](.*?)\[/CLIMA\]", result)
-    if clima_match:
-        city = clima_match.group(1).strip() or get_user_location(user_id)
-        weather = get_weather(city)
-        result = re.sub(r"\[CLIMA\].*?\[/CLIMA\]", "", result)
-        result += f"\n\n{weather}"
-
-    # Procesar resumen
-    if "[RESUMEN][/RESUMEN]" in result:
-        result = result.replace("[RESUMEN][/RESUMEN]", "")
-        result += f"\n\n{generate_daily_summary(user_id)}"
-
-    # Procesar agregar gasto
-    gasto_match = re.search(r"\[GASTO_AGREGAR\](.*?)\[/GASTO_AGREGAR\]", result)
-    if gasto_match:
-        gasto_data = gasto_match.group(1).strip().split("|")
-        if len(gasto_data) >= 2:
-            try:
-                monto = float(gasto_data[0].replace("$", "").replace(",", "").strip())
-                descripcion = gasto_data[1].strip()
-                categoria = gasto_data[2].strip() if len(gasto_data) > 2 else "General"
-                expense = add_expense(user_id, monto, descripcion, categoria)
-                result = re.sub(r"\[GASTO_AGREGAR\].*?\[/GASTO_AGREGAR\]", "", result)
-                result += f"\n\n✅ Gasto registrado: ${monto:,.0f} - {descripcion} ({categoria})"
-            except:
-                result += "\n\n❌ No pude registrar el gasto. Formato: monto|descripción|categoría"
-        else:
-            result += "\n\n❌ Formato incorrecto. Usa: monto|descripción|categoría"
-
-    # Procesar listar gastos
-    if "[GASTOS_LISTAR][/GASTOS_LISTAR]" in result:
-        result = result.replace("[GASTOS_LISTAR][/GASTOS_LISTAR]", "")
-        result += f"\n\n{list_expenses(user_id)}"
+            appends.append(f"✅ Nota {note_id} eliminada")
+
+def action_weather(values, user_id, appends, now):
+    """[CLIMA]: clima de la ciudad indicada o de la del usuario"""
+    for value in values:
+        city = value.strip() or get_user_location(user_id)
+        appends.append(fetch_pool.submit(get_weather, city))
+
+# Símbolos que se ignoran en el monto de un gasto ("$1,500" -> "1500")
+EXPENSE_AMOUNT_TRANS = str.maketrans("", "", "$, ")
+
+def action_expense_add(values, user_id, appends, now):
+    """[GASTO_AGREGAR]: registra gastos con formato monto|descripción|categoría"""
+    for value in values:
+        gasto_data = value.strip().split("|")
+        if len(gasto_data) < 2:
+            appends.append("❌ Formato incorrecto. Usa: monto|descripción|categoría")
+            continue
+        try:
+            monto = float(gasto_data[0].translate(EXPENSE_AMOUNT_TRANS))
+        except ValueError:
+            appends.append("❌ No pude registrar el gasto. Formato: monto|descripción|categoría")
+            continue
+        descripcion = gasto_data[1].strip()
+        categoria = gasto_data[2].strip() if len(gasto_data) > 2 else "General"
+        try:
+            add_expense(user_id, monto, descripcion, categoria)
+        except sqlite3.Error as e:
+            logger.error(f"Error registrando gasto: {e}")
+            appends.append("❌ No pude registrar el gasto. Formato: monto|descripción|categoría")
+            continue
+        appends.append(f"✅ Gasto registrado: ${monto:,.0f} - {descripcion} ({categoria})")
 
-    # Procesar eliminar gasto
-    gasto_del_match = re.search(r"\[GASTO_ELIMINAR\](\d+)\[/GASTO_ELIMINAR\]", result)
-    if gasto_del_match:
-        gasto_id = int(gasto_del_match.group(1))
+def action_expense_delete(values, user_id, appends, now):
+    """[GASTO_ELIMINAR]: elimina gastos por ID"""
+    for value in values:
+        if not value.strip().isdecimal():
+            continue
+        gasto_id = int(value)
         if delete_expense(user_id, gasto_id):
-            result = re.sub(r"\[GASTO_ELIMINAR\]\d+\[/GASTO_ELIMINAR\]", "", result)
-            result += f"\n\n✅ Gasto {gasto_id} eliminado"
+            appends.append(f"✅ Gasto {gasto_id} eliminado")
         else:
-            result = re.sub(r"\[GASTO_ELIMINAR\]\d+\[/GASTO_ELIMINAR\]", "", result)
-            result += f"\n\n❌ No encontré el gasto {gasto_id}"
-
-    # Procesar resumen de gastos
-    if "[GASTOS_RESUMEN][/GASTOS_RESUMEN]" in result:
-        result = result.replace("[GASTOS_RESUMEN][/GASTOS_RESUMEN]", "")
-        result += f"\n\n{get_expenses_summary(user_id)}"
-
-    # Procesar dólar
-    if "[DOLAR][/DOLAR]" in result:
-        result = result.replace("[DOLAR][/DOLAR]", "")
-        result += f"\n\n{get_dolar()}"
-
-    # Procesar fútbol
-    if "[FUTBOL][/FUTBOL]" in result:
-        result = result.replace("[FUTBOL][/FUTBOL]", "")
-        result += f"\n\n{get_football_news()}"
-
-    # Procesar cuarteto
-    if "[CUARTETO][/CUARTETO]" in result:
-        result = result.replace("[CUARTETO][/CUARTETO]", "")
-        result += f"\n\n{get_cuarteto_events()}"
-
-    # Procesar cine/streaming
-    if "[CINE][/CINE]" in result:
-        result = result.replace("[CINE][/CINE]", "")
-        result += f"\n\n{get_entertainment_news()}"
-
-    # Procesar agregar medicamento
-    med_add_match = re.search(r"\[MED_AGREGAR\](.*?)\[/MED_AGREGAR\]", result)
-    if med_add_match:
-        med_name = med_add_match.group(1).strip()
+            appends.append(f"❌ No encontré el gasto {gasto_id}")
+
+def action_med_add(values, user_id, appends, now):
+    """[MED_AGREGAR]: agrega medicamentos"""
+    for value in values:
+        med_name = value.strip()
         if add_medication(user_id, med_name):
-            result = re.sub(r"\[MED_AGREGAR\].*?\[/MED_AGREGAR\]", "", result)
-            result += f"\n\n✅ Medicamento agregado: {med_name}"
+            appends.append(f"✅ Medicamento agregado: {med_name}")
         else:
-            result = re.sub(r"\[MED_AGREGAR\].*?\[/MED_AGREGAR\]", "", result)
-            result += f"\n\n⚠️ El medicamento '{med_name}' ya está en tu lista."
+            appends.append(f"⚠️ El medicamento '{med_name}' ya está en tu lista.")
 
-    # Procesar eliminar medicamento
-    med_del_match = re.search(r"\[MED_ELIMINAR\](.*?)\[/MED_ELIMINAR\]", result)
-    if med_del_match:
-        med_name = med_del_match.group(1).strip()
+def action_med_delete(values, user_id, appends, now):
+    """[MED_ELIMINAR]: elimina medicamentos"""
+    for value in values:
+        med_name = value.strip()
         if remove_medication(user_id, med_name):
-            result = re.sub(r"\[MED_ELIMINAR\].*?\[/MED_ELIMINAR\]", "", result)
-            result += f"\n\n✅ Medicamento eliminado: {med_name}"
+            appends.append(f"✅ Medicamento eliminado: {med_name}")
         else:
-            result = re.sub(r"\[MED_ELIMINAR\].*?\[/MED_ELIMINAR\]", "", result)
-            result += f"\n\n❌ No encontré el medicamento '{med_name}' en tu lista."
-
-    # Procesar listar medicamentos
-    if "[MED_LISTAR][/MED_LISTAR]" in result:
-        result = result.replace("[MED_LISTAR][/MED_LISTAR]", "")
-        result += f"\n\n{format_medications(user_id)}"
-
-    # Procesar medicamentos tomados
-    med_taken_match = re.search(r"\[MED_TOMADO\](.*?)\[/MED_TOMADO\]", result)
-    if med_taken_match:
-        period = med_taken_match.group(1).strip().lower()
-        if period not in ["mañana", "noche"]:
-            # Determinar automáticamente según la hora
-            hour = datetime.now(TIMEZONE).hour
-            period = "mañana" if hour < 14 else "noche"
-
-        log_medication_taken(user_id, period)
-        result = re.sub(r"\[MED_TOMADO\].*?\[/MED_TOMADO\]", "", result)
-        result += f"\n\n✅ Registrado: medicamentos de la {period} tomados. ¡Bien hecho! 💪"
-
-    # Procesar agregar recordatorio
-    reminder_match = re.search(r"\[RECORDATORIO\](.*?)\[/RECORDATORIO\]", result)
-    if reminder_match:
-        reminder_data = reminder_match.group(1).strip().split("|")
+            appends.append(f"❌ No encontré el medicamento '{med_name}' en tu lista.")
+
+def action_med_taken(values, user_id, appends, now):
+    """[MED_TOMADO]: registra la toma de medicamentos"""
+    period = values[0].strip().lower()
+    if period not in ["mañana", "noche"]:
+        # Determinar automáticamente según la hora
+        period = "mañana" if now.hour < 14 else "noche"
+
+    log_medication_taken(user_id, period)
+    appends.append(f"✅ Registrado: medicamentos de la {period} tomados. ¡Bien hecho! 💪")
+
+def action_reminder_add(values, user_id, appends, now):
+    """[RECORDATORIO]: crea recordatorios con formato mensaje|YYYY-MM-DD HH:MM"""
+    for value in values:
+        reminder_data = value.strip().split("|")
         if len(reminder_data) >= 2:
             try:
                 message_text = reminder_data[0].strip()
                 remind_at_str = reminder_data[1].strip()
                 remind_at = datetime.strptime(remind_at_str, "%Y-%m-%d %H:%M")
                 remind_at = TIMEZONE.localize(remind_at)
-                reminder = add_reminder(user_id, message_text, remind_at.isoformat())
-                result = re.sub(r"\[RECORDATORIO\].*?\[/RECORDATORIO\]", "", result)
-                result += f"\n\n✅ Recordatorio creado: '{message_text}' para el {remind_at.strftime('%d/%m/%Y a las %H:%M')}"
+                add_reminder(user_id, message_text, remind_at.isoformat())
+                appends.append(f"✅ Recordatorio creado: '{message_text}' para el {remind_at.strftime('%d/%m/%Y a las %H:%M')}")
             except Exception as e:
-                print(f"Error creando recordatorio: {e}")
-                result = re.sub(r"\[RECORDATORIO\].*?\[/RECORDATORIO\]", "", result)
-                result += "\n\n❌ No pude crear el recordatorio. Formato: mensaje|YYYY-MM-DD HH:MM"
+                logger.error(f"Error creando recordatorio: {e}")
+                appends.append("❌ No pude crear el recordatorio. Formato: mensaje|YYYY-MM-DD HH:MM")
         else:
-            result = re.sub(r"\[RECORDATORIO\].*?\[/RECORDATORIO\]", "", result)
-            result += "\n\n❌ Formato incorrecto. Usa: mensaje|YYYY-MM-DD HH:MM"
-
-    # Procesar listar recordatorios
-    if "[RECORDATORIOS_LISTAR][/RECORDATORIOS_LISTAR]" in result:
-        result = result.replace("[RECORDATORIOS_LISTAR][/RECORDATORIOS_LISTAR]", "")
-        result += f"\n\n{format_reminders(user_id)}"
-
-    # Procesar eliminar recordatorio
-    reminder_del_match = re.search(r"\[RECORDATORIO_ELIMINAR\](\d+)\[/RECORDATORIO_ELIMINAR\]", result)
-    if reminder_del_match:
-        reminder_id = int(reminder_del_match.group(1))
+            appends.append("❌ Formato incorrecto. Usa: mensaje|YYYY-MM-DD HH:MM")
+
+def action_reminder_delete(values, user_id, appends, now):
+    """[RECORDATORIO_ELIMINAR]: elimina recordatorios por ID"""
+    for value in values:
+        if not value.strip().isdecimal():
+            continue
+        reminder_id = int(value)
         if delete_reminder(user_id, reminder_id):
-            result = re.sub(r"\[RECORDATORIO_ELIMINAR\]\d+\[/RECORDATORIO_ELIMINAR\]", "", result)
-            result += f"\n\n✅ Recordatorio {reminder_id} eliminado"
+            appends.append(f"✅ Recordatorio {reminder_id} eliminado")
+        else:
+            appends.append(f"❌ No encontré el recordatorio {reminder_id}")
+
+def action_shopping_add(values, user_id, appends, now):
+    """[COMPRA_AGREGAR]: agrega items a la lista de compras (puede haber múltiples)"""
+    added_items = []
+    for item in values:
+        item = item.strip()
+        # Limpiar caracteres extra y emojis comunes
+        item = SHOPPING_CHECK_RE.sub('', item).strip()
+        if item and len(item) > 1 and len(item) < 50:  # Solo items válidos
+            add_shopping_item(user_id, item)
+            added_items.append(item)
+            logger.info(f"[SHOPPING] Agregado: {item}")
+    if len(added_items) == 1:
+        appends.append(f"✅ Agregado a la lista: {added_items[0]}")
+    elif len(added_items) > 1:
+        appends.append(f"✅ Agregados a la lista ({len(added_items)} items): {', '.join(added_items)}")
+
+def action_shopping_mark(values, user_id, appends, now):
+    """[COMPRA_MARCAR]: marca items como comprados"""
+    for value in values:
+        if not value.strip().isdecimal():
+            continue
+        item_id = int(value)
+        if mark_item_bought(user_id, item_id):
+            appends.append(f"✅ Item {item_id} marcado como comprado")
         else:
-            result = re.sub(r"\[RECORDATORIO_ELIMINAR\]\d+\[/RECORDATORIO_ELIMINAR\]", "", result)
-            result += f"\n\n❌ No encontré el recordatorio {reminder_id}"
+            appends.append(f"❌ No encontré el item {item_id}")
 
-    # Procesar agregar a lista de compras (puede haber múltiples items)
-    shopping_items = re.findall(r"\[COMPRA_AGREGAR\](.*?)\[/COMPRA_AGREGAR\]", result, re.DOTALL)
+def action_shopping_delete(values, user_id, appends, now):
+    """[COMPRA_ELIMINAR]: elimina items de la lista"""
+    for value in values:
+        if not value.strip().isdecimal():
+            continue
+        item_id = int(value)
+        if delete_shopping_item(user_id, item_id):
+            appends.append(f"✅ Item {item_id} eliminado de la lista")
+
+def action_shopping_clear_bought(values, user_id, appends, now):
+    """[COMPRAS_LIMPIAR]: elimina los items comprados"""
+    clear_bought_items(user_id)
+    appends.append("✅ Items comprados eliminados de la lista")
+
+def action_shopping_clear(values, user_id, appends, now):
+    """[COMPRAS_VACIAR]: vacía toda la lista de compras"""
+    clear_all_shopping(user_id)
+    appends.append("✅ Lista de compras vaciada completamente")
+
+def action_location(values, user_id, appends, now):
+    """[UBICACION]: guarda la ciudad del usuario"""
+    city = values[0].strip()
+    set_user_location(user_id, city)
+    appends.append(f"✅ Ubicación guardada: {city}. El clima ahora será de esta ciudad.")
+
+def zero_arg_action(show):
+    """Arma una acción sin argumentos que solo agrega el texto de show(user_id)"""
+    def handler(values, user_id, appends, now):
+        appends.append(show(user_id))
+    return handler
+
+def fetch_action(fetch):
+    """Arma una acción sin argumentos que consulta un servicio externo en fetch_pool
+    El resultado se espera al final de process_actions, así varias consultas van en paralelo
+    """
+    def handler(values, user_id, appends, now):
+        appends.append(fetch_pool.submit(fetch))
+    return handler
+
+# Acciones en el orden en que se ejecutan (primero las que modifican datos,
+# después las que los muestran)
+ACTION_HANDLERS = {
+    "EVENTO": action_event,
+    "TAREA_AGREGAR": action_task_add,
+    "TAREA_COMPLETAR": action_task_complete,
+    "TAREA_ELIMINAR": action_task_delete,
+    "TAREAS_VACIAR": action_tasks_clear,
+    "TAREAS_LISTAR": zero_arg_action(format_tasks),
+    "NOTA_AGREGAR": action_note_add,
+    "NOTAS_LISTAR": zero_arg_action(format_notes),
+    "NOTA_ELIMINAR": action_note_delete,
+    "CLIMA": action_weather,
+    "RESUMEN": zero_arg_action(generate_daily_summary),
+    "GASTO_AGREGAR": action_expense_add,
+    "GASTOS_LISTAR": zero_arg_action(list_expenses),
+    "GASTO_ELIMINAR": action_expense_delete,
+    "GASTOS_RESUMEN": zero_arg_action(get_expenses_summary),
+    "DOLAR": fetch_action(lambda: get_dolar()),
+    "FUTBOL": fetch_action(lambda: get_football_news()),
+    "CUARTETO": fetch_action(lambda: get_cuarteto_events()),
+    "CINE": fetch_action(lambda: get_entertainment_news()),
+    "MED_AGREGAR": action_med_add,
+    "MED_ELIMINAR": action_med_delete,
+    "MED_LISTAR": zero_arg_action(format_medications),
+    "MED_TOMADO": action_med_taken,
+    "RECORDATORIO": action_reminder_add,
+    "RECORDATORIOS_LISTAR": zero_arg_action(format_reminders),
+    "RECORDATORIO_ELIMINAR": action_reminder_delete,
+    "COMPRA_AGREGAR": action_shopping_add,
+    "COMPRAS_LISTAR": zero_arg_action(format_shopping_list),
+    "COMPRA_MARCAR": action_shopping_mark,
+    "COMPRA_ELIMINAR": action_shopping_delete,
+    "COMPRAS_LIMPIAR": action_shopping_clear_bought,
+    "COMPRAS_VACIAR": action_shopping_clear,
+    "GASTOS_ANALISIS": zero_arg_action(analyze_expenses),
+    "UBICACION": action_location,
+}
+
+# Un solo patrón para todos los tags de acciones
+ACTION_TAG_RE = re.compile(r"\[(" + "|".join(ACTION_HANDLERS) + r")\](.*?)\[/\1\]", re.DOTALL)
+SHOPPING_BULLET_RE = re.compile(r'[•\-\*]\s*([^\n•\-\*]+)')
+SHOPPING_CHECK_RE = re.compile(r'[✓✔️✅]')
+
+
+def extract_action_tags(text):
+    """Quita los tags de acciones del texto en una sola pasada; devuelve (texto, [(tag, contenido)])"""
+    # La mayoría de las respuestas no traen tags: todo tag cierra con "[/"
+    if "[/" not in text:
+        return text, []
+    found = []
+
+    def collect(match):
+        found.append(match.groups())
+        return ""
 
-    # FALLBACK: Si no hay tags pero el modelo dice "agregado/agregué" y lista items con bullets
-    if not shopping_items and ("agregado" in result.lower() or "agregué" in result.lower() or "he agregado" in result.lower()):
-        # Buscar items en formato bullet (• item o - item o * item)
-        bullet_items = re.findall(r'[•\-\*]\s*([^\n•\-\*]+)', result)
-        if bullet_items:
-            shopping_items = [item.strip() for item in bullet_items if item.strip() and len(item.strip()) < 50]
-            print(f"[SHOPPING FALLBACK] Detectados items por bullets: {shopping_items}")
+    return ACTION_TAG_RE.sub(collect, text), found
 
+def find_shopping_bullets(text):
+    """FALLBACK: si no hay tags pero el modelo dice "agregado/agregué", toma los items con bullets"""
+    text_lower = text.lower()
+    if "agregado" not in text_lower and "agregué" not in text_lower:
+        return []
+    # Buscar items en formato bullet (• item o - item o * item)
+    bullet_items = SHOPPING_BULLET_RE.findall(text)
+    shopping_items = [item.strip() for item in bullet_items if item.strip() and len(item.strip()) < 50]
     if shopping_items:
-        added_items = []
-        for item in shopping_items:
-            item = item.strip()
-            # Limpiar caracteres extra y emojis comunes
-            item = re.sub(r'[✓✔️✅]', '', item).strip()
-            if item and len(item) > 1 and len(item) < 50:  # Solo items válidos
-                add_shopping_item(user_id, item)
-                added_items.append(item)
-                print(f"[SHOPPING] Agregado: {item}")
-        result = re.sub(r"\[COMPRA_AGREGAR\].*?\[/COMPRA_AGREGAR\]", "", result, flags=re.DOTALL)
-        if len(added_items) == 1:
-            result += f"\n\n✅ Agregado a la lista: {added_items[0]}"
-        elif len(added_items) > 1:
-            result += f"\n\n✅ Agregados a la lista ({len(added_items)} items): {', '.join(added_items)}"
-
-    # Procesar listar compras
-    if "[COMPRAS_LISTAR][/COMPRAS_LISTAR]" in result:
-        result = result.replace("[COMPRAS_LISTAR][/COMPRAS_LISTAR]", "")
-        result += f"\n\n{format_shopping_list(user_id)}"
-
-    # Procesar marcar comprado
-    shopping_mark_match = re.search(r"\[COMPRA_MARCAR\](\d+)\[/COMPRA_MARCAR\]", result)
-    if shopping_mark_match:
-        item_id = int(shopping_mark_match.group(1))
-        if mark_item_bought(user_id, item_id):
-            result = re.sub(r"\[COMPRA_MARCAR\]\d+\[/COMPRA_MARCAR\]", "", result)
-            result += f"\n\n✅ Item {item_id} marcado como comprado"
+        logger.info(f"[SHOPPING FALLBACK] Detectados items por bullets: {shopping_items}")
+    return shopping_items
+
+
+# Acciones con I/O lento (calendario, resumen con consultas externas): corren fuera
+# del lote de archivos JSON, para que el lote no retenga una copia vieja mientras
+# otro hilo (por ejemplo el scheduler) guarda cambios en esos archivos
+SLOW_ACTIONS = {"EVENTO", "RESUMEN"}
+
+def process_actions(response_text, user_id, now=None):
+    """Procesa todas las acciones en la respuesta"""
+    if now is None:
+        now = datetime.now(TIMEZONE)
+
+    result, found = extract_action_tags(response_text)
+
+    values_by_tag = defaultdict(list)
+    for tag, value in found:
+        values_by_tag[tag].append(value)
+
+    if "COMPRA_AGREGAR" not in values_by_tag:
+        bullet_items = find_shopping_bullets(result)
+        if bullet_items:
+            values_by_tag["COMPRA_AGREGAR"] = bullet_items
+
+    # Caso más común: ninguna acción que ejecutar
+    if not values_by_tag:
+        return result.strip()
+
+    appends = []
+    actions = [(tag, handler) for tag, handler in ACTION_HANDLERS.items() if tag in values_by_tag]
+    # Las acciones seguidas que solo tocan archivos JSON comparten un lote (una
+    # lectura y una escritura por archivo), que se cierra antes de cada acción lenta
+    for slow, group in groupby(actions, key=lambda action: action[0] in SLOW_ACTIONS):
+        if slow:
+            for tag, handler in group:
+                handler(values_by_tag[tag], user_id, appends, now)
         else:
-            result = re.sub(r"\[COMPRA_MARCAR\]\d+\[/COMPRA_MARCAR\]", "", result)
-            result += f"\n\n❌ No encontré el item {item_id}"
+            with batched_json_files():
+                for tag, handler in group:
+                    handler(values_by_tag[tag], user_id, appends, now)
 
-    # Procesar eliminar de compras
-    shopping_del_match = re.search(r"\[COMPRA_ELIMINAR\](\d+)\[/COMPRA_ELIMINAR\]", result)
-    if shopping_del_match:
-        item_id = int(shopping_del_match.group(1))
-        if delete_shopping_item(user_id, item_id):
-            result = re.sub(r"\[COMPRA_ELIMINAR\]\d+\[/COMPRA_ELIMINAR\]", "", result)
-            result += f"\n\n✅ Item {item_id} eliminado de la lista"
-
-    # Procesar limpiar comprados
-    if "[COMPRAS_LIMPIAR][/COMPRAS_LIMPIAR]" in result:
-        clear_bought_items(user_id)
-        result = result.replace("[COMPRAS_LIMPIAR][/COMPRAS_LIMPIAR]", "")
-        result += "\n\n✅ Items comprados eliminados de la lista"
-
-    # Procesar vaciar toda la lista
-    if "[COMPRAS_VACIAR][/COMPRAS_VACIAR]" in result:
-        clear_all_shopping(user_id)
-        result = result.replace("[COMPRAS_VACIAR][/COMPRAS_VACIAR]", "")
-        result += "\n\n✅ Lista de compras vaciada completamente"
-
-    # Procesar análisis de gastos
-    if "[GASTOS_ANALISIS][/GASTOS_ANALISIS]" in result:
-        result = result.replace("[GASTOS_ANALISIS][/GASTOS_ANALISIS]", "")
-        result += f"\n\n{analyze_expenses(user_id)}"
-
-    # Procesar cambio de ubicación
-    location_match = re.search(r"\[UBICACION\](.*?)\[/UBICACION\]", result)
-    if location_match:
-        city = location_match.group(1).strip()
-        set_user_location(user_id, city)
-        result = re.sub(r"\[UBICACION\].*?\[/UBICACION\]", "", result)
-        result += f"\n\n✅ Ubicación guardada: {city}. El clima ahora será de esta ciudad."
+    if appends:
+        # Las consultas externas (clima, dólar...) corrieron en paralelo: se esperan
+        # acá, con todos los lotes ya escritos
+        appends = [a.result() if isinstance(a, Future) else a for a in appends]
+        result = result + "\n\n" + "\n\n".join(appends)
 
     return result.strip()
 
@@ -3400,20 +3930,23 @@ def split_message(message, max_length=1500):
         return [message]
 
     parts = []
-    current = ""
+    buf = []
+    buflen = 0
 
     for line in message.split("\n"):
-        if len(current) + len(line) + 1 <= max_length:
-            current += line + "\n"
-        else:
-            if current:
-                parts.append(current.strip())
-            current = line + "\n"
+        line_len = len(line) + 1
+        if buflen + line_len > max_length and buf:
+            parts.append("\n".join(buf).strip())
+            buf = []
+            buflen = 0
+        buf.append(line)
+        buflen += line_len
 
-    if current:
-        parts.append(current.strip())
+    if buf:
+        parts.append("\n".join(buf).strip())
 
-    return parts
+    # No enviar partes vacías (bloques de solo saltos de línea)
+    return [part for part in parts if part]
 
 def send_whatsapp_message(to_number, message, respect_dnd=False, is_emergency=False):
     """Envía un mensaje de WhatsApp (divide si es muy largo)
@@ -3427,7 +3960,7 @@ def send_whatsapp_message(to_number, message, respect_dnd=False, is_emergency=Fa
     # Verificar modo no molestar (solo si respect_dnd y no es emergencia)
     if respect_dnd and not is_emergency:
         if is_dnd_active(to_number):
-            print(f"[DND] Mensaje no enviado a {to_number} - Modo no molestar activo")
+            logger.info(f"[DND] Mensaje no enviado a {to_number} - Modo no molestar activo")
             return False
 
     try:
@@ -3438,9 +3971,33 @@ def send_whatsapp_message(to_number, message, respect_dnd=False, is_emergency=Fa
             )
         return True
     except Exception as e:
-        print(f"Error enviando WhatsApp: {e}")
+        logger.error(f"Error enviando WhatsApp: {e}")
         return False
 
+# Envíos en segundo plano: el webhook responde a Twilio sin esperar cada envío
+send_pool = ThreadPoolExecutor(max_workers=SEND_WORKERS, thread_name_prefix="twilio-send")
+atexit.register(send_pool.shutdown, wait=True)
+
+# Las alertas de ayuda tienen su propio pool para no quedar en cola detrás de
+# un envío masivo (resumen diario, recordatorios) en send_pool
+alert_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="caregiver-alert")
+atexit.register(alert_pool.shutdown, wait=True)
+
+def send_whatsapp_message_async(to_number, message, **kwargs):
+    """Encola un mensaje de WhatsApp para enviarlo en segundo plano"""
+    return send_pool.submit(send_whatsapp_message, to_number, message, **kwargs)
+
+def send_whatsapp_messages(messages, **kwargs):
+    """Envía varios mensajes (número, texto) en paralelo y espera a que terminen
+    El pool limita la concurrencia a SEND_WORKERS, dentro del rate limit de Twilio.
+    Un mismo texto al mismo número se manda una sola vez
+    """
+    futures = [
+        send_whatsapp_message_async(to_number, message, **kwargs)
+        for to_number, message in dict.fromkeys(messages)
+    ]
+    return [f.result() for f in futures]
+
 
 def check_and_send_reminders():
     """Revisa eventos próximos y envía recordatorios
@@ -3448,7 +4005,7 @@ def check_and_send_reminders():
     Los recordatorios personalizados (con [RECORDATORIO]) SÍ funcionan correctamente
     porque están asociados al usuario que los crea.
     """
-    print(f"[{datetime.now()}] Verificando recordatorios de calendario...")
+    logger.info(f"[{datetime.now()}] Verificando recordatorios de calendario...")
     # DESACTIVADO: Los eventos del calendario CalDAV no tienen user_id
     # Por lo que los recordatorios se enviaban a TODOS los usuarios
     # Los recordatorios personalizados funcionan via check_and_send_custom_reminders()
@@ -3545,145 +4102,153 @@ def generate_weekly_report(user_id):
     """Genera reporte semanal de un usuario para el cuidador"""
     now = datetime.now(TIMEZONE)
     week_ago = now - timedelta(days=7)
+    week_dates = last_dates(now)
 
     user_display = user_id.replace('whatsapp:', '')
 
-    report = f"📊 *Reporte Semanal*\n"
-    report += f"👤 {user_display}\n"
-    report += f"📅 {week_ago.strftime('%d/%m')} al {now.strftime('%d/%m/%Y')}\n\n"
+    parts = [
+        "📊 *Reporte Semanal*\n",
+        f"👤 {user_display}\n",
+        f"📅 {week_ago.strftime('%d/%m')} al {now.strftime('%d/%m/%Y')}\n\n",
+    ]
 
     # Medicamentos
-    meds = load_medications()
+    meds = load_medications(readonly=True)
     if user_id in meds:
-        med_log = meds[user_id].get("log", [])
-        week_log = [e for e in med_log if e.get("date", "") >= week_ago.strftime("%Y-%m-%d")]
+        log_by_date = get_med_log_by_date(meds[user_id])
 
         total_expected = 14  # 2 por día x 7 días
-        total_taken = len(week_log)
+        total_taken = sum(len(log_by_date.get(d, [])) for d in week_dates)
         percent = (total_taken / total_expected * 100) if total_expected > 0 else 0
 
-        report += f"💊 *Medicamentos:*\n"
-        report += f"   Tomados: {total_taken}/{total_expected} ({percent:.0f}%)\n\n"
+        parts.append(f"💊 *Medicamentos:*\n")
+        parts.append(f"   Tomados: {total_taken}/{total_expected} ({percent:.0f}%)\n\n")
 
     # Actividad
-    activity = load_user_activity()
+    activity = load_user_activity(readonly=True)
     if user_id in activity:
         daily = activity[user_id].get("daily_messages", {})
-        week_messages = sum(v for k, v in daily.items() if k >= week_ago.strftime("%Y-%m-%d"))
+        week_messages = sum(daily.get(d, 0) for d in week_dates)
         avg_daily = week_messages / 7 if week_messages > 0 else 0
 
-        report += f"📱 *Actividad:*\n"
-        report += f"   Mensajes: {week_messages} (promedio {avg_daily:.1f}/día)\n\n"
+        parts.append(f"📱 *Actividad:*\n")
+        parts.append(f"   Mensajes: {week_messages} (promedio {avg_daily:.1f}/día)\n\n")
 
     # Bienestar
-    checks = load_wellness_checks()
+    checks = load_wellness_checks(readonly=True)
     if user_id in checks:
         check = checks[user_id]
         if check.get("response"):
-            report += f"😊 *Último bienestar:* {check.get('response', 'N/A')}\n\n"
+            parts.append(f"😊 *Último bienestar:* {check.get('response', 'N/A')}\n\n")
 
     # Alertas
-    report += "⚠️ *Alertas de la semana:*\n"
+    parts.append("⚠️ *Alertas de la semana:*\n")
     # Aquí podrías agregar un log de alertas si lo implementas
 
-    report += "\n_Reporte generado automáticamente_"
+    parts.append("\n_Reporte generado automáticamente_")
 
-    return report
+    return "".join(parts)
 
 def send_weekly_reports():
     """Envía reportes semanales a los cuidadores"""
-    print(f"[{datetime.now()}] Enviando reportes semanales...")
+    logger.info(f"[{datetime.now()}] Enviando reportes semanales...")
 
-    caregivers = load_caregivers()
+    caregivers = load_caregivers(readonly=True)
 
-    for user_id in caregivers.keys():
-        caregiver = get_caregiver(user_id)
-        if not caregiver:
-            continue
+    with ThreadPoolExecutor(max_workers=SEND_WORKERS) as executor:
+        list(executor.map(send_weekly_report_for, list(caregivers.keys())))
 
-        try:
-            report = generate_weekly_report(user_id)
-            send_whatsapp_message(caregiver, report)
-            print(f"Reporte semanal enviado al cuidador de {user_id}")
-        except Exception as e:
-            print(f"Error enviando reporte semanal: {e}")
+def send_weekly_report_for(user_id):
+    """Envía el reporte semanal de un usuario a su cuidador"""
+    caregiver = get_caregiver(user_id)
+    if not caregiver:
+        return
+
+    try:
+        report = generate_weekly_report(user_id)
+        send_whatsapp_message(caregiver, report)
+        logger.info(f"Reporte semanal enviado al cuidador de {user_id}")
+    except Exception as e:
+        logger.error(f"Error enviando reporte semanal: {e}")
 
 # ==================== RESUMEN DIARIO PARA CUIDADOR ====================
 
-def generate_daily_summary(user_id):
+def generate_caregiver_daily_summary(user_id):
     """Genera resumen diario de actividad de un usuario para el cuidador"""
     now = datetime.now(TIMEZONE)
     today = now.strftime("%Y-%m-%d")
     user_display = user_id.replace('whatsapp:', '')
 
-    summary = f"📋 *Resumen del día*\n"
-    summary += f"👤 {user_display}\n"
-    summary += f"📅 {now.strftime('%d/%m/%Y')}\n\n"
+    parts = [
+        "📋 *Resumen del día*\n",
+        f"👤 {user_display}\n",
+        f"📅 {now.strftime('%d/%m/%Y')}\n\n",
+    ]
 
     # Actividad de mensajes
-    activity = load_user_activity()
+    activity = load_user_activity(readonly=True)
     if user_id in activity:
         messages_today = activity[user_id].get("daily_messages", {}).get(today, 0)
         last_seen = activity[user_id].get("last_seen")
         if last_seen:
             last_seen_dt = datetime.fromisoformat(last_seen)
-            summary += f"📱 *Actividad:* {messages_today} mensajes\n"
-            summary += f"⏰ *Última conexión:* {last_seen_dt.strftime('%H:%M')}\n\n"
+            parts.append(f"📱 *Actividad:* {messages_today} mensajes\n")
+            parts.append(f"⏰ *Última conexión:* {last_seen_dt.strftime('%H:%M')}\n\n")
 
     # Medicamentos del día
-    meds = load_medications()
+    meds = load_medications(readonly=True)
     if user_id in meds:
-        med_log = meds[user_id].get("log", [])
-        today_log = [e for e in med_log if e.get("date", "") == today]
+        today_log = get_med_log_by_date(meds[user_id]).get(today, [])
         med_list = meds[user_id].get("medications", [])
 
         if med_list:
-            summary += f"💊 *Medicamentos:*\n"
+            parts.append(f"💊 *Medicamentos:*\n")
             if today_log:
                 for entry in today_log:
-                    summary += f"   ✅ {entry.get('time', 'N/A')} - Confirmado\n"
+                    parts.append(f"   ✅ {entry.get('time', 'N/A')} - Confirmado\n")
             else:
-                summary += f"   ⚠️ Sin confirmaciones hoy\n"
-            summary += "\n"
+                parts.append(f"   ⚠️ Sin confirmaciones hoy\n")
+            parts.append("\n")
 
     # Chequeo de bienestar
-    checks = load_wellness_checks()
+    checks = load_wellness_checks(readonly=True)
     if user_id in checks:
         check = checks[user_id]
         if check.get("date") == today:
             if check.get("responded"):
-                summary += f"😊 *Bienestar:* {check.get('response', 'Respondido')}\n"
+                parts.append(f"😊 *Bienestar:* {check.get('response', 'Respondido')}\n")
             else:
-                summary += f"⚠️ *Bienestar:* No respondió al chequeo\n"
+                parts.append(f"⚠️ *Bienestar:* No respondió al chequeo\n")
 
     # Tareas completadas
-    tasks = load_tasks()
-    if user_id in tasks:
-        completed_today = [t for t in tasks[user_id] if t.get("completed") and t.get("completed_date", "").startswith(today)]
-        pending = [t for t in tasks[user_id] if not t.get("completed")]
-        if completed_today or pending:
-            summary += f"\n📝 *Tareas:* {len(completed_today)} completadas, {len(pending)} pendientes\n"
+    completed_today, pending = count_tasks(user_id, today)
+    if completed_today or pending:
+        parts.append(f"\n📝 *Tareas:* {completed_today} completadas, {pending} pendientes\n")
 
-    summary += "\n_Resumen automático de las 21:00_"
-    return summary
+    parts.append("\n_Resumen automático de las 21:00_")
+    return "".join(parts)
 
 def send_daily_summaries():
     """Envía resumen diario a los cuidadores a las 21:00"""
-    print(f"[{datetime.now()}] Enviando resúmenes diarios a cuidadores...")
+    logger.info(f"[{datetime.now()}] Enviando resúmenes diarios a cuidadores...")
 
-    caregivers = load_caregivers()
+    caregivers = load_caregivers(readonly=True)
 
+    summaries = []
     for user_id in caregivers.keys():
         caregiver = get_caregiver(user_id)
         if not caregiver:
             continue
 
         try:
-            summary = generate_daily_summary(user_id)
-            send_whatsapp_message(caregiver, summary)
-            print(f"Resumen diario enviado al cuidador de {user_id}")
+            summaries.append((user_id, caregiver, generate_caregiver_daily_summary(user_id)))
         except Exception as e:
-            print(f"Error enviando resumen diario: {e}")
+            logger.error(f"Error armando resumen diario de {user_id}: {e}")
+
+    # Enviar todos en paralelo
+    send_whatsapp_messages([(caregiver, summary) for _, caregiver, summary in summaries])
+    for user_id, _, _ in summaries:
+        logger.info(f"Resumen diario enviado al cuidador de {user_id}")
 
 # ==================== FOTOS FAMILIARES ====================
 
@@ -3691,18 +4256,14 @@ PHOTOS_FILE = os.path.join(DATA_DIR, "family_photos.json")
 
 def load_family_photos():
     """Carga las fotos familiares guardadas"""
-    if os.path.exists(PHOTOS_FILE):
-        try:
-            with open(PHOTOS_FILE, "r") as f:
-                return json.load(f)
-        except:
-            return {}
-    return {}
+    try:
+        return read_json_file(PHOTOS_FILE, {})
+    except:
+        return {}
 
 def save_family_photos(photos):
     """Guarda las fotos familiares"""
-    with open(PHOTOS_FILE, "w") as f:
-        json.dump(photos, f, ensure_ascii=False)
+    write_json_file(PHOTOS_FILE, photos)
 
 def add_family_photo(user_id, name, url, relation=None):
     """Agrega una foto familiar"""
@@ -3737,18 +4298,14 @@ DND_FILE = os.path.join(DATA_DIR, "do_not_disturb.json")
 
 def load_dnd_settings():
     """Carga configuración de no molestar"""
-    if os.path.exists(DND_FILE):
-        try:
-            with open(DND_FILE, "r") as f:
-                return json.load(f)
-        except:
-            return {}
-    return {}
+    try:
+        return read_json_file(DND_FILE, {})
+    except:
+        return {}
 
 def save_dnd_settings(settings):
     """Guarda configuración de no molestar"""
-    with open(DND_FILE, "w") as f:
-        json.dump(settings, f, ensure_ascii=False)
+    write_json_file(DND_FILE, settings)
 
 def set_dnd(user_id, start_hour, end_hour):
     """Configura horario de no molestar"""
@@ -3797,18 +4354,14 @@ TUTORIAL_FILE = os.path.join(DATA_DIR, "tutorial_progress.json")
 
 def load_tutorial_progress():
     """Carga progreso del tutorial"""
-    if os.path.exists(TUTORIAL_FILE):
-        try:
-            with open(TUTORIAL_FILE, "r") as f:
-                return json.load(f)
-        except:
-            return {}
-    return {}
+    try:
+        return read_json_file(TUTORIAL_FILE, {})
+    except:
+        return {}
 
 def save_tutorial_progress(progress):
     """Guarda progreso del tutorial"""
-    with open(TUTORIAL_FILE, "w") as f:
-        json.dump(progress, f, ensure_ascii=False)
+    write_json_file(TUTORIAL_FILE, progress)
 
 def get_tutorial_step(user_id):
     """Obtiene el paso actual del tutorial"""
@@ -3905,14 +4458,13 @@ def get_tutorial_message(step):
             return t["message"]
     return None
 
-def check_tutorial_trigger(user_id, message):
-    """Verifica si el mensaje activa el siguiente paso del tutorial"""
+def check_tutorial_trigger(user_id, msg_lower):
+    """Verifica si el mensaje (ya en minúsculas) activa el siguiente paso del tutorial"""
     current_step = get_tutorial_step(user_id)
     if current_step >= len(TUTORIAL_STEPS):
         return None
 
     step_info = TUTORIAL_STEPS[current_step]
-    msg_lower = message.lower()
 
     for trigger in step_info.get("trigger", []):
         if trigger in msg_lower:
@@ -3932,809 +4484,906 @@ def start_tutorial(user_id):
     set_tutorial_step(user_id, 1)
     return get_tutorial_message(1)
 
-def get_ai_response(user_message, user_id):
-    """Obtiene respuesta de Claude"""
-    # Registrar actividad del usuario
-    record_user_activity(user_id)
-
-    # Verificar si es usuario nuevo
-    is_first_message = is_new_user(user_id)
-
-    # Cargar conversación desde archivo (persistente)
-    conversation = get_conversation(user_id)
-
-    # Agregar mensaje del usuario
-    add_to_conversation(user_id, "user", user_message)
-    conversation.append({"role": "user", "content": user_message})
-
-    msg_lower = user_message.lower().strip()
-
-    # Normalizar expresiones coloquiales argentinas
-    msg_normalized = msg_lower
-    msg_normalized = re.sub(r'^che\s+', '', msg_normalized)  # Remover "che" al inicio
-    msg_normalized = re.sub(r'\s+porfa$', '', msg_normalized)  # Remover "porfa" al final
-    msg_normalized = re.sub(r'\s+por favor$', '', msg_normalized)
-    msg_normalized = re.sub(r'^dale\s+', '', msg_normalized)  # Remover "dale" al inicio
-    msg_normalized = re.sub(r'^fijate\s+', '', msg_normalized)  # "fijate" = verificar
+# Saludos y pedidos de menú: palabras sueltas (se comparan por set) y frases
+WORD_RE = re.compile(r"\w+")
+GREETING_WORDS = frozenset(["hola", "buenas", "hey", "hello", "hi", "che"])
+GREETING_PHRASES = ("buen dia", "buen día", "buenos dias", "buenos días", "que tal", "qué tal")
+MENU_WORDS = frozenset(["menu", "menú", "help", "funciones", "comandos"])
+MENU_PHRASES = ("que podes hacer", "qué podés hacer", "como funciona", "cómo funciona")
+
+# Comandos directos por texto exacto (sets) y palabras clave que se buscan dentro del mensaje (tuplas)
+CONTACTS_LIST_CMDS = frozenset(["mis contactos", "contactos", "ver contactos", "directorio"])
+APPOINTMENTS_LIST_CMDS = frozenset(["mis turnos", "turnos", "ver turnos", "próximos turnos", "proximos turnos"])
+CAREGIVER_NAME_RESERVED = frozenset(["saltar", "no", "menu", "menú", "ayuda", "clima", "noticias", "dolar", "dólar"])
+CAREGIVER_NAME_SKIP = frozenset(["saltar", "no"])
+HELP_CMDS = frozenset(["ayuda", "socorro", "emergencia"])
+CAREGIVER_SHOW_CMDS = frozenset(["mi cuidador", "quien es mi cuidador", "quién es mi cuidador", "ver cuidador"])
+TUTORIAL_START_CMDS = frozenset(["tutorial", "empezar tutorial", "iniciar tutorial", "ayuda para empezar"])
+TUTORIAL_RESTART_CMDS = frozenset(["reiniciar tutorial", "repetir tutorial"])
+TUTORIAL_SKIP_CMDS = frozenset(["saltar tutorial", "terminar tutorial", "omitir tutorial"])
+DND_ON_CMDS = frozenset(["activar modo nocturno", "activar no molestar", "modo nocturno"])
+DND_OFF_CMDS = frozenset(["desactivar no molestar", "desactivar modo nocturno", "quitar silencio"])
+DND_STATUS_CMDS = frozenset(["estado no molestar", "ver modo nocturno", "horario silencio"])
+SYMPTOMS_LIST_CMDS = frozenset(["mis síntomas", "mis sintomas", "historial síntomas", "historial de síntomas", "síntomas"])
+VITALS_LIST_CMDS = frozenset(["mis signos", "signos vitales", "mis signos vitales", "historial signos", "ver presión", "ver glucosa"])
+WATER_STATUS_CMDS = frozenset(["cuánta agua", "cuanta agua", "vasos de agua", "mi agua", "hidratación", "hidratacion"])
+RECURRING_LIST_CMDS = frozenset(["mis recordatorios recurrentes", "recordatorios recurrentes", "recordatorios repetidos"])
+BIRTHDAYS_LIST_CMDS = frozenset(["cumpleaños", "cumples", "mis cumpleaños", "próximos cumpleaños", "proximos cumpleaños"])
+ARRIVAL_CMDS = frozenset(["llegué", "llegue", "ya llegué", "ya llegue", "llegué bien", "llegue bien"])
+CAREGIVER_USERS_CMDS = frozenset(["mis usuarios", "mis pacientes", "a quien cuido", "a quién cuido"])
+CAREGIVER_REMINDERS_CMDS = frozenset(["mis recordatorios programados", "recordatorios programados", "recordatorios pendientes"])
+WEATHER_CMDS = frozenset(["clima", "el clima", "como esta el clima", "cómo está el clima", "que clima hace", "qué clima hace", "tiempo"])
+DOLAR_CMDS = frozenset(["dolar", "dólar", "cotizacion", "cotización", "precio del dolar", "precio del dólar"])
+NEWS_CMDS = frozenset(["noticias", "las noticias", "noticias de hoy", "que paso hoy", "qué pasó hoy"])
+SHOPPING_SYNONYMS = ("super", "súper", "supermercado", "mandado", "mandados", "qué me falta", "que me falta", "qué falta", "que falta comprar")
+EXPENSE_SYNONYMS = ("cuánto gasté", "cuanto gaste", "cómo voy con la plata", "como voy con la plata", "cuánto llevo gastado", "cuanto llevo gastado")
+WELLNESS_RESPONSES = ("bien", "mal", "mas o menos", "más o menos", "regular", "excelente", "muy bien", "no muy bien", "cansado", "cansada")
+WORRY_WORDS = ("pecho", "corazón", "corazon", "respirar", "desmayo", "caí", "caer")
+CONFIRMATION_WORDS = frozenset(["si", "sí", "tome", "tomé", "si tome", "sí tomé", "ya tome", "ya tomé", "listo", "ok", "ya"])
+WEEKDAY_NUMBERS = {"lunes": 0, "martes": 1, "miércoles": 2, "miercoles": 2, "jueves": 3, "viernes": 4, "sábado": 5, "sabado": 5, "domingo": 6}
+WEEKDAY_NAMES = ("lunes", "martes", "miércoles", "jueves", "viernes", "sábado", "domingo")
+SYMPTOM_WORDS = ("duele", "dolor", "mareo", "náusea", "nausea", "fiebre", "cansancio", "fatiga", "malestar")
+WATER_WORDS = ("agua", "vaso", "vasos", "hidrat")
+TRIP_WORDS = ("salir", "salgo", "voy a", "me voy")
+
+# Comandos directos que se reconocen sin pasar por Claude (compilados una sola vez)
+PHONE_SEPARATORS_RE = re.compile(r'[\s\-]')
+DATE_SEPARATORS_RE = re.compile(r'[/-]')
+SECONDARY_CAREGIVER_RE = re.compile(r'agregar cuidador\s*\+?(\d[\d\s\-]+)')
+CONTACT_ADD_RE = re.compile(r'(?:guardar contacto|nuevo contacto|agregar contacto|contacto\s+(\w+))[:;]\s*(.+?)\s+(\+?\d[\d\s\-]{6,})', re.IGNORECASE)
+CONTACT_SEARCH_RE = re.compile(r'(?:número|telefono|teléfono|contacto)\s+(?:del?|de la?)?\s*(.+)')
+CONTACT_DELETE_RE = re.compile(r'(?:eliminar|borrar|quitar)\s+contacto\s+(.+)')
+APPOINTMENT_ADD_RE = re.compile(r'turno\s+(?:con\s+)?(.+?)\s+(?:el\s+)?(\d{1,2}[/-]\d{1,2}(?:[/-]\d{2,4})?)\s+(?:a las?\s+)?(\d{1,2}[:\.]?\d{0,2})\s*(?:hs?)?', re.IGNORECASE)
+APPOINTMENT_CANCEL_RE = re.compile(r'(?:cancelar|eliminar|borrar)\s+turno\s+(\d+)')
+CAREGIVER_SET_RE = re.compile(r'(?:mi cuidador es|cuidador:|configurar cuidador)\s*\+?(\d[\d\s\-]+)')
+DND_RE = re.compile(r'(?:no molestar|modo nocturno|silencio)\s*(?:de\s*)?(\d{1,2})(?:[:\s]?(?:hs|hrs|horas|h))?\s*(?:a|hasta)\s*(\d{1,2})')
+CALL_RE = re.compile(r'(?:llamar a|videollamada con|video con|llamar)\s+(.+)')
+SYMPTOM_RE = re.compile(r'(?:me duele|tengo dolor de?|siento|tengo)\s+(?:el |la |los |las )?(.+?)(?:\s+(?:intensidad|nivel)\s*(\d+))?$')
+PRESSURE_RE = re.compile(r'(?:presión|presion|mi presión|tengo)\s*(?:es|de)?\s*(\d{2,3})[/\s](\d{2,3})')
+GLUCOSE_RE = re.compile(r'(?:glucosa|glucemia|azúcar|azucar)\s*(?:es|de|en)?\s*(\d{2,3})')
+TEMPERATURE_RE = re.compile(r'(?:temperatura|fiebre|tengo)\s*(?:de)?\s*(\d{2}(?:[.,]\d)?)\s*(?:grados|°|de fiebre)?')
+OXYGEN_RE = re.compile(r'(?:oxígeno|oxigeno|saturación|saturacion|spo2)\s*(?:es|de|en)?\s*(\d{2,3})\s*%?')
+WATER_RE = re.compile(r'(?:tomé|tome|bebí|bebi)\s*(?:un\s*)?(?:vaso|vasos|agua)?\s*(?:de\s*)?(?:agua)?\s*(\d+)?')
+DAILY_REMINDER_RE = re.compile(r'(?:recordame|avisame)\s+todos\s+los\s+días?\s+(?:a\s+las?\s+)?(\d{1,2})(?::(\d{2}))?\s+(?:que\s+)?(.+)')
+WEEKLY_REMINDER_RE = re.compile(r'(?:recordame|avisame)\s+todos\s+los\s+(lunes|martes|miércoles|miercoles|jueves|viernes|sábado|sabado|domingo)\s+(?:a\s+las?\s+)?(\d{1,2})(?::(\d{2}))?\s+(?:que\s+)?(.+)')
+RECURRING_DELETE_RE = re.compile(r'(?:eliminar|borrar|quitar)\s+recordatorio\s+recurrente\s+(\d+)')
+BIRTHDAY_RE = re.compile(r'(?:cumpleaños|cumple)\s+(?:de\s+)?([^:]+?)[\s:]+(?:es\s+(?:el\s+)?)?(\d{1,2})[/\-](\d{1,2})(?:[/\-](\d{2,4}))?')
+TRIP_RE = re.compile(r'(?:voy a salir|salgo|voy al?|me voy)\s*(?:a\s+)?(.+)?')
+CAREGIVER_REMINDER_RE = re.compile(r'(?:recordar a|recordarle a|avisar a|avisarle a)\s*\+?(\d[\d\s\-]+)[:\s]+(.+?)\s+en\s+(\d+)\s*(hora|horas|minuto|minutos|min|hs|h)')
+# Unidad del recordatorio del cuidador -> argumento de timedelta
+REMINDER_UNITS = {
+    "hora": "hours", "horas": "hours", "hs": "hours", "h": "hours",
+    "minuto": "minutes", "minutos": "minutes", "min": "minutes",
+}
+CAREGIVER_MESSAGE_RE = re.compile(r'(?:mensaje a|decirle a|enviar a|mandar a)\s*\+?(\d[\d\s\-]+)[:\s]+(.+)', re.IGNORECASE)
+CONFIRMATION_PREFIX_RE = re.compile(r'^s[ií] ')
+
+# ==================== COMANDOS DIRECTOS ====================
+# Mensajes que se responden sin pasar por Claude. Cada handler recibe
+# (user_id, user_message, msg_lower, match, now) y devuelve la respuesta,
+# o None si al final el mensaje no era para él.
+
+def parse_phone_number(raw):
+    """Normaliza un número escrito por el usuario a +XXXXXXXX"""
+    number = PHONE_SEPARATORS_RE.sub('', raw)
+    return number if number.startswith('+') else '+' + number
+
+def whatsapp_id(number):
+    """Arma el id de WhatsApp (whatsapp:+XXXXXXXX) de un número ya normalizado"""
+    return f"whatsapp:{number}"
+
+def handle_secondary_caregiver(user_id, user_message, msg_lower, match, now):
+    """Agrega un cuidador secundario"""
+    number = parse_phone_number(match.group(1))
+    set_caregiver(user_id, number, is_primary=False)
+    return f"✅ Cuidador secundario agregado: {number}"
+
+def handle_contact_add(user_id, user_message, msg_lower, match, now):
+    """Guarda un contacto"""
+    category = match.group(1) or "general"
+    name = match.group(2).strip()
+    phone = PHONE_SEPARATORS_RE.sub('', match.group(3))
+    status = add_contact(user_id, name, phone, category)
+    return f"📇 Contacto {status}: *{name}*\n📱 {phone}\n📁 Categoría: {category.title()}"
+
+def handle_contacts_list(user_id, user_message, msg_lower, match, now):
+    """Muestra los contactos"""
+    return format_contacts_list(user_id)
+
+def handle_contact_search(user_id, user_message, msg_lower, match, now):
+    """Busca un contacto por nombre o categoría"""
+    search_term = match.group(1).strip()
+    contact = find_contact(user_id, search_term)
+    if contact:
+        return f"📇 *{contact['name']}*\n📱 {contact['phone']}"
+    return f"❌ No encontré ningún contacto con '{search_term}'.\n\nEscribí *mis contactos* para ver todos."
 
-    # Sinónimos para lista de compras
-    shopping_synonyms = ["super", "súper", "supermercado", "mandado", "mandados", "qué me falta", "que me falta", "qué falta", "que falta comprar"]
-    if any(syn in msg_lower for syn in shopping_synonyms) and "lista" not in msg_lower:
-        response = format_shopping_list(user_id)
-        add_to_conversation(user_id, "assistant", response)
-        return response
+def handle_contact_delete(user_id, user_message, msg_lower, match, now):
+    """Elimina un contacto"""
+    name = match.group(1).strip()
+    if delete_contact(user_id, name):
+        return f"✅ Contacto '{name}' eliminado."
+    return f"❌ No encontré el contacto '{name}'."
+
+def handle_appointment_add(user_id, user_message, msg_lower, match, now):
+    """Agenda un turno médico"""
+    doctor = match.group(1).strip().title()
+    date_raw = match.group(2)
+    time_raw = match.group(3)
+
+    # Normalizar fecha
+    date_parts = DATE_SEPARATORS_RE.split(date_raw)
+    if len(date_parts) == 2:
+        year = now.year
+        date_str = f"{date_parts[0].zfill(2)}/{date_parts[1].zfill(2)}/{year}"
+    else:
+        year = date_parts[2] if len(date_parts[2]) == 4 else f"20{date_parts[2]}"
+        date_str = f"{date_parts[0].zfill(2)}/{date_parts[1].zfill(2)}/{year}"
 
-    # Sinónimos para ver gastos
-    expense_synonyms = ["cuánto gasté", "cuanto gaste", "cómo voy con la plata", "como voy con la plata", "cuánto llevo gastado", "cuanto llevo gastado"]
-    if any(syn in msg_lower for syn in expense_synonyms):
-        expenses_summary = get_expenses_summary(user_id)
-        add_to_conversation(user_id, "assistant", expenses_summary)
-        return expenses_summary
+    # Normalizar hora
+    if ":" in time_raw or "." in time_raw:
+        time_str = time_raw.replace(".", ":")
+    else:
+        time_str = f"{time_raw}:00"
 
-    # Si es usuario nuevo y saluda, mostrar bienvenida
-    greeting_words = ["hola", "buenas", "buen dia", "buen día", "buenos dias", "buenos días", "hey", "hello", "hi", "que tal", "qué tal", "che"]
-    if is_first_message and any(word in msg_lower for word in greeting_words):
-        welcome = get_welcome_message_short()
-        add_to_conversation(user_id, "assistant", welcome)
-        return welcome
+    add_appointment(user_id, doctor, date_str, time_str)
+    return f"🏥 Turno agendado:\n\n👨‍⚕️ {doctor}\n📅 {date_str}\n⏰ {time_str}\n\n_Te recordaré el día anterior y el mismo día._"
 
-    # Si dice "menú", mostrar menú completo
-    menu_words = ["menu", "menú", "help", "que podes hacer", "qué podés hacer", "como funciona", "cómo funciona", "funciones", "comandos"]
-    if any(word in msg_lower for word in menu_words):
-        full_menu = get_welcome_message()
-        add_to_conversation(user_id, "assistant", full_menu)
-        return full_menu
+def handle_appointments_list(user_id, user_message, msg_lower, match, now):
+    """Muestra los próximos turnos"""
+    return format_appointments_list(user_id)
 
-    # Respuesta a chequeo de bienestar
-    wellness_responses = ["bien", "mal", "mas o menos", "más o menos", "regular", "excelente", "muy bien", "no muy bien", "cansado", "cansada"]
-    if any(word in msg_lower for word in wellness_responses):
-        pending_wellness = get_wellness_pending(user_id)
-        if pending_wellness and not pending_wellness.get("responded"):
-            mark_wellness_responded(user_id, user_message)
-            if "mal" in msg_lower or "no muy bien" in msg_lower:
-                response = "😔 Lamento escuchar eso. ¿Necesitás que avise a tu cuidador? Escribí *ayuda* si querés.\n\n¿Hay algo que pueda hacer por vos?"
-            else:
-                response = "😊 ¡Me alegro! Que tengas un lindo día. Estoy acá si me necesitás."
-            add_to_conversation(user_id, "assistant", response)
-            return response
-
-    # Agregar cuidador secundario
-    secondary_caregiver_match = re.search(r'agregar cuidador\s*\+?(\d[\d\s\-]+)', msg_lower)
-    if secondary_caregiver_match:
-        number = re.sub(r'[\s\-]', '', secondary_caregiver_match.group(1))
-        if not number.startswith('+'):
-            number = '+' + number
-        set_caregiver(user_id, number, is_primary=False)
-        response = f"✅ Cuidador secundario agregado: {number}"
-        add_to_conversation(user_id, "assistant", response)
-        return response
-
-    # ==================== COMANDOS DE CONTACTOS ====================
-
-    # Guardar contacto: "guardar contacto: Dr. López 351123456" o "contacto médico: Dr. García 351999888"
-    contact_match = re.search(r'(?:guardar contacto|nuevo contacto|agregar contacto|contacto\s+(\w+))[:;]\s*(.+?)\s+(\+?\d[\d\s\-]{6,})', user_message, re.IGNORECASE)
-    if contact_match:
-        category = contact_match.group(1) or "general"
-        name = contact_match.group(2).strip()
-        phone = re.sub(r'[\s\-]', '', contact_match.group(3))
-        status = add_contact(user_id, name, phone, category)
-        response = f"📇 Contacto {status}: *{name}*\n📱 {phone}\n📁 Categoría: {category.title()}"
-        add_to_conversation(user_id, "assistant", response)
-        return response
-
-    # Ver contactos
-    if msg_lower in ["mis contactos", "contactos", "ver contactos", "directorio"]:
-        response = format_contacts_list(user_id)
-        add_to_conversation(user_id, "assistant", response)
-        return response
-
-    # Buscar contacto: "número del médico" o "teléfono de mamá"
-    contact_search = re.search(r'(?:número|telefono|teléfono|contacto)\s+(?:del?|de la?)?\s*(.+)', msg_lower)
-    if contact_search:
-        search_term = contact_search.group(1).strip()
-        contact = find_contact(user_id, search_term)
-        if contact:
-            response = f"📇 *{contact['name']}*\n📱 {contact['phone']}"
-        else:
-            response = f"❌ No encontré ningún contacto con '{search_term}'.\n\nEscribí *mis contactos* para ver todos."
-        add_to_conversation(user_id, "assistant", response)
-        return response
-
-    # Eliminar contacto
-    delete_contact_match = re.search(r'(?:eliminar|borrar|quitar)\s+contacto\s+(.+)', msg_lower)
-    if delete_contact_match:
-        name = delete_contact_match.group(1).strip()
-        if delete_contact(user_id, name):
-            response = f"✅ Contacto '{name}' eliminado."
-        else:
-            response = f"❌ No encontré el contacto '{name}'."
-        add_to_conversation(user_id, "assistant", response)
-        return response
-
-    # ==================== COMANDOS DE TURNOS MÉDICOS ====================
-
-    # Agregar turno: "turno con Dr. García el 15/2 a las 10hs" o "turno cardiólogo 20/2 15:30"
-    turno_match = re.search(r'turno\s+(?:con\s+)?(.+?)\s+(?:el\s+)?(\d{1,2}[/-]\d{1,2}(?:[/-]\d{2,4})?)\s+(?:a las?\s+)?(\d{1,2}[:\.]?\d{0,2})\s*(?:hs?)?', user_message, re.IGNORECASE)
-    if turno_match:
-        doctor = turno_match.group(1).strip().title()
-        date_raw = turno_match.group(2)
-        time_raw = turno_match.group(3)
-
-        # Normalizar fecha
-        date_parts = re.split(r'[/-]', date_raw)
-        if len(date_parts) == 2:
-            year = datetime.now(TIMEZONE).year
-            date_str = f"{date_parts[0].zfill(2)}/{date_parts[1].zfill(2)}/{year}"
-        else:
-            year = date_parts[2] if len(date_parts[2]) == 4 else f"20{date_parts[2]}"
-            date_str = f"{date_parts[0].zfill(2)}/{date_parts[1].zfill(2)}/{year}"
-
-        # Normalizar hora
-        if ":" in time_raw or "." in time_raw:
-            time_str = time_raw.replace(".", ":")
-        else:
-            time_str = f"{time_raw}:00"
-
-        add_appointment(user_id, doctor, date_str, time_str)
-        response = f"🏥 Turno agendado:\n\n👨‍⚕️ {doctor}\n📅 {date_str}\n⏰ {time_str}\n\n_Te recordaré el día anterior y el mismo día._"
-        add_to_conversation(user_id, "assistant", response)
-        return response
-
-    # Ver turnos
-    if msg_lower in ["mis turnos", "turnos", "ver turnos", "próximos turnos", "proximos turnos"]:
-        response = format_appointments_list(user_id)
-        add_to_conversation(user_id, "assistant", response)
-        return response
-
-    # Cancelar turno
-    cancel_turno_match = re.search(r'(?:cancelar|eliminar|borrar)\s+turno\s+(\d+)', msg_lower)
-    if cancel_turno_match:
-        index = int(cancel_turno_match.group(1)) - 1
-        appointments = get_upcoming_appointments(user_id)
-        if 0 <= index < len(appointments):
-            apt = appointments[index]
-            # Encontrar el índice real en la lista completa
-            all_appointments = get_appointments(user_id)
-            real_index = all_appointments.index(apt)
-            delete_appointment(user_id, real_index)
-            response = f"✅ Turno cancelado: {apt['doctor']} - {apt['date']}"
-        else:
-            response = "❌ Número de turno inválido. Escribí *mis turnos* para ver la lista."
-        add_to_conversation(user_id, "assistant", response)
-        return response
+def handle_appointment_cancel(user_id, user_message, msg_lower, match, now):
+    """Cancela un turno por su número en la lista"""
+    index = int(match.group(1)) - 1
+    appointments = get_upcoming_appointments(user_id)
+    if 0 <= index < len(appointments):
+        apt = appointments[index]
+        # Encontrar el índice real en la lista completa
+        all_appointments = get_appointments(user_id)
+        real_index = all_appointments.index(apt)
+        delete_appointment(user_id, real_index)
+        return f"✅ Turno cancelado: {apt['doctor']} - {apt['date']}"
+    return "❌ Número de turno inválido. Escribí *mis turnos* para ver la lista."
+
+def handle_pending_caregiver_name(user_id, user_message, msg_lower, match, now):
+    """Si falta el nombre del cuidador, toma el mensaje como su nombre"""
+    if not is_pending_caregiver_name(user_id):
+        return None
+    if msg_lower not in CAREGIVER_NAME_RESERVED:
+        name = user_message.strip().title()
+        set_caregiver_name(user_id, name)
+        return f"✅ Perfecto, guardé a *{name}* como tu cuidador.\n\nCuando escribas 'ayuda', se le enviará una alerta."
+    if msg_lower in CAREGIVER_NAME_SKIP:
+        set_caregiver_name(user_id, "Cuidador")  # Nombre por defecto
+        return "✅ Cuidador configurado.\n\nCuando escribas 'ayuda', se le enviará una alerta."
+    return None
 
-    # Comandos directos que no necesitan pasar por Claude
+def handle_caregiver_set(user_id, user_message, msg_lower, match, now):
+    """Configura el cuidador principal"""
+    number = parse_phone_number(match.group(1))
+    set_caregiver(user_id, number)
+    return f"✅ Número guardado: {number}\n\n¿Cómo se llama tu cuidador? (escribí el nombre o *saltar* si no querés)"
+
+def handle_caregiver_show(user_id, user_message, msg_lower, match, now):
+    """Muestra el cuidador configurado"""
+    caregiver = get_caregiver(user_id)
+    if caregiver:
+        caregiver_name = get_caregiver_name(user_id) or "Sin nombre"
+        return f"👤 Tu cuidador: *{caregiver_name}*\n📱 {caregiver.replace('whatsapp:', '')}"
+    return "⚠️ No tenés un cuidador configurado.\n\nPara configurarlo, escribí:\n*mi cuidador es +54XXXXXXXXXX*"
+
+def handle_help(user_id, user_message, msg_lower, match, now):
+    """Envía una alerta de ayuda a todos los cuidadores"""
+    caregiver = get_caregiver(user_id)
+
+    if not caregiver:
+        return "⚠️ No tenés un cuidador configurado.\n\nPara configurarlo, escribí:\n*mi cuidador es +54XXXXXXXXXX*\n\nUna vez configurado, cuando escribas 'ayuda' se le enviará una alerta."
+
+    # Enviar alerta a todos los cuidadores
+    user_number_display = user_id.replace('whatsapp:', '')
+
+    alert_message = f"🚨 *ALERTA DE AYUDA*\n\n📱 {user_number_display} ha pedido ayuda.\n\n📅 Fecha: {now.strftime('%d/%m/%Y')}\n⏰ Hora: {now.strftime('%H:%M')}\n\n_Contactalo lo antes posible_"
+
+    # alert_all_caregivers registra los errores de cada envío
+    alert_pool.submit(alert_all_caregivers, user_id, alert_message)
+    logger.info(f"Alerta encolada para los cuidadores de {user_id}")
+
+    # Responder al usuario
+    caregiver_name = get_caregiver_name(user_id) or "tu cuidador"
+    return f"🆘 Tu mensaje de ayuda ha sido enviado a *{caregiver_name}*. Pronto se pondrá en contacto contigo.\n\n¿Hay algo más en lo que pueda asistirte mientras tanto?"
+
+def handle_tutorial_start(user_id, user_message, msg_lower, match, now):
+    """Inicia el tutorial (si no se completó antes)"""
+    if is_tutorial_complete(user_id):
+        return "Ya completaste el tutorial. 🎓\n\n¿Querés repetirlo? Escribí *reiniciar tutorial*\n\nO escribí *menú* para ver todas las funciones."
+    return start_tutorial(user_id)
+
+def handle_tutorial_restart(user_id, user_message, msg_lower, match, now):
+    """Reinicia el tutorial"""
+    return start_tutorial(user_id)
+
+def handle_tutorial_skip(user_id, user_message, msg_lower, match, now):
+    """Saltea el tutorial"""
+    mark_tutorial_complete(user_id)
+    return "✅ Tutorial omitido. Escribí *menú* cuando quieras ver todas las funciones."
+
+def handle_tutorial_progress(user_id, user_message, msg_lower, match, now):
+    """Avanza el tutorial si el mensaje cumple el paso actual"""
+    if not is_tutorial_complete(user_id) and get_tutorial_step(user_id) > 0:
+        return check_tutorial_trigger(user_id, msg_lower)
+    return None
 
-    # Verificar si está pendiente el nombre del cuidador
-    if is_pending_caregiver_name(user_id):
-        # El usuario está dando el nombre del cuidador
-        if msg_lower not in ["saltar", "no", "menu", "menú", "ayuda", "clima", "noticias", "dolar", "dólar"]:
-            name = user_message.strip().title()
-            set_caregiver_name(user_id, name)
-            response_msg = f"✅ Perfecto, guardé a *{name}* como tu cuidador.\n\nCuando escribas 'ayuda', se le enviará una alerta."
-            add_to_conversation(user_id, "assistant", response_msg)
-            return response_msg
-        elif msg_lower in ["saltar", "no"]:
-            set_caregiver_name(user_id, "Cuidador")  # Nombre por defecto
-            response_msg = "✅ Cuidador configurado.\n\nCuando escribas 'ayuda', se le enviará una alerta."
-            add_to_conversation(user_id, "assistant", response_msg)
-            return response_msg
-
-    # Configurar cuidador: "mi cuidador es +54..." o "cuidador: +54..."
-    caregiver_match = re.search(r'(?:mi cuidador es|cuidador:|configurar cuidador)\s*\+?(\d[\d\s\-]+)', user_message.lower())
-    if caregiver_match:
-        number = re.sub(r'[\s\-]', '', caregiver_match.group(1))
-        if not number.startswith('+'):
-            number = '+' + number
-        set_caregiver(user_id, number)
-        response_msg = f"✅ Número guardado: {number}\n\n¿Cómo se llama tu cuidador? (escribí el nombre o *saltar* si no querés)"
-        add_to_conversation(user_id, "assistant", response_msg)
+def handle_dnd_range(user_id, user_message, msg_lower, match, now):
+    """Activa el modo no molestar en un horario"""
+    start_h = int(match.group(1))
+    end_h = int(match.group(2))
+    set_dnd(user_id, start_h, end_h)
+    return f"🌙 *Modo no molestar activado*\n\n⏰ De {start_h}:00 a {end_h}:00\n\nNo recibirás recordatorios ni alertas durante esas horas.\n\nPara desactivar: *desactivar no molestar*"
+
+def handle_dnd_on(user_id, user_message, msg_lower, match, now):
+    """Activa el modo nocturno por defecto (22 a 8)"""
+    set_dnd(user_id, 22, 8)
+    return "🌙 *Modo nocturno activado*\n\n⏰ De 22:00 a 08:00\n\nNo recibirás recordatorios ni alertas durante la noche.\n\nPara desactivar: *desactivar no molestar*"
+
+def handle_dnd_off(user_id, user_message, msg_lower, match, now):
+    """Desactiva el modo no molestar"""
+    disable_dnd(user_id)
+    return "☀️ *Modo no molestar desactivado*\n\nVolverás a recibir todos los recordatorios y alertas."
+
+def handle_dnd_status(user_id, user_message, msg_lower, match, now):
+    """Muestra el estado del modo no molestar"""
+    dnd_status = get_dnd_status(user_id)
+    if dnd_status and dnd_status.get("enabled"):
+        start_h = dnd_status.get("start_hour", 22)
+        end_h = dnd_status.get("end_hour", 8)
+        currently_active = "✅ Activo ahora" if is_dnd_active(user_id) else "⏸️ Inactivo ahora"
+        return f"🌙 *Modo no molestar*\n\n⏰ Horario: {start_h}:00 a {end_h}:00\n{currently_active}"
+    return "☀️ El modo no molestar está desactivado.\n\nPara activarlo: *activar modo nocturno* o *no molestar de 22 a 8*"
+
+def handle_call(user_id, user_message, msg_lower, match, now):
+    """Arma el link de WhatsApp para llamar a un contacto o al cuidador"""
+    contact_name = match.group(1).strip()
+
+    # Buscar en contactos
+    contact = find_contact(user_id, contact_name)
+    if contact:
+        phone = contact["phone"].replace("+", "").replace(" ", "").replace("-", "")
+        whatsapp_link = f"https://wa.me/{phone}?text=Hola!"
+        response_msg = f"📞 *Llamar a {contact['name']}*\n\n"
+        response_msg += f"📱 WhatsApp: {whatsapp_link}\n\n"
+        response_msg += f"_Hacé clic en el link para abrir WhatsApp y llamar_"
         return response_msg
 
-    # Ver cuidador configurado
-    if msg_lower in ["mi cuidador", "quien es mi cuidador", "quién es mi cuidador", "ver cuidador"]:
+    # Buscar si es el cuidador
+    if "cuidador" in contact_name:
         caregiver = get_caregiver(user_id)
         if caregiver:
-            caregiver_name = get_caregiver_name(user_id) or "Sin nombre"
-            response_msg = f"👤 Tu cuidador: *{caregiver_name}*\n📱 {caregiver.replace('whatsapp:', '')}"
-        else:
-            response_msg = "⚠️ No tenés un cuidador configurado.\n\nPara configurarlo, escribí:\n*mi cuidador es +54XXXXXXXXXX*"
-        add_to_conversation(user_id, "assistant", response_msg)
-        return response_msg
-
-    # Si dice "ayuda", enviar alerta al cuidador
-    if msg_lower == "ayuda" or msg_lower == "socorro" or msg_lower == "emergencia":
-        caregiver = get_caregiver(user_id)
-
-        if not caregiver:
-            response_msg = "⚠️ No tenés un cuidador configurado.\n\nPara configurarlo, escribí:\n*mi cuidador es +54XXXXXXXXXX*\n\nUna vez configurado, cuando escribas 'ayuda' se le enviará una alerta."
-            add_to_conversation(user_id, "assistant", response_msg)
-            return response_msg
-
-        # Enviar alerta a todos los cuidadores
-        try:
-            now = datetime.now(TIMEZONE)
-            user_number_display = user_id.replace('whatsapp:', '')
-
-            alert_message = f"🚨 *ALERTA DE AYUDA*\n\n📱 {user_number_display} ha pedido ayuda.\n\n📅 Fecha: {now.strftime('%d/%m/%Y')}\n⏰ Hora: {now.strftime('%H:%M')}\n\n_Contactalo lo antes posible_"
-
-            # Enviar a todos los cuidadores
-            alert_all_caregivers(user_id, alert_message)
-            print(f"Alerta enviada a cuidadores de {user_id}")
-        except Exception as e:
-            print(f"Error enviando alerta al cuidador: {e}")
-            response_msg = "❌ Hubo un error enviando la alerta. Por favor intentá de nuevo o contactá directamente a tu cuidador."
-            add_to_conversation(user_id, "assistant", response_msg)
-            return response_msg
-
-        # Responder al usuario
-        caregiver_name = get_caregiver_name(user_id) or "tu cuidador"
-        response_msg = f"🆘 Tu mensaje de ayuda ha sido enviado a *{caregiver_name}*. Pronto se pondrá en contacto contigo.\n\n¿Hay algo más en lo que pueda asistirte mientras tanto?"
-        add_to_conversation(user_id, "assistant", response_msg)
-        return response_msg
-
-    # ========== TUTORIAL INTERACTIVO ==========
-
-    # Iniciar tutorial
-    if msg_lower in ["tutorial", "empezar tutorial", "iniciar tutorial", "ayuda para empezar"]:
-        if is_tutorial_complete(user_id):
-            response_msg = "Ya completaste el tutorial. 🎓\n\n¿Querés repetirlo? Escribí *reiniciar tutorial*\n\nO escribí *menú* para ver todas las funciones."
-        else:
-            response_msg = start_tutorial(user_id)
-        add_to_conversation(user_id, "assistant", response_msg)
-        return response_msg
-
-    # Reiniciar tutorial
-    if msg_lower in ["reiniciar tutorial", "repetir tutorial"]:
-        response_msg = start_tutorial(user_id)
-        add_to_conversation(user_id, "assistant", response_msg)
-        return response_msg
-
-    # Saltar/terminar tutorial
-    if msg_lower in ["saltar tutorial", "terminar tutorial", "omitir tutorial"]:
-        mark_tutorial_complete(user_id)
-        response_msg = "✅ Tutorial omitido. Escribí *menú* cuando quieras ver todas las funciones."
-        add_to_conversation(user_id, "assistant", response_msg)
-        return response_msg
-
-    # Verificar progreso del tutorial
-    if not is_tutorial_complete(user_id) and get_tutorial_step(user_id) > 0:
-        tutorial_response = check_tutorial_trigger(user_id, user_message)
-        if tutorial_response:
-            add_to_conversation(user_id, "assistant", tutorial_response)
-            return tutorial_response
-
-    # ========== MODO NO MOLESTAR ==========
-
-    # Activar modo no molestar
-    dnd_match = re.search(r'(?:no molestar|modo nocturno|silencio)\s*(?:de\s*)?(\d{1,2})(?:[:\s]?(?:hs|hrs|horas|h))?\s*(?:a|hasta)\s*(\d{1,2})', msg_lower)
-    if dnd_match:
-        start_h = int(dnd_match.group(1))
-        end_h = int(dnd_match.group(2))
-        set_dnd(user_id, start_h, end_h)
-        response_msg = f"🌙 *Modo no molestar activado*\n\n⏰ De {start_h}:00 a {end_h}:00\n\nNo recibirás recordatorios ni alertas durante esas horas.\n\nPara desactivar: *desactivar no molestar*"
-        add_to_conversation(user_id, "assistant", response_msg)
-        return response_msg
+            phone = caregiver.replace("whatsapp:", "").replace("+", "")
+            caregiver_name = get_caregiver_name(user_id) or "tu cuidador"
+            whatsapp_link = f"https://wa.me/{phone}"
+            return f"📞 *Llamar a {caregiver_name}*\n\n📱 {whatsapp_link}\n\n_Hacé clic para abrir WhatsApp_"
+        return "⚠️ No tenés un cuidador configurado."
+    return f"❌ No encontré a '{contact_name}' en tus contactos.\n\nPodés agregar contactos con:\n*guardar contacto: Nombre 123456789*"
+
+def handle_symptom(user_id, user_message, msg_lower, match, now):
+    """Registra un síntoma y avisa al cuidador si es preocupante"""
+    if not any(word in msg_lower for word in SYMPTOM_WORDS):
+        return None
+    symptom = match.group(1).strip()
+    intensity = int(match.group(2)) if match.group(2) else None
 
-    # Activar modo nocturno por defecto (22 a 8)
-    if msg_lower in ["activar modo nocturno", "activar no molestar", "modo nocturno"]:
-        set_dnd(user_id, 22, 8)
-        response_msg = "🌙 *Modo nocturno activado*\n\n⏰ De 22:00 a 08:00\n\nNo recibirás recordatorios ni alertas durante la noche.\n\nPara desactivar: *desactivar no molestar*"
-        add_to_conversation(user_id, "assistant", response_msg)
-        return response_msg
+    add_symptom(user_id, symptom, intensity)
+    response_msg = f"📋 Registré: *{symptom}*"
+    if intensity:
+        response_msg += f" (intensidad {intensity}/10)"
+    response_msg += f"\n\n_Escribí 'mis síntomas' para ver el historial_"
 
-    # Desactivar modo no molestar
-    if msg_lower in ["desactivar no molestar", "desactivar modo nocturno", "quitar silencio"]:
-        disable_dnd(user_id)
-        response_msg = "☀️ *Modo no molestar desactivado*\n\nVolverás a recibir todos los recordatorios y alertas."
-        add_to_conversation(user_id, "assistant", response_msg)
-        return response_msg
+    # Alertar al cuidador si es algo preocupante
+    if any(w in symptom for w in WORRY_WORDS):
+        caregiver = get_caregiver(user_id)
+        if caregiver:
+            alert = f"⚠️ *Alerta de síntoma*\n\n{user_id.replace('whatsapp:', '')} reportó: {symptom}"
+            send_whatsapp_message_async(caregiver, alert)
+            response_msg += "\n\n⚠️ _Se notificó a tu cuidador por precaución_"
 
-    # Ver estado de no molestar
-    if msg_lower in ["estado no molestar", "ver modo nocturno", "horario silencio"]:
-        dnd_status = get_dnd_status(user_id)
-        if dnd_status and dnd_status.get("enabled"):
-            start_h = dnd_status.get("start_hour", 22)
-            end_h = dnd_status.get("end_hour", 8)
-            currently_active = "✅ Activo ahora" if is_dnd_active(user_id) else "⏸️ Inactivo ahora"
-            response_msg = f"🌙 *Modo no molestar*\n\n⏰ Horario: {start_h}:00 a {end_h}:00\n{currently_active}"
-        else:
-            response_msg = "☀️ El modo no molestar está desactivado.\n\nPara activarlo: *activar modo nocturno* o *no molestar de 22 a 8*"
-        add_to_conversation(user_id, "assistant", response_msg)
-        return response_msg
+    return response_msg
 
-    # ========== VIDEOLLAMADA RÁPIDA ==========
-
-    # Llamar a contacto
-    call_match = re.search(r'(?:llamar a|videollamada con|video con|llamar)\s+(.+)', msg_lower)
-    if call_match:
-        contact_name = call_match.group(1).strip()
-
-        # Buscar en contactos
-        contact = find_contact(user_id, contact_name)
-        if contact:
-            phone = contact["phone"].replace("+", "").replace(" ", "").replace("-", "")
-            whatsapp_link = f"https://wa.me/{phone}?text=Hola!"
-            video_link = f"https://wa.me/{phone}"
-            response_msg = f"📞 *Llamar a {contact['name']}*\n\n"
-            response_msg += f"📱 WhatsApp: {whatsapp_link}\n\n"
-            response_msg += f"_Hacé clic en el link para abrir WhatsApp y llamar_"
-        else:
-            # Buscar si es el cuidador
-            if "cuidador" in contact_name:
-                caregiver = get_caregiver(user_id)
-                if caregiver:
-                    phone = caregiver.replace("whatsapp:", "").replace("+", "")
-                    caregiver_name = get_caregiver_name(user_id) or "tu cuidador"
-                    whatsapp_link = f"https://wa.me/{phone}"
-                    response_msg = f"📞 *Llamar a {caregiver_name}*\n\n📱 {whatsapp_link}\n\n_Hacé clic para abrir WhatsApp_"
-                else:
-                    response_msg = "⚠️ No tenés un cuidador configurado."
-            else:
-                response_msg = f"❌ No encontré a '{contact_name}' en tus contactos.\n\nPodés agregar contactos con:\n*guardar contacto: Nombre 123456789*"
-        add_to_conversation(user_id, "assistant", response_msg)
-        return response_msg
+def handle_symptoms_list(user_id, user_message, msg_lower, match, now):
+    """Muestra el historial de síntomas"""
+    return format_symptoms_report(user_id)
 
-    # ========== REGISTRO DE SÍNTOMAS ==========
+def handle_pressure(user_id, user_message, msg_lower, match, now):
+    """Registra la presión arterial"""
+    sistolica = int(match.group(1))
+    diastolica = int(match.group(2))
 
-    # Registrar síntoma: "me duele la cabeza", "tengo dolor de espalda"
-    symptom_match = re.search(r'(?:me duele|tengo dolor de?|siento|tengo)\s+(?:el |la |los |las )?(.+?)(?:\s+(?:intensidad|nivel)\s*(\d+))?$', msg_lower)
-    if symptom_match and any(word in msg_lower for word in ["duele", "dolor", "mareo", "náusea", "nausea", "fiebre", "cansancio", "fatiga", "malestar"]):
-        symptom = symptom_match.group(1).strip()
-        intensity = int(symptom_match.group(2)) if symptom_match.group(2) else None
+    # Normalizar si dieron valores bajos (ej: 12/8 en vez de 120/80)
+    if sistolica < 30:
+        sistolica *= 10
+        diastolica *= 10
 
-        add_symptom(user_id, symptom, intensity)
-        response_msg = f"📋 Registré: *{symptom}*"
-        if intensity:
-            response_msg += f" (intensidad {intensity}/10)"
-        response_msg += f"\n\n_Escribí 'mis síntomas' para ver el historial_"
+    add_vital(user_id, "presion", sistolica, diastolica)
+    alerts = check_vital_alert("presion", sistolica, diastolica)
 
-        # Alertar al cuidador si es algo preocupante
-        worry_words = ["pecho", "corazón", "corazon", "respirar", "desmayo", "caí", "caer"]
-        if any(w in symptom for w in worry_words):
-            caregiver = get_caregiver(user_id)
-            if caregiver:
-                alert = f"⚠️ *Alerta de síntoma*\n\n{user_id.replace('whatsapp:', '')} reportó: {symptom}"
-                send_whatsapp_message(caregiver, alert)
-                response_msg += "\n\n⚠️ _Se notificó a tu cuidador por precaución_"
+    response_msg = f"🩺 Presión registrada: *{sistolica}/{diastolica} mmHg*"
+    if alerts:
+        response_msg += f"\n\n{' '.join(alerts)}\n_Consultá con tu médico_"
+        # Alertar al cuidador
+        caregiver = get_caregiver(user_id)
+        if caregiver:
+            alert = f"⚠️ *Alerta de presión*\n\n{user_id.replace('whatsapp:', '')}: {sistolica}/{diastolica} mmHg\n{' '.join(alerts)}"
+            send_whatsapp_message_async(caregiver, alert)
+    return response_msg
+
+def handle_glucose(user_id, user_message, msg_lower, match, now):
+    """Registra la glucosa"""
+    value = int(match.group(1))
+    add_vital(user_id, "glucosa", value)
+    alerts = check_vital_alert("glucosa", value)
+
+    response_msg = f"🩸 Glucosa registrada: *{value} mg/dL*"
+    if alerts:
+        response_msg += f"\n\n{' '.join(alerts)}\n_Consultá con tu médico_"
+        caregiver = get_caregiver(user_id)
+        if caregiver:
+            alert = f"⚠️ *Alerta de glucosa*\n\n{user_id.replace('whatsapp:', '')}: {value} mg/dL\n{' '.join(alerts)}"
+            send_whatsapp_message_async(caregiver, alert)
+    return response_msg
+
+def handle_temperature(user_id, user_message, msg_lower, match, now):
+    """Registra la temperatura"""
+    value = float(match.group(1).replace(",", "."))
+    add_vital(user_id, "temperatura", value)
+    alerts = check_vital_alert("temperatura", value)
+
+    response_msg = f"🌡️ Temperatura registrada: *{value}°C*"
+    if alerts:
+        response_msg += f"\n\n{' '.join(alerts)}"
+        caregiver = get_caregiver(user_id)
+        if caregiver:
+            alert = f"⚠️ *Alerta de temperatura*\n\n{user_id.replace('whatsapp:', '')}: {value}°C\n{' '.join(alerts)}"
+            send_whatsapp_message_async(caregiver, alert)
+    return response_msg
+
+def handle_oxygen(user_id, user_message, msg_lower, match, now):
+    """Registra la saturación de oxígeno"""
+    value = int(match.group(1))
+    add_vital(user_id, "oxigeno", value)
+    alerts = check_vital_alert("oxigeno", value)
+
+    response_msg = f"💨 Oxígeno registrado: *{value}%*"
+    if alerts:
+        response_msg += f"\n\n{' '.join(alerts)}\n_¡Consultá urgente!_"
+        caregiver = get_caregiver(user_id)
+        if caregiver:
+            alert = f"🚨 *ALERTA OXÍGENO BAJO*\n\n{user_id.replace('whatsapp:', '')}: {value}%\n\n¡Requiere atención urgente!"
+            send_whatsapp_message_async(caregiver, alert, is_emergency=True)
+    return response_msg
 
-        add_to_conversation(user_id, "assistant", response_msg)
-        return response_msg
+def handle_vitals_list(user_id, user_message, msg_lower, match, now):
+    """Muestra el historial de signos vitales"""
+    return format_vitals_report(user_id)
 
-    # Ver historial de síntomas
-    if msg_lower in ["mis síntomas", "mis sintomas", "historial síntomas", "historial de síntomas", "síntomas"]:
-        response_msg = format_symptoms_report(user_id)
-        add_to_conversation(user_id, "assistant", response_msg)
+def handle_water(user_id, user_message, msg_lower, match, now):
+    """Registra vasos de agua"""
+    if not any(word in msg_lower for word in WATER_WORDS):
+        return None
+    glasses = int(match.group(1)) if match.group(1) else 1
+    add_water(user_id, glasses)
+    return get_water_status(user_id)
+
+def handle_water_status(user_id, user_message, msg_lower, match, now):
+    """Muestra el estado de hidratación"""
+    return get_water_status(user_id)
+
+def handle_daily_reminder(user_id, user_message, msg_lower, match, now):
+    """Crea un recordatorio diario"""
+    hour = int(match.group(1))
+    minute = match.group(2) or "00"
+    message = match.group(3).strip()
+    time_str = f"{hour:02d}:{minute}"
+
+    add_recurring_reminder(user_id, message, "daily", time_str=time_str)
+    return f"🔁 *Recordatorio diario creado*\n\n📝 {message}\n⏰ Todos los días a las {time_str}"
+
+def handle_weekly_reminder(user_id, user_message, msg_lower, match, now):
+    """Crea un recordatorio semanal"""
+    day_name = match.group(1)
+    day_num = WEEKDAY_NUMBERS.get(day_name, 0)
+    hour = int(match.group(2))
+    minute = match.group(3) or "00"
+    message = match.group(4).strip()
+    time_str = f"{hour:02d}:{minute}"
+
+    add_recurring_reminder(user_id, message, "weekly", day_of_week=day_num, time_str=time_str)
+    return f"🔁 *Recordatorio semanal creado*\n\n📝 {message}\n📅 Todos los {day_name} a las {time_str}"
+
+def handle_recurring_list(user_id, user_message, msg_lower, match, now):
+    """Muestra los recordatorios recurrentes"""
+    return format_recurring_reminders_list(user_id)
+
+def handle_recurring_delete(user_id, user_message, msg_lower, match, now):
+    """Elimina un recordatorio recurrente"""
+    reminder_id = int(match.group(1))
+    if delete_recurring_reminder(user_id, reminder_id):
+        return f"✅ Recordatorio recurrente #{reminder_id} eliminado."
+    return "❌ No encontré ese recordatorio."
+
+def handle_birthday_add(user_id, user_message, msg_lower, match, now):
+    """Guarda un cumpleaños"""
+    name = match.group(1).strip().title()
+    day = match.group(2)
+    month = match.group(3)
+    year = match.group(4)
+
+    date_str = f"{day}/{month}"
+    if year:
+        date_str += f"/{year}"
+
+    add_birthday(user_id, name, date_str)
+    response_msg = f"🎂 Cumpleaños guardado:\n\n👤 *{name}*\n📅 {day}/{month}"
+    if year:
+        response_msg += f"/{year}"
+    response_msg += "\n\n_Te avisaré el día anterior y el mismo día_"
+    return response_msg
+
+def handle_birthdays_list(user_id, user_message, msg_lower, match, now):
+    """Muestra los próximos cumpleaños"""
+    return format_birthdays_list(user_id)
+
+def handle_trip_start(user_id, user_message, msg_lower, match, now):
+    """Registra una salida para confirmar la llegada después"""
+    if not any(word in msg_lower for word in TRIP_WORDS):
+        return None
+    destination = match.group(1).strip() if match.group(1) else "salida"
+    start_trip(user_id, destination)
+    return f"🚶 ¡Buen paseo!\n\nDestino: *{destination}*\n\n_Cuando llegues, escribí *llegué* para que sepa que estás bien._"
+
+def handle_arrival(user_id, user_message, msg_lower, match, now):
+    """Confirma la llegada y avisa al cuidador"""
+    if confirm_arrival(user_id):
+        # Notificar al cuidador
+        caregiver = get_caregiver(user_id)
+        if caregiver:
+            send_whatsapp_message_async(caregiver, f"✅ {user_id.replace('whatsapp:', '')} llegó bien a destino.")
+        return "🏠 ¡Qué bueno que llegaste bien! 😊"
+    return "🏠 ¡Qué bueno!"
+
+def handle_caregiver_users(user_id, user_message, msg_lower, match, now):
+    """Muestra a un cuidador los usuarios que lo tienen asignado"""
+    users = get_users_for_caregiver(user_id)
+    if users:
+        response_msg = "👥 *Usuarios que te tienen como cuidador:*\n\n"
+        for i, u in enumerate(users, 1):
+            user_display = u.replace('whatsapp:', '')
+            response_msg += f"{i}. {user_display}\n"
+        response_msg += "\n📨 Para enviarles un recordatorio, escribí:\n*recordar a [número]: [mensaje] en [tiempo]*\n\nEjemplo: recordar a +5493511234567: tomá la pastilla en 2 horas"
         return response_msg
+    return "👥 No tenés usuarios asignados.\n\nUn usuario te asigna como cuidador escribiendo:\n*mi cuidador es +tu_número*"
 
-    # ========== SIGNOS VITALES ==========
+def handle_caregiver_commands(user_id, user_message, msg_lower, match, now):
+    """Recordatorios y mensajes de un cuidador a sus usuarios (solo si cuida a alguien)"""
+    users = frozenset(get_users_for_caregiver(user_id))
+    if not users:
+        # No es cuidador de nadie: ni siquiera se buscan los patrones
+        return None
+    match = CAREGIVER_REMINDER_RE.search(msg_lower)
+    if match:
+        return schedule_caregiver_reminder(user_id, match, now, users)
+    match = CAREGIVER_MESSAGE_RE.search(user_message)
+    if match:
+        return send_caregiver_message(user_id, match, users)
+    return None
 
-    # Registrar presión: "presión 12/8" o "mi presión es 120/80"
-    pressure_match = re.search(r'(?:presión|presion|mi presión|tengo)\s*(?:es|de)?\s*(\d{2,3})[/\s](\d{2,3})', msg_lower)
-    if pressure_match:
-        sistolica = int(pressure_match.group(1))
-        diastolica = int(pressure_match.group(2))
+def schedule_caregiver_reminder(user_id, match, now, users):
+    """Programa un recordatorio del cuidador para uno de sus usuarios"""
+    target_number = parse_phone_number(match.group(1))
+    target_user_id = whatsapp_id(target_number)
 
-        # Normalizar si dieron valores bajos (ej: 12/8 en vez de 120/80)
-        if sistolica < 30:
-            sistolica *= 10
-            diastolica *= 10
+    message_text = match.group(2).strip()
+    # Capitalizar primera letra del mensaje
+    message_text = message_text[0].upper() + message_text[1:] if message_text else message_text
 
-        entry = add_vital(user_id, "presion", sistolica, diastolica)
-        alerts = check_vital_alert("presion", sistolica, diastolica)
+    time_amount = int(match.group(3))
+    time_unit = match.group(4)
 
-        response_msg = f"🩺 Presión registrada: *{sistolica}/{diastolica} mmHg*"
-        if alerts:
-            response_msg += f"\n\n{' '.join(alerts)}\n_Consultá con tu médico_"
-            # Alertar al cuidador
-            caregiver = get_caregiver(user_id)
-            if caregiver:
-                alert = f"⚠️ *Alerta de presión*\n\n{user_id.replace('whatsapp:', '')}: {sistolica}/{diastolica} mmHg\n{' '.join(alerts)}"
-                send_whatsapp_message(caregiver, alert)
+    # Verificar que el usuario tenga a este cuidador asignado
+    if target_user_id not in users:
+        return f"⚠️ El número {target_number} no te tiene asignado como cuidador.\n\nSolo podés enviar recordatorios a usuarios que te hayan configurado como su cuidador."
 
-        add_to_conversation(user_id, "assistant", response_msg)
-        return response_msg
-
-    # Registrar glucosa: "glucosa 110" o "azúcar 95"
-    glucose_match = re.search(r'(?:glucosa|glucemia|azúcar|azucar)\s*(?:es|de|en)?\s*(\d{2,3})', msg_lower)
-    if glucose_match:
-        value = int(glucose_match.group(1))
-        entry = add_vital(user_id, "glucosa", value)
-        alerts = check_vital_alert("glucosa", value)
-
-        response_msg = f"🩸 Glucosa registrada: *{value} mg/dL*"
-        if alerts:
-            response_msg += f"\n\n{' '.join(alerts)}\n_Consultá con tu médico_"
-            caregiver = get_caregiver(user_id)
-            if caregiver:
-                alert = f"⚠️ *Alerta de glucosa*\n\n{user_id.replace('whatsapp:', '')}: {value} mg/dL\n{' '.join(alerts)}"
-                send_whatsapp_message(caregiver, alert)
+    # Calcular tiempo
+    remind_at = now + timedelta(**{REMINDER_UNITS[time_unit]: time_amount})
 
-        add_to_conversation(user_id, "assistant", response_msg)
-        return response_msg
+    add_caregiver_reminder(user_id, target_user_id, message_text, remind_at.isoformat())
+    return f"✅ Recordatorio programado\n\n👤 Para: {target_number}\n📝 Mensaje: {message_text}\n⏰ Se enviará a las {remind_at.strftime('%H:%M')}"
 
-    # Registrar temperatura: "temperatura 37.5" o "tengo 38 de fiebre"
-    temp_match = re.search(r'(?:temperatura|fiebre|tengo)\s*(?:de)?\s*(\d{2}(?:[.,]\d)?)\s*(?:grados|°|de fiebre)?', msg_lower)
-    if temp_match:
-        value = float(temp_match.group(1).replace(",", "."))
-        entry = add_vital(user_id, "temperatura", value)
-        alerts = check_vital_alert("temperatura", value)
+def send_caregiver_message(user_id, match, users):
+    """Envía ya mismo un mensaje del cuidador a uno de sus usuarios"""
+    target_number = parse_phone_number(match.group(1))
+    target_user_id = whatsapp_id(target_number)
 
-        response_msg = f"🌡️ Temperatura registrada: *{value}°C*"
-        if alerts:
-            response_msg += f"\n\n{' '.join(alerts)}"
-            caregiver = get_caregiver(user_id)
-            if caregiver:
-                alert = f"⚠️ *Alerta de temperatura*\n\n{user_id.replace('whatsapp:', '')}: {value}°C\n{' '.join(alerts)}"
-                send_whatsapp_message(caregiver, alert)
+    # El patrón se busca en el mensaje original, así se conservan las mayúsculas
+    original_msg = match.group(2).strip()
 
-        add_to_conversation(user_id, "assistant", response_msg)
-        return response_msg
+    # Verificar que el usuario tenga a este cuidador asignado
+    if target_user_id not in users:
+        return f"⚠️ El número {target_number} no te tiene asignado como cuidador.\n\nSolo podés enviar mensajes a usuarios que te hayan configurado como su cuidador."
 
-    # Registrar oxígeno: "oxígeno 96" o "saturación 95"
-    oxygen_match = re.search(r'(?:oxígeno|oxigeno|saturación|saturacion|spo2)\s*(?:es|de|en)?\s*(\d{2,3})\s*%?', msg_lower)
-    if oxygen_match:
-        value = int(oxygen_match.group(1))
-        entry = add_vital(user_id, "oxigeno", value)
-        alerts = check_vital_alert("oxigeno", value)
+    try:
+        message = f"📨 *Mensaje de tu cuidador:*\n\n{original_msg}"
+        send_whatsapp_message_async(target_user_id, message)
+        return f"✅ Mensaje enviado a {target_number}"
+    except Exception as e:
+        return f"❌ Error enviando mensaje: {e}"
 
-        response_msg = f"💨 Oxígeno registrado: *{value}%*"
-        if alerts:
-            response_msg += f"\n\n{' '.join(alerts)}\n_¡Consultá urgente!_"
-            caregiver = get_caregiver(user_id)
-            if caregiver:
-                alert = f"🚨 *ALERTA OXÍGENO BAJO*\n\n{user_id.replace('whatsapp:', '')}: {value}%\n\n¡Requiere atención urgente!"
-                send_whatsapp_message(caregiver, alert, is_emergency=True)
+def handle_caregiver_reminders_list(user_id, user_message, msg_lower, match, now):
+    """Muestra los recordatorios pendientes que programó el cuidador"""
+    pending = get_pending_caregiver_reminders(user_id)
+    if not pending:
+        return "⏰ No tenés recordatorios programados pendientes."
+    response_msg = "⏰ *Tus recordatorios programados:*\n\n"
+    for r in pending:
+        target_display = r["target_user"].replace('whatsapp:', '')
+        try:
+            remind_time = datetime.fromisoformat(r["remind_at"]).strftime("%H:%M")
+        except:
+            remind_time = "?"
+        response_msg += f"• {target_display}: {r['message']} (a las {remind_time})\n"
+    return response_msg
+
+# Los comandos que consultan servicios externos devuelven una función que arma
+# la respuesta: se ejecuta en ai_pool y se envía por la API, porque la consulta
+# (con reintentos) puede tardar más de lo que Twilio espera al webhook
+
+def handle_weather(user_id, user_message, msg_lower, match, now):
+    """Clima de la ciudad del usuario"""
+    location = get_user_location(user_id)
+    return lambda: get_weather(location)
+
+def handle_dolar(user_id, user_message, msg_lower, match, now):
+    """Cotización del dólar"""
+    return get_dolar
+
+def handle_news(user_id, user_message, msg_lower, match, now):
+    """Noticias del día"""
+    return format_news
+
+def handle_med_confirmation(user_id, user_message, msg_lower, match, now):
+    """Registra la toma de medicamentos si había una confirmación pendiente"""
+    pending = get_pending_confirmation(user_id)
+    if not pending:
+        return None
+    log_medication_taken(user_id, pending["period"])
+    clear_pending_confirmation(user_id)
+    return "✅ ¡Muy bien! Quedó registrado que tomaste tus medicamentos. 💪"
+
+# Comandos por texto exacto: se resuelven con una sola búsqueda en el dict
+EXACT_COMMANDS = {
+    command: handler
+    for commands, handler in (
+        (CONTACTS_LIST_CMDS, handle_contacts_list),
+        (APPOINTMENTS_LIST_CMDS, handle_appointments_list),
+        (CAREGIVER_SHOW_CMDS, handle_caregiver_show),
+        (HELP_CMDS, handle_help),
+        (TUTORIAL_START_CMDS, handle_tutorial_start),
+        (TUTORIAL_RESTART_CMDS, handle_tutorial_restart),
+        (TUTORIAL_SKIP_CMDS, handle_tutorial_skip),
+        (DND_ON_CMDS, handle_dnd_on),
+        (DND_OFF_CMDS, handle_dnd_off),
+        (DND_STATUS_CMDS, handle_dnd_status),
+        (SYMPTOMS_LIST_CMDS, handle_symptoms_list),
+        (VITALS_LIST_CMDS, handle_vitals_list),
+        (WATER_STATUS_CMDS, handle_water_status),
+        (RECURRING_LIST_CMDS, handle_recurring_list),
+        (BIRTHDAYS_LIST_CMDS, handle_birthdays_list),
+        (ARRIVAL_CMDS, handle_arrival),
+        (CAREGIVER_USERS_CMDS, handle_caregiver_users),
+        (CAREGIVER_REMINDERS_CMDS, handle_caregiver_reminders_list),
+        (WEATHER_CMDS, handle_weather),
+        (DOLAR_CMDS, handle_dolar),
+        (NEWS_CMDS, handle_news),
+        (CONFIRMATION_WORDS, handle_med_confirmation),
+    )
+    for command in commands
+}
+
+# Comandos por patrón, en orden de prioridad: (palabras clave, patrón, handler).
+# El patrón solo se busca si el mensaje contiene alguna de las palabras clave, sin
+# las cuales no puede coincidir; así la mayoría de los mensajes no corre ningún regex.
+# Los patrones con re.IGNORECASE se buscan en el mensaje original (para conservar
+# mayúsculas), el resto en minúsculas.
+# Patrón None = el handler se prueba siempre y decide él (estados pendientes).
+PATTERN_COMMANDS = (
+    (("agregar cuidador",), SECONDARY_CAREGIVER_RE, handle_secondary_caregiver),
+    (("contacto",), CONTACT_ADD_RE, handle_contact_add),
+    (("número", "telefono", "teléfono", "contacto"), CONTACT_SEARCH_RE, handle_contact_search),
+    (("contacto",), CONTACT_DELETE_RE, handle_contact_delete),
+    (("turno",), APPOINTMENT_ADD_RE, handle_appointment_add),
+    (("turno",), APPOINTMENT_CANCEL_RE, handle_appointment_cancel),
+    (None, None, handle_pending_caregiver_name),
+    (("cuidador",), CAREGIVER_SET_RE, handle_caregiver_set),
+    (None, None, handle_tutorial_progress),
+    (("no molestar", "modo nocturno", "silencio"), DND_RE, handle_dnd_range),
+    (("llamar", "video"), CALL_RE, handle_call),
+    (SYMPTOM_WORDS, SYMPTOM_RE, handle_symptom),
+    (("presión", "presion", "tengo"), PRESSURE_RE, handle_pressure),
+    (("glucosa", "glucemia", "azúcar", "azucar"), GLUCOSE_RE, handle_glucose),
+    (("temperatura", "fiebre", "tengo"), TEMPERATURE_RE, handle_temperature),
+    (("oxígeno", "oxigeno", "saturación", "saturacion", "spo2"), OXYGEN_RE, handle_oxygen),
+    (WATER_WORDS, WATER_RE, handle_water),
+    (("todos los",), DAILY_REMINDER_RE, handle_daily_reminder),
+    (("todos los",), WEEKLY_REMINDER_RE, handle_weekly_reminder),
+    (("recurrente",), RECURRING_DELETE_RE, handle_recurring_delete),
+    (("cumple",), BIRTHDAY_RE, handle_birthday_add),
+    (TRIP_WORDS, TRIP_RE, handle_trip_start),
+    (None, None, handle_caregiver_commands),
+    (None, CONFIRMATION_PREFIX_RE, handle_med_confirmation),
+)
 
-        add_to_conversation(user_id, "assistant", response_msg)
-        return response_msg
+# En lote: cuidadores, ubicación, bienestar, etc. se leen una sola vez por mensaje
+# aunque varios handlers los consulten
+@batched_json_files()
+def get_direct_response(user_id, user_message, msg_lower, now, is_first_message):
+    """Responde los comandos directos; devuelve None si el mensaje tiene que ir a Claude"""
+    # Sinónimos para lista de compras
+    if any(syn in msg_lower for syn in SHOPPING_SYNONYMS) and "lista" not in msg_lower:
+        return format_shopping_list(user_id)
 
-    # Ver historial de signos vitales
-    if msg_lower in ["mis signos", "signos vitales", "mis signos vitales", "historial signos", "ver presión", "ver glucosa"]:
-        response_msg = format_vitals_report(user_id)
-        add_to_conversation(user_id, "assistant", response_msg)
-        return response_msg
+    # Sinónimos para ver gastos
+    if any(syn in msg_lower for syn in EXPENSE_SYNONYMS):
+        return get_expenses_summary(user_id)
 
-    # ========== CONTADOR DE AGUA ==========
+    # Palabras del mensaje, para comparar contra los sets de saludos y menú
+    msg_words = set(WORD_RE.findall(msg_lower))
 
-    # Registrar agua: "tomé agua", "tomé un vaso", "tomé 2 vasos"
-    water_match = re.search(r'(?:tomé|tome|bebí|bebi)\s*(?:un\s*)?(?:vaso|vasos|agua)?\s*(?:de\s*)?(?:agua)?\s*(\d+)?', msg_lower)
-    if water_match and any(word in msg_lower for word in ["agua", "vaso", "vasos", "hidrat"]):
-        glasses = int(water_match.group(1)) if water_match.group(1) else 1
-        total = add_water(user_id, glasses)
-        response_msg = get_water_status(user_id)
-        add_to_conversation(user_id, "assistant", response_msg)
-        return response_msg
+    # Si es usuario nuevo y saluda, mostrar bienvenida
+    if is_first_message and (msg_words & GREETING_WORDS or any(p in msg_lower for p in GREETING_PHRASES)):
+        return get_welcome_message_short()
 
-    # Ver estado de hidratación
-    if msg_lower in ["cuánta agua", "cuanta agua", "vasos de agua", "mi agua", "hidratación", "hidratacion"]:
-        response_msg = get_water_status(user_id)
-        add_to_conversation(user_id, "assistant", response_msg)
-        return response_msg
+    # Si dice "menú", mostrar menú completo
+    if msg_words & MENU_WORDS or any(p in msg_lower for p in MENU_PHRASES):
+        return get_welcome_message()
 
-    # ========== RECORDATORIOS RECURRENTES ==========
+    # Respuesta a chequeo de bienestar
+    if any(word in msg_lower for word in WELLNESS_RESPONSES):
+        pending_wellness = get_wellness_pending(user_id)
+        if pending_wellness and not pending_wellness.get("responded"):
+            mark_wellness_responded(user_id, user_message)
+            if "mal" in msg_lower or "no muy bien" in msg_lower:
+                return "😔 Lamento escuchar eso. ¿Necesitás que avise a tu cuidador? Escribí *ayuda* si querés.\n\n¿Hay algo que pueda hacer por vos?"
+            return "😊 ¡Me alegro! Que tengas un lindo día. Estoy acá si me necesitás."
 
-    # Crear recordatorio diario: "recordame todos los días a las 10 tomar la pastilla"
-    daily_reminder_match = re.search(r'(?:recordame|avisame)\s+todos\s+los\s+días?\s+(?:a\s+las?\s+)?(\d{1,2})(?::(\d{2}))?\s+(?:que\s+)?(.+)', msg_lower)
-    if daily_reminder_match:
-        hour = int(daily_reminder_match.group(1))
-        minute = daily_reminder_match.group(2) or "00"
-        message = daily_reminder_match.group(3).strip()
-        time_str = f"{hour:02d}:{minute}"
+    handler = EXACT_COMMANDS.get(msg_lower)
+    if handler:
+        response = handler(user_id, user_message, msg_lower, None, now)
+        if response is not None:
+            return response
 
-        add_recurring_reminder(user_id, message, "daily", time_str=time_str)
-        response_msg = f"🔁 *Recordatorio diario creado*\n\n📝 {message}\n⏰ Todos los días a las {time_str}"
-        add_to_conversation(user_id, "assistant", response_msg)
-        return response_msg
+    for keywords, pattern, handler in PATTERN_COMMANDS:
+        if keywords and not any(k in msg_lower for k in keywords):
+            continue
+        match = None
+        if pattern is not None:
+            text = user_message if pattern.flags & re.IGNORECASE else msg_lower
+            match = pattern.search(text)
+            if not match:
+                continue
+        response = handler(user_id, user_message, msg_lower, match, now)
+        if response is not None:
+            return response
 
-    # Crear recordatorio semanal: "recordame todos los lunes a las 9 ir al médico"
-    days_map = {"lunes": 0, "martes": 1, "miércoles": 2, "miercoles": 2, "jueves": 3, "viernes": 4, "sábado": 5, "sabado": 5, "domingo": 6}
-    weekly_reminder_match = re.search(r'(?:recordame|avisame)\s+todos\s+los\s+(lunes|martes|miércoles|miercoles|jueves|viernes|sábado|sabado|domingo)\s+(?:a\s+las?\s+)?(\d{1,2})(?::(\d{2}))?\s+(?:que\s+)?(.+)', msg_lower)
-    if weekly_reminder_match:
-        day_name = weekly_reminder_match.group(1)
-        day_num = days_map.get(day_name, 0)
-        hour = int(weekly_reminder_match.group(2))
-        minute = weekly_reminder_match.group(3) or "00"
-        message = weekly_reminder_match.group(4).strip()
-        time_str = f"{hour:02d}:{minute}"
-
-        add_recurring_reminder(user_id, message, "weekly", day_of_week=day_num, time_str=time_str)
-        response_msg = f"🔁 *Recordatorio semanal creado*\n\n📝 {message}\n📅 Todos los {day_name} a las {time_str}"
-        add_to_conversation(user_id, "assistant", response_msg)
-        return response_msg
+    return None
 
-    # Ver recordatorios recurrentes
-    if msg_lower in ["mis recordatorios recurrentes", "recordatorios recurrentes", "recordatorios repetidos"]:
-        response_msg = format_recurring_reminders_list(user_id)
-        add_to_conversation(user_id, "assistant", response_msg)
-        return response_msg
+def prepare_ai_response(user_message, user_id):
+    """Registra el mensaje y resuelve comandos directos; devuelve (respuesta directa o None, conversación, hora)"""
+    # Hora actual, una sola vez para todo el mensaje
+    now = datetime.now(TIMEZONE)
 
-    # Eliminar recordatorio recurrente
-    delete_recurring_match = re.search(r'(?:eliminar|borrar|quitar)\s+recordatorio\s+recurrente\s+(\d+)', msg_lower)
-    if delete_recurring_match:
-        reminder_id = int(delete_recurring_match.group(1))
-        if delete_recurring_reminder(user_id, reminder_id):
-            response_msg = f"✅ Recordatorio recurrente #{reminder_id} eliminado."
-        else:
-            response_msg = "❌ No encontré ese recordatorio."
-        add_to_conversation(user_id, "assistant", response_msg)
-        return response_msg
+    # Registrar actividad del usuario
+    record_user_activity(user_id, now)
 
-    # ========== CUMPLEAÑOS ==========
-
-    # Agregar cumpleaños: "cumpleaños de Mamá: 15/03" o "el cumple de Juan es el 20/5/1985"
-    birthday_match = re.search(r'(?:cumpleaños|cumple)\s+(?:de\s+)?([^:]+?)[\s:]+(?:es\s+(?:el\s+)?)?(\d{1,2})[/\-](\d{1,2})(?:[/\-](\d{2,4}))?', msg_lower)
-    if birthday_match:
-        name = birthday_match.group(1).strip().title()
-        day = birthday_match.group(2)
-        month = birthday_match.group(3)
-        year = birthday_match.group(4)
-
-        date_str = f"{day}/{month}"
-        if year:
-            date_str += f"/{year}"
-
-        add_birthday(user_id, name, date_str)
-        response_msg = f"🎂 Cumpleaños guardado:\n\n👤 *{name}*\n📅 {day}/{month}"
-        if year:
-            response_msg += f"/{year}"
-        response_msg += "\n\n_Te avisaré el día anterior y el mismo día_"
-        add_to_conversation(user_id, "assistant", response_msg)
-        return response_msg
+    # Verificar si es usuario nuevo
+    is_first_message = is_new_user(user_id)
 
-    # Ver cumpleaños
-    if msg_lower in ["cumpleaños", "cumples", "mis cumpleaños", "próximos cumpleaños", "proximos cumpleaños"]:
-        response_msg = format_birthdays_list(user_id)
-        add_to_conversation(user_id, "assistant", response_msg)
-        return response_msg
+    # Cargar conversación desde archivo (persistente)
+    conversation = get_conversation(user_id)
 
-    # ========== CONFIRMACIÓN DE LLEGADA ==========
+    # Agregar mensaje del usuario (se guarda junto con la respuesta)
+    user_turn = {"role": "user", "content": user_message}
+    conversation.append(user_turn)
 
-    # Marcar salida: "voy a salir", "salgo a caminar", "voy al médico"
-    trip_match = re.search(r'(?:voy a salir|salgo|voy al?|me voy)\s*(?:a\s+)?(.+)?', msg_lower)
-    if trip_match and any(word in msg_lower for word in ["salir", "salgo", "voy a", "me voy"]):
-        destination = trip_match.group(1).strip() if trip_match.group(1) else "salida"
-        start_trip(user_id, destination)
-        response_msg = f"🚶 ¡Buen paseo!\n\nDestino: *{destination}*\n\n_Cuando llegues, escribí *llegué* para que sepa que estás bien._"
-        add_to_conversation(user_id, "assistant", response_msg)
-        return response_msg
+    msg_lower = user_message.lower().strip()
 
-    # Confirmar llegada: "llegué", "ya llegué", "llegué bien"
-    if msg_lower in ["llegué", "llegue", "ya llegué", "ya llegue", "llegué bien", "llegue bien"]:
-        if confirm_arrival(user_id):
-            response_msg = "🏠 ¡Qué bueno que llegaste bien! 😊"
-            # Notificar al cuidador
-            caregiver = get_caregiver(user_id)
-            if caregiver:
-                send_whatsapp_message(caregiver, f"✅ {user_id.replace('whatsapp:', '')} llegó bien a destino.")
-        else:
-            response_msg = "🏠 ¡Qué bueno!"
-        add_to_conversation(user_id, "assistant", response_msg)
-        return response_msg
+    # Comandos directos que no necesitan pasar por Claude
+    direct_response = get_direct_response(user_id, user_message, msg_lower, now, is_first_message)
+    # Si es una consulta externa (función), se guarda al resolverla
+    if direct_response is not None and not callable(direct_response):
+        add_turns_to_conversation(
+            user_id, [user_turn, {"role": "assistant", "content": direct_response}]
+        )
 
-    # ========== COMANDOS PARA CUIDADORES ==========
-
-    # Ver usuarios asignados (para cuidadores)
-    if msg_lower in ["mis usuarios", "mis pacientes", "a quien cuido", "a quién cuido"]:
-        users = get_users_for_caregiver(user_id)
-        if users:
-            response_msg = "👥 *Usuarios que te tienen como cuidador:*\n\n"
-            for i, u in enumerate(users, 1):
-                user_display = u.replace('whatsapp:', '')
-                response_msg += f"{i}. {user_display}\n"
-            response_msg += "\n📨 Para enviarles un recordatorio, escribí:\n*recordar a [número]: [mensaje] en [tiempo]*\n\nEjemplo: recordar a +5493511234567: tomá la pastilla en 2 horas"
-        else:
-            response_msg = "👥 No tenés usuarios asignados.\n\nUn usuario te asigna como cuidador escribiendo:\n*mi cuidador es +tu_número*"
-        add_to_conversation(user_id, "assistant", response_msg)
-        return response_msg
+    return direct_response, conversation, now
 
-    # Programar recordatorio para un usuario (cuidador)
-    # Formato: "recordar a +número: mensaje en X horas/minutos"
-    caregiver_reminder_match = re.search(
-        r'(?:recordar a|recordarle a|avisar a|avisarle a)\s*\+?(\d[\d\s\-]+)[:\s]+(.+?)\s+en\s+(\d+)\s*(hora|horas|minuto|minutos|min|hs|h)',
-        user_message.lower()
-    )
-    if caregiver_reminder_match:
-        target_number = re.sub(r'[\s\-]', '', caregiver_reminder_match.group(1))
-        if not target_number.startswith('+'):
-            target_number = '+' + target_number
-        target_user_id = f"whatsapp:{target_number}"
-
-        message_text = caregiver_reminder_match.group(2).strip()
-        # Capitalizar primera letra del mensaje
-        message_text = message_text[0].upper() + message_text[1:] if message_text else message_text
-
-        time_amount = int(caregiver_reminder_match.group(3))
-        time_unit = caregiver_reminder_match.group(4).lower()
-
-        # Verificar que el usuario tenga a este cuidador asignado
-        users = get_users_for_caregiver(user_id)
-        if target_user_id not in users:
-            response_msg = f"⚠️ El número {target_number} no te tiene asignado como cuidador.\n\nSolo podés enviar recordatorios a usuarios que te hayan configurado como su cuidador."
-            add_to_conversation(user_id, "assistant", response_msg)
-            return response_msg
-
-        # Calcular tiempo
-        now = datetime.now(TIMEZONE)
-        if time_unit.startswith('h'):
-            remind_at = now + timedelta(hours=time_amount)
-        else:
-            remind_at = now + timedelta(minutes=time_amount)
 
-        # Crear recordatorio
-        reminder = add_caregiver_reminder(user_id, target_user_id, message_text, remind_at.isoformat())
+def get_claude_response(user_id, conversation, now):
+    """Consulta a Claude con la conversación y procesa sus acciones"""
+    # El último mensaje de la conversación es el del usuario, todavía sin guardar
+    user_turn = conversation[-1]
+    try:
+        response = anthropic_client.messages.create(
+            model="claude-sonnet-4-20250514",
+            max_tokens=1024,
+            system=SYSTEM_PROMPT_BLOCKS,
+            messages=build_dated_messages(conversation, now),
+        )
+    except:
+        # Si Claude falla, guardar igual el mensaje del usuario
+        add_turns_to_conversation(user_id, [user_turn])
+        raise
 
-        response_msg = f"✅ Recordatorio programado\n\n👤 Para: {target_number}\n📝 Mensaje: {message_text}\n⏰ Se enviará a las {remind_at.strftime('%H:%M')}"
-        add_to_conversation(user_id, "assistant", response_msg)
-        return response_msg
+    assistant_message = response.content[0].text
 
-    # Enviar mensaje inmediato a un usuario (cuidador)
-    # Formato: "mensaje a +número: texto" o "decirle a +número: texto"
-    immediate_msg_match = re.search(
-        r'(?:mensaje a|decirle a|enviar a|mandar a)\s*\+?(\d[\d\s\-]+)[:\s]+(.+)',
-        user_message.lower()
+    # Guardar mensaje del usuario y respuesta del asistente juntos
+    add_turns_to_conversation(
+        user_id, [user_turn, {"role": "assistant", "content": assistant_message}]
     )
-    if immediate_msg_match:
-        target_number = re.sub(r'[\s\-]', '', immediate_msg_match.group(1))
-        if not target_number.startswith('+'):
-            target_number = '+' + target_number
-        target_user_id = f"whatsapp:{target_number}"
-
-        # Obtener el mensaje original (sin lowercase)
-        original_msg = user_message[immediate_msg_match.start(2):immediate_msg_match.end(2)].strip()
-
-        # Verificar que el usuario tenga a este cuidador asignado
-        users = get_users_for_caregiver(user_id)
-        if target_user_id not in users:
-            response_msg = f"⚠️ El número {target_number} no te tiene asignado como cuidador.\n\nSolo podés enviar mensajes a usuarios que te hayan configurado como su cuidador."
-            add_to_conversation(user_id, "assistant", response_msg)
-            return response_msg
-
-        # Enviar mensaje inmediatamente
-        try:
-            message = f"📨 *Mensaje de tu cuidador:*\n\n{original_msg}"
-            send_whatsapp_message(target_user_id, message)
-            response_msg = f"✅ Mensaje enviado a {target_number}"
-        except Exception as e:
-            response_msg = f"❌ Error enviando mensaje: {e}"
-
-        add_to_conversation(user_id, "assistant", response_msg)
-        return response_msg
 
-    # Ver recordatorios pendientes (cuidador)
-    if msg_lower in ["mis recordatorios programados", "recordatorios programados", "recordatorios pendientes"]:
-        pending = get_pending_caregiver_reminders(user_id)
-        if pending:
-            response_msg = "⏰ *Tus recordatorios programados:*\n\n"
-            for r in pending:
-                target_display = r["target_user"].replace('whatsapp:', '')
-                try:
-                    remind_time = datetime.fromisoformat(r["remind_at"]).strftime("%H:%M")
-                except:
-                    remind_time = "?"
-                response_msg += f"• {target_display}: {r['message']} (a las {remind_time})\n"
-        else:
-            response_msg = "⏰ No tenés recordatorios programados pendientes."
-        add_to_conversation(user_id, "assistant", response_msg)
-        return response_msg
-
-    # Clima directo
-    if msg_lower in ["clima", "el clima", "como esta el clima", "cómo está el clima", "que clima hace", "qué clima hace", "tiempo"]:
-        city = get_user_location(user_id)
-        weather = get_weather(city)
-        add_to_conversation(user_id, "assistant", weather)
-        return weather
-
-    # Dólar directo
-    if msg_lower in ["dolar", "dólar", "cotizacion", "cotización", "precio del dolar", "precio del dólar"]:
-        dolar = get_dolar()
-        add_to_conversation(user_id, "assistant", dolar)
-        return dolar
-
-    # Noticias directo
-    if msg_lower in ["noticias", "las noticias", "noticias de hoy", "que paso hoy", "qué pasó hoy"]:
-        news = format_news()
-        add_to_conversation(user_id, "assistant", news)
-        return news
+    # Procesar todas las acciones
+    final_response = process_actions(assistant_message, user_id, now)
 
-    # Confirmación de medicamentos
-    confirmation_words = ["si", "sí", "tome", "tomé", "si tome", "sí tomé", "ya tome", "ya tomé", "listo", "ok", "ya"]
-    if msg_lower in confirmation_words or msg_lower.startswith("si ") or msg_lower.startswith("sí "):
-        # Verificar si hay confirmación pendiente
-        pending = get_pending_confirmation(user_id)
-        if pending:
-            period = pending["period"]
-            log_medication_taken(user_id, period)
-            clear_pending_confirmation(user_id)
-            response_msg = "✅ ¡Muy bien! Quedó registrado que tomaste tus medicamentos. 💪"
-            add_to_conversation(user_id, "assistant", response_msg)
-            return response_msg
+    return final_response
 
-    now = datetime.now(TIMEZONE)
-    # Días de la semana en español
-    dias_semana = ["lunes", "martes", "miércoles", "jueves", "viernes", "sábado", "domingo"]
-    dia_nombre = dias_semana[now.weekday()]
-    today = f"{now.strftime('%Y-%m-%d')} {dia_nombre} (día {now.day} del mes {now.month})"
-    current_time = now.strftime("%H:%M")
 
-    response = anthropic_client.messages.create(
-        model="claude-sonnet-4-20250514",
-        max_tokens=1024,
-        system=SYSTEM_PROMPT.format(today=today, current_time=current_time),
-        messages=conversation,
+def resolve_direct_response(user_id, conversation, fetch):
+    """Arma una respuesta directa que consulta servicios externos y la guarda en la conversación"""
+    response = fetch()
+    add_turns_to_conversation(
+        user_id, [conversation[-1], {"role": "assistant", "content": response}]
     )
+    return response
 
-    assistant_message = response.content[0].text
 
-    # Guardar respuesta del asistente
-    add_to_conversation(user_id, "assistant", assistant_message)
+def get_ai_response(user_message, user_id):
+    """Obtiene respuesta de Claude"""
+    direct_response, conversation, now = prepare_ai_response(user_message, user_id)
+    if callable(direct_response):
+        return resolve_direct_response(user_id, conversation, direct_response)
+    if direct_response is not None:
+        return direct_response
+    return get_claude_response(user_id, conversation, now)
+
+
+# Llamadas a Claude en segundo plano, aparte de los envíos: el webhook no espera
+# los segundos que tarda la API
+AI_WORKERS = 16
+ai_pool = ThreadPoolExecutor(max_workers=AI_WORKERS, thread_name_prefix="claude")
+atexit.register(ai_pool.shutdown, wait=True)
+
+def respond_with_claude(to_number, conversation, now):
+    """Obtiene la respuesta de Claude y la envía por WhatsApp"""
+    try:
+        ai_response = get_claude_response(to_number, conversation, now)
+    except Exception as e:
+        ai_response = f"Error: {str(e)}"
+        logger.error(f"Error en get_claude_response: {e}")
 
-    # Procesar todas las acciones
-    final_response = process_actions(assistant_message, user_id)
+    send_whatsapp_message(to_number, ai_response)
+    logger.info(f"Respuesta de Claude enviada a {to_number}")
 
-    return final_response
+def respond_with_fetch(to_number, conversation, fetch):
+    """Arma una respuesta directa que consulta servicios externos y la envía por WhatsApp"""
+    try:
+        response = resolve_direct_response(to_number, conversation, fetch)
+    except Exception as e:
+        response = f"Error: {str(e)}"
+        logger.error(f"Error en respuesta directa: {e}")
+
+    send_whatsapp_message(to_number, response)
+    logger.info(f"Respuesta directa enviada a {to_number}")
+
+# Los usuarios suelen mandar varios mensajes cortos seguidos: se juntan y se
+# consulta a Claude una sola vez cuando pasan unos segundos sin mensajes nuevos.
+# Mientras hay una consulta en curso para el usuario, lo nuevo sigue esperando
+# y se manda cuando termina, así cada consulta ve la respuesta anterior
+CLAUDE_DEBOUNCE_SECONDS = 2
+pending_claude_messages = {}
+claude_timers = {}
+claude_in_flight = set()
+claude_debounce_lock = threading.Lock()
+
+def queue_for_claude(user_id, message):
+    """Junta el mensaje con los anteriores del usuario; cada mensaje nuevo reinicia la espera"""
+    with claude_debounce_lock:
+        pending_claude_messages.setdefault(user_id, []).append(message)
+        timer = claude_timers.get(user_id)
+        if timer:
+            timer.cancel()
+        timer = threading.Timer(CLAUDE_DEBOUNCE_SECONDS, flush_claude_messages, args=(user_id,))
+        timer.daemon = True
+        claude_timers[user_id] = timer
+        timer.start()
+
+def flush_claude_messages(user_id):
+    """Manda a Claude, como un solo mensaje, lo que el usuario escribió seguido"""
+    with claude_debounce_lock:
+        claude_timers.pop(user_id, None)
+        if user_id in claude_in_flight:
+            # Se mandan cuando termine la consulta en curso
+            return
+        messages = pending_claude_messages.pop(user_id, None)
+        if not messages:
+            # Ya los mandó un timer anterior
+            return
+        claude_in_flight.add(user_id)
+    ai_pool.submit(run_claude_for_user, user_id, messages)
+
+def run_claude_for_user(user_id, messages):
+    """Consulta a Claude con los mensajes juntados y después manda lo que haya llegado mientras tanto"""
+    try:
+        conversation = get_conversation(user_id)
+        conversation.append({"role": "user", "content": "\n".join(messages)})
+        respond_with_claude(user_id, conversation, datetime.now(TIMEZONE))
+    finally:
+        with claude_debounce_lock:
+            claude_in_flight.discard(user_id)
+            # Si todavía corre la espera, el timer los manda al vencer
+            flush_now = user_id in pending_claude_messages and user_id not in claude_timers
+        if flush_now:
+            flush_claude_messages(user_id)
 
 
 def transcribe_audio(audio_url):
     """Descarga y transcribe audio usando OpenAI Whisper API"""
     if not OPENAI_API_KEY:
-        print("OpenAI API key no configurada")
+        logger.warning("OpenAI API key no configurada")
         return None
 
     try:
-        print(f"Descargando audio desde: {audio_url}")
+        logger.debug("Descargando audio desde: %s", audio_url)
         auth = (get_env_var("TWILIO_ACCOUNT_SID"), get_env_var("TWILIO_AUTH_TOKEN"))
-        response = requests.get(audio_url, auth=auth)
-        print(f"Audio descargado: {len(response.content)} bytes, status: {response.status_code}")
+        response = http_session.get(audio_url, auth=auth, timeout=15)
+        logger.debug("Audio descargado: %d bytes, status: %s", len(response.content), response.status_code)
 
         if response.status_code != 200:
-            print(f"Error descargando audio: {response.status_code}")
+            logger.error(f"Error descargando audio: {response.status_code}")
             return None
 
-        # Guardar con extensión .mp3 que OpenAI maneja mejor
-        with tempfile.NamedTemporaryFile(suffix=".mp3", delete=False) as f:
-            f.write(response.content)
-            temp_path = f.name
-
-        print(f"Transcribiendo audio con OpenAI Whisper API...")
-
-        # Usar OpenAI Whisper API
-        with open(temp_path, "rb") as audio_file:
-            transcription_response = requests.post(
-                "https://api.openai.com/v1/audio/transcriptions",
-                headers={
-                    "Authorization": f"Bearer {OPENAI_API_KEY}"
-                },
-                files={
-                    "file": ("audio.mp3", audio_file)
-                },
-                data={
-                    "model": "whisper-1",
-                    "language": "es"
-                },
-                timeout=30
-            )
-
-        os.unlink(temp_path)
+        logger.debug("Transcribiendo audio con OpenAI Whisper API...")
+
+        # Usar OpenAI Whisper API, mandando el audio desde memoria
+        # (con nombre .mp3, que OpenAI maneja mejor)
+        transcription_response = http_session.post(
+            "https://api.openai.com/v1/audio/transcriptions",
+            headers={
+                "Authorization": f"Bearer {OPENAI_API_KEY}"
+            },
+            files={
+                "file": ("audio.mp3", io.BytesIO(response.content))
+            },
+            data={
+                "model": "whisper-1",
+                "language": "es"
+            },
+            timeout=30
+        )
 
-        print(f"Respuesta de OpenAI: {transcription_response.status_code}")
+        logger.debug("Respuesta de OpenAI: %s", transcription_response.status_code)
 
         if transcription_response.status_code == 200:
             text = transcription_response.json().get("text", "").strip()
-            print(f"Transcripción completada: {text}")
+            logger.debug("Transcripción completada: %s", text)
             if text:
                 return text
             else:
-                print("Transcripción vacía")
+                logger.warning("Transcripción vacía")
                 return None
         else:
-            print(f"Error en API de OpenAI: {transcription_response.status_code} - {transcription_response.text}")
+            logger.error(f"Error en API de OpenAI: {transcription_response.status_code} - {transcription_response.text}")
             return None
 
     except Exception as e:
-        print(f"Error transcribiendo audio: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception(f"Error transcribiendo audio: {e}")
         return None
 
 
@@ -4745,20 +5394,82 @@ def index():
     return render_template("index.html")
 
 
+def json_response(data, status=200):
+    """Respuesta JSON serializada con orjson"""
+    return app.response_class(orjson.dumps(data), status=status, mimetype="application/json")
+
+def read_request_json():
+    """Lee el cuerpo JSON del request con orjson ({} si no es JSON válido)"""
+    try:
+        data = orjson.loads(request.get_data())
+    except orjson.JSONDecodeError:
+        return {}
+    return data if isinstance(data, dict) else {}
+
+
 @app.route("/chat", methods=["POST"])
 def chat():
     """Endpoint para el chat web"""
-    data = request.get_json()
+    data = read_request_json()
     user_message = data.get("message", "")
 
     if not user_message:
-        return jsonify({"error": "Mensaje vacío"}), 400
+        return json_response({"error": "Mensaje vacío"}, 400)
 
     try:
         response = get_ai_response(user_message, "web_user")
-        return jsonify({"response": response})
+        return json_response({"response": response})
     except Exception as e:
-        return jsonify({"error": str(e)}), 500
+        return json_response({"error": str(e)}, 500)
+
+
+def twiml_reply(message=None):
+    """Respuesta TwiML con el mensaje (dividido si es muy largo); vacía si no hay mensaje"""
+    resp = MessagingResponse()
+    if message:
+        for part in split_message(message):
+            resp.message(part)
+    return str(resp), 200, {"Content-Type": "application/xml"}
+
+# MessageSid ya recibidos: Twilio reintenta el webhook si no le respondemos a tiempo
+PROCESSED_SIDS_TTL = 600
+PROCESSED_SIDS_MAX = 1000
+processed_sids = {}
+processed_sids_lock = threading.Lock()
+
+def is_duplicate_message(message_sid):
+    """True si el mensaje ya se recibió (reintento de Twilio); si no, lo registra"""
+    if not message_sid:
+        return False
+    now_ts = time.time()
+    with processed_sids_lock:
+        if message_sid in processed_sids:
+            return True
+        if len(processed_sids) >= PROCESSED_SIDS_MAX:
+            cutoff = now_ts - PROCESSED_SIDS_TTL
+            for sid in [sid for sid, ts in processed_sids.items() if ts < cutoff]:
+                del processed_sids[sid]
+        processed_sids[message_sid] = now_ts
+    return False
+
+def respond_to_audio(to_number, media_url):
+    """Transcribe un audio, obtiene la respuesta y la envía por WhatsApp"""
+    logger.debug("Transcribiendo audio: %s", media_url)
+    transcription = transcribe_audio(media_url)
+    if transcription:
+        message_body = transcription
+        logger.debug("Transcripción: %s", transcription)
+    else:
+        message_body = "[No pude entender el audio]"
+
+    try:
+        ai_response = get_ai_response(message_body, to_number)
+    except Exception as e:
+        ai_response = f"Error: {str(e)}"
+        logger.error(f"Error en get_ai_response: {e}")
+
+    send_whatsapp_message(to_number, ai_response)
+    logger.info(f"Respuesta al audio enviada a {to_number}")
 
 
 @app.route("/whatsapp", methods=["POST"])
@@ -4768,130 +5479,171 @@ def whatsapp_webhook():
     message_body = request.values.get("Body", "")
     num_media = int(request.values.get("NumMedia", 0))
 
-    print(f"Mensaje de {from_number}: {message_body} (Media: {num_media})")
+    logger.debug("Mensaje de %s: %s (Media: %s)", from_number, message_body, num_media)
+
+    # Reintento de Twilio de un mensaje que ya estamos procesando
+    if is_duplicate_message(request.values.get("MessageSid", "")):
+        logger.info(f"Mensaje duplicado de {from_number}, ignorado")
+        return twiml_reply()
 
     # Registrar usuario para recordatorios
     if from_number and from_number not in registered_users:
-        registered_users[from_number] = True
-        print(f"Usuario registrado para recordatorios: {from_number}")
+        register_user(from_number)
+        logger.info(f"Usuario registrado para recordatorios: {from_number}")
 
-    # Si hay audio, transcribirlo
+    # Si hay audio, la descarga y transcripción van en segundo plano
+    # (pueden tardar más que los pocos segundos que Twilio espera)
     if num_media > 0:
         media_type = request.values.get("MediaContentType0", "")
         if "audio" in media_type:
-            media_url = request.values.get("MediaUrl0", "")
-            print(f"Transcribiendo audio: {media_url}")
-            transcription = transcribe_audio(media_url)
-            if transcription:
-                message_body = transcription
-                print(f"Transcripción: {transcription}")
-            else:
-                message_body = "[No pude entender el audio]"
+            ai_pool.submit(respond_to_audio, from_number, request.values.get("MediaUrl0", ""))
+            logger.info(f"Audio de {from_number} encolado para transcribir")
+            return twiml_reply()
 
-    # Obtener respuesta de Claude
+    # Comandos directos: se responden en el momento
     try:
-        ai_response = get_ai_response(message_body, from_number)
+        ai_response, conversation, now = prepare_ai_response(message_body, from_number)
     except Exception as e:
         ai_response = f"Error: {str(e)}"
-        print(f"Error en get_ai_response: {e}")
+        logger.error(f"Error en prepare_ai_response: {e}")
 
-    # Siempre enviar usando la API de Twilio (más confiable con WhatsApp Business)
-    try:
-        send_whatsapp_message(from_number, ai_response)
-        print(f"Respuesta enviada a {from_number}")
-    except Exception as e:
-        print(f"Error enviando respuesta: {e}")
+    # Clima, dólar y noticias: la consulta externa va en segundo plano
+    if callable(ai_response):
+        ai_pool.submit(respond_with_fetch, from_number, conversation, ai_response)
+        logger.info(f"Consulta de {from_number} encolada")
+        return twiml_reply()
+
+    # Lo demás va a Claude en segundo plano (junto con los mensajes que lleguen
+    # enseguida), que envía la respuesta al terminar
+    if ai_response is None:
+        queue_for_claude(from_number, message_body)
+        logger.info(f"Mensaje de {from_number} encolado para Claude")
+        return twiml_reply()
 
-    # Responder inmediatamente a Twilio con 200 OK
-    return "", 200
+    # La respuesta directa va en la misma respuesta del webhook (TwiML),
+    # sin una llamada extra a la API de Twilio
+    logger.info(f"Respuesta enviada por TwiML a {from_number}")
+    return twiml_reply(ai_response)
 
 
 @app.route("/events", methods=["GET"])
 def list_events():
     """Lista eventos de hoy"""
-    events = get_todays_events()
-    event_list = []
-
-    for event in events:
-        try:
-            ical = Calendar.from_ical(event.data)
-            for component in ical.walk():
-                if component.name == "VEVENT":
-                    event_list.append(
-                        {
-                            "title": str(component.get("summary", "Sin título")),
-                            "start": str(component.get("dtstart").dt),
-                        }
-                    )
-        except:
-            pass
+    event_list = [
+        {"title": title, "start": str(start)}
+        for title, start in get_todays_events()
+        if start is not None
+    ]
 
-    return jsonify({"events": event_list})
+    return json_response({"events": event_list})
 
 
 @app.route("/send-reminder", methods=["POST"])
 def send_reminder():
     """Endpoint para enviar recordatorios manualmente"""
-    data = request.get_json()
+    data = read_request_json()
     to_number = data.get("to")
     message = data.get("message")
 
     if not to_number or not message:
-        return jsonify({"error": "Faltan parámetros"}), 400
+        return json_response({"error": "Faltan parámetros"}, 400)
 
     try:
         twilio_client.messages.create(
             body=message, from_=TWILIO_WHATSAPP_NUMBER, to=to_number
         )
-        return jsonify({"status": "enviado"})
+        return json_response({"status": "enviado"})
     except Exception as e:
-        return jsonify({"error": str(e)}), 500
+        return json_response({"error": str(e)}, 500)
 
 
 # ==================== SCHEDULER ====================
 
-scheduler = BackgroundScheduler(timezone=TIMEZONE)
-scheduler.add_job(check_and_send_reminders, "interval", minutes=5)
-# Recordatorios personalizados cada minuto
-scheduler.add_job(check_and_send_custom_reminders, "interval", minutes=1)
-# Recordatorios programados por cuidadores cada minuto
-scheduler.add_job(check_and_send_caregiver_reminders, "interval", minutes=1)
-# Verificar confirmaciones de medicamentos cada minuto
-scheduler.add_job(check_medication_confirmations, "interval", minutes=1)
-# Verificar respuestas de bienestar cada 5 minutos
-scheduler.add_job(check_wellness_responses, "interval", minutes=5)
-# Verificar inactividad inusual a las 6PM
-scheduler.add_job(check_user_inactivity, "cron", hour=18, minute=0)
-# Chequeo de bienestar/seguridad a las 9:00 AM y 5:00 PM (usuarios con cuidador)
-scheduler.add_job(send_wellness_check, "cron", hour=9, minute=0)
-scheduler.add_job(send_wellness_check, "cron", hour=17, minute=0)
-# Recordatorio de hidratación cada 3 horas (10AM, 1PM, 4PM)
-scheduler.add_job(send_hydration_reminder, "cron", hour=10, minute=0)
-scheduler.add_job(send_hydration_reminder, "cron", hour=13, minute=0)
-scheduler.add_job(send_hydration_reminder, "cron", hour=16, minute=0)
-# Resumen matutino a las 8:45 AM
-scheduler.add_job(send_morning_summary, "cron", hour=8, minute=45)
-# Recordatorio de medicamentos a las 10:00 AM
-scheduler.add_job(lambda: send_medication_reminder("mañana"), "cron", hour=10, minute=0)
-# Recordatorio de medicamentos a las 9:00 PM
-scheduler.add_job(lambda: send_medication_reminder("noche"), "cron", hour=21, minute=0)
-# Reporte diario de medicamentos al cuidador a las 22:00
-scheduler.add_job(send_daily_medication_report, "cron", hour=22, minute=0)
-# Reporte semanal los domingos a las 20:00
-scheduler.add_job(send_weekly_reports, "cron", day_of_week="sun", hour=20, minute=0)
-# Resumen diario para cuidadores a las 21:00
-scheduler.add_job(send_daily_summaries, "cron", hour=21, minute=0)
-# Recordatorios de turnos médicos cada hora
-scheduler.add_job(check_appointment_reminders, "cron", minute=0)
-# Recordatorios recurrentes cada minuto
-scheduler.add_job(check_and_send_recurring_reminders, "interval", minutes=1)
-# Verificar cumpleaños cada día a las 8:30 AM
-scheduler.add_job(check_and_send_birthday_reminders, "cron", hour=8, minute=30)
-# Verificar llegadas pendientes cada 5 minutos
-scheduler.add_job(check_pending_arrivals, "interval", minutes=5)
-scheduler.start()
-
-if __name__ == "__main__":
+# Los jobs corren en un solo proceso. Con RUN_SCHEDULER=0 el proceso web no los
+# corre y se lanzan aparte con `python app.py scheduler`, así los envíos masivos no
+# compiten con el webhook. Un lock de archivo en DATA_DIR evita que dos procesos
+# (varios workers de gunicorn, o web + scheduler) disparen los mismos jobs.
+RUN_SCHEDULER = os.environ.get("RUN_SCHEDULER", "1") == "1"
+SCHEDULER_LOCK_FILE = os.path.join(DATA_DIR, "scheduler.lock")
+scheduler_lock = None
+
+def acquire_scheduler_lock():
+    """Toma el lock del scheduler; devuelve False si otro proceso ya lo tiene"""
+    global scheduler_lock
+    if fcntl is None:
+        return True
+    lock_file = open(SCHEDULER_LOCK_FILE, "w")
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        lock_file.close()
+        return False
+    # Se mantiene abierto mientras viva el proceso
+    scheduler_lock = lock_file
+    return True
+
+def add_scheduler_jobs(scheduler):
+    """Programa todos los jobs periódicos
+    Cada job tiene un id fijo: replace_existing evita duplicarlo si se vuelve a programar
+    """
+    # check_and_send_reminders (eventos del calendario) está desactivado: no se
+    # programa para no despertar cada 5 minutos sin hacer nada
+    # Recordatorios personalizados cada minuto
+    scheduler.add_job(check_and_send_custom_reminders, "interval", minutes=1, id="check_and_send_custom_reminders", replace_existing=True)
+    # Recordatorios programados por cuidadores cada minuto
+    scheduler.add_job(check_and_send_caregiver_reminders, "interval", minutes=1, id="check_and_send_caregiver_reminders", replace_existing=True)
+    # Verificar confirmaciones de medicamentos cada minuto
+    scheduler.add_job(check_medication_confirmations, "interval", minutes=1, id="check_medication_confirmations", replace_existing=True)
+    # Verificar respuestas de bienestar cada 5 minutos
+    scheduler.add_job(check_wellness_responses, "interval", minutes=5, id="check_wellness_responses", replace_existing=True)
+    # Verificar inactividad inusual a las 6PM
+    scheduler.add_job(check_user_inactivity, "cron", hour=18, minute=0, id="check_user_inactivity", replace_existing=True)
+    # Chequeo de bienestar/seguridad a las 9:00 AM y 5:00 PM (usuarios con cuidador)
+    scheduler.add_job(send_wellness_check, "cron", hour="9,17", minute=0, id="send_wellness_check", replace_existing=True)
+    # Recordatorio de hidratación cada 3 horas (10AM, 1PM, 4PM)
+    scheduler.add_job(send_hydration_reminder, "cron", hour="10,13,16", minute=0, id="send_hydration_reminder", replace_existing=True)
+    # Resumen matutino a las 8:45 AM
+    scheduler.add_job(send_morning_summary, "cron", hour=8, minute=45, id="send_morning_summary", replace_existing=True)
+    # Recordatorio de medicamentos a las 10:00 AM
+    scheduler.add_job(send_medication_reminder, "cron", hour=10, minute=0, args=["mañana"], id="send_medication_reminder_manana", replace_existing=True)
+    # Recordatorio de medicamentos a las 9:00 PM
+    scheduler.add_job(send_medication_reminder, "cron", hour=21, minute=0, args=["noche"], id="send_medication_reminder_noche", replace_existing=True)
+    # Reporte diario de medicamentos al cuidador a las 22:00
+    scheduler.add_job(send_daily_medication_report, "cron", hour=22, minute=0, id="send_daily_medication_report", replace_existing=True)
+    # Reporte semanal los domingos a las 20:00
+    scheduler.add_job(send_weekly_reports, "cron", day_of_week="sun", hour=20, minute=0, id="send_weekly_reports", replace_existing=True)
+    # Resumen diario para cuidadores a las 21:00
+    scheduler.add_job(send_daily_summaries, "cron", hour=21, minute=0, id="send_daily_summaries", replace_existing=True)
+    # Recordatorios de turnos médicos cada hora
+    scheduler.add_job(check_appointment_reminders, "cron", minute=0, id="check_appointment_reminders", replace_existing=True)
+    # Recordatorios recurrentes cada minuto
+    scheduler.add_job(check_and_send_recurring_reminders, "interval", minutes=1, id="check_and_send_recurring_reminders", replace_existing=True)
+    # Verificar cumpleaños cada día a las 8:30 AM
+    scheduler.add_job(check_and_send_birthday_reminders, "cron", hour=8, minute=30, id="check_and_send_birthday_reminders", replace_existing=True)
+    # Verificar llegadas pendientes cada 5 minutos
+    scheduler.add_job(check_pending_arrivals, "interval", minutes=5, id="check_pending_arrivals", replace_existing=True)
+
+# Si un job se atrasa (proceso ocupado), corre una sola vez en vez
+# de repetir todas las ejecuciones perdidas, y nunca dos instancias a la vez
+SCHEDULER_JOB_DEFAULTS = {"coalesce": True, "max_instances": 1, "misfire_grace_time": 600}
+
+scheduler = None
+if RUN_SCHEDULER and not SCHEDULER_PROCESS:
+    if acquire_scheduler_lock():
+        scheduler = BackgroundScheduler(timezone=TIMEZONE, job_defaults=SCHEDULER_JOB_DEFAULTS)
+        add_scheduler_jobs(scheduler)
+        scheduler.start()
+    else:
+        logger.info("Scheduler activo en otro proceso, no se inicia aquí")
+
+if __name__ == "__main__" and SCHEDULER_PROCESS:
+    if not acquire_scheduler_lock():
+        sys.exit("Scheduler activo en otro proceso")
+    logger.info(f"⏰ Scheduler iniciado (zona horaria: {TIMEZONE})")
+    scheduler = BlockingScheduler(timezone=TIMEZONE, job_defaults=SCHEDULER_JOB_DEFAULTS)
+    add_scheduler_jobs(scheduler)
+    scheduler.start()
+elif __name__ == "__main__":
     print("=" * 50)
     print("🤖 Asistente Personal iniciado")
     print(f"⏰ Zona horaria: {TIMEZONE}")